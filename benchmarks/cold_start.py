@@ -0,0 +1,176 @@
+"""
+Import-time and cold-start benchmark of the Lambda functions.
+
+Every sample runs in a fresh Python process, as a Lambda cold start does, and
+measures the time to import a handler module and to create its first DynamoDB
+client (no request is sent). Each handler is measured twice: as of a baseline git
+revision (by default the repository's first commit, i.e. the original handlers
+built on `boto3.resource('dynamodb')`), exported to a temporary directory, and as
+in the working tree. Handlers that do not exist at the baseline revision are
+reported as 'n/a', otherwise the change of the total (import and first client) is
+printed after the two rows. The bare `boto3.resource` setup is also compared with
+the lazy low-level clients of `cirrus_common.aws` that replace it.
+
+Example:
+    python benchmarks/cold_start.py --samples 15
+    python benchmarks/cold_start.py --before HEAD~5
+"""
+import io
+import os
+import sys
+import json
+import tarfile
+import argparse
+import tempfile
+import statistics
+import subprocess
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+COMMON_LAYER = os.path.join('src', 'layers', 'common', 'python')
+
+# Dummy configuration, so the handler modules can be imported without a deployment.
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'AWS_ACCESS_KEY_ID': 'benchmark',
+    'AWS_SECRET_ACCESS_KEY': 'benchmark',
+    'DYNAMODB_EVENTS_TABLE': 'events',
+    'DYNAMODB_RULES_TABLE': 'rules',
+    'DYNAMODB_STATE_TABLE': 'state',
+    'SNS_TOPIC_NAME': 'alerts'
+}
+
+# Each library case runs what a module does at import time, then creates the first
+# DynamoDB client if that did not happen at import time already.
+LIBRARY_CASES = {
+    'boto3.resource': (
+        "import boto3; table = boto3.resource('dynamodb').Table('rules')",
+        "table.meta.client"
+    ),
+    'cirrus_common.aws': (
+        "from cirrus_common import aws",
+        "aws.client('dynamodb')"
+    )
+}
+
+# handler -> (handler module, module holding its first table, table attribute)
+HANDLERS = {
+    'data_injestion': ('src.functions.data_injestion.lambda_function', 'src.functions.data_injestion.lambda_function', 'table'),
+    'rule_management': ('src.functions.rule_management.lambda_function', 'src.functions.rule_management.lambda_function', 'table'),
+    'anomaly_detector': ('src.functions.anomaly_detector.lambda_function', 'src.functions.anomaly_detector.lambda_function', 'rules_table'),
+    'anomaly_stream_detector': ('src.functions.anomaly_detector.stream_handler', 'src.functions.anomaly_detector.lambda_function', 'rules_table')
+}
+
+# Works with the resource tables of the original handlers and the `cirrus_common.aws`
+# tables of the current ones.
+HANDLER_IMPORT = "import importlib, sys; importlib.import_module({module!r})"
+HANDLER_FIRST_CLIENT = (
+    "table = getattr(sys.modules[{table_module!r}], {table_attribute!r}); "
+    "table._dynamodb.client if hasattr(table, '_dynamodb') else table.meta.client"
+)
+
+SAMPLE_SCRIPT = """
+import time, json
+start = time.perf_counter()
+{import_statement}
+imported = time.perf_counter()
+{first_client}
+ready = time.perf_counter()
+print(json.dumps({{'import': imported - start, 'firstClient': ready - imported}}))
+"""
+
+def run_sample(import_statement, first_client, root=ROOT):
+    """
+    Measures one cold start in a fresh interpreter.
+
+    Args:
+        import_statement (str): The import being measured.
+        first_client (str): A statement creating the first DynamoDB client.
+        root (str, optional): The source tree the modules are imported from.
+
+    Returns:
+        dict: The 'import' and 'firstClient' durations in seconds.
+    """
+    env = dict(os.environ, **ENVIRONMENT)
+    env['PYTHONPATH'] = os.pathsep.join([root, os.path.join(root, COMMON_LAYER), env.get('PYTHONPATH', '')])
+    script = SAMPLE_SCRIPT.format(import_statement=import_statement, first_client=first_client)
+    output = subprocess.run([sys.executable, '-c', script], env=env, cwd=root, check=True, capture_output=True, text=True)
+    return json.loads(output.stdout.strip().splitlines()[-1])
+
+
+def median_ms(import_statement, first_client, samples, root=ROOT):
+    """
+    Returns the median import, first client and total durations in milliseconds.
+    """
+    results = [run_sample(import_statement, first_client, root) for _ in range(samples)]
+    return (
+        statistics.median(r['import'] for r in results) * 1000,
+        statistics.median(r['firstClient'] for r in results) * 1000,
+        statistics.median(r['import'] + r['firstClient'] for r in results) * 1000
+    )
+
+
+def root_commit():
+    """
+    Returns the first commit of the repository.
+    """
+    output = subprocess.run(['git', 'rev-list', '--max-parents=0', 'HEAD'], cwd=ROOT, check=True, capture_output=True, text=True)
+    return output.stdout.split()[-1]
+
+
+def export_tree(ref, directory):
+    """
+    Writes the 'src' tree of a git revision to a directory.
+
+    Args:
+        ref (str): The git revision.
+        directory (str): The target directory.
+    """
+    archive = subprocess.run(['git', 'archive', '--format=tar', ref, 'src'], cwd=ROOT, check=True, capture_output=True)
+    with tarfile.open(fileobj=io.BytesIO(archive.stdout)) as tar:
+        tar.extractall(directory)
+
+
+def module_exists(root, module):
+    return os.path.exists(os.path.join(root, *module.split('.')) + '.py')
+
+
+def print_row(name, durations):
+    if durations is None:
+        print(f"{name:<40}{'n/a':>12}{'n/a':>18}{'n/a':>12}")
+    else:
+        print(f"{name:<40}{durations[0]:>12.1f}{durations[1]:>18.1f}{durations[2]:>12.1f}")
+
+
+def main(argv=None):
+    """
+    Command line entry point printing the median durations of every case in milliseconds.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark handler import time and cold starts.")
+    parser.add_argument('--samples', type=int, default=10, help="The number of fresh processes per case.")
+    parser.add_argument('--before', help="The git revision of the handlers to compare with (default: the first commit).")
+    args = parser.parse_args(argv)
+    before = args.before or root_commit()
+
+    print(f"{'case':<40}{'import ms':>12}{'first client ms':>18}{'total ms':>12}")
+    for name, (import_statement, first_client) in LIBRARY_CASES.items():
+        print_row(name, median_ms(import_statement, first_client, args.samples))
+
+    with tempfile.TemporaryDirectory() as before_root:
+        export_tree(before, before_root)
+        for name, (module, table_module, table_attribute) in HANDLERS.items():
+            import_statement = HANDLER_IMPORT.format(module=module)
+            first_client = HANDLER_FIRST_CLIENT.format(table_module=table_module, table_attribute=table_attribute)
+            totals = []
+            for label, root in ((f"before {before[:7]}", before_root), ('after', ROOT)):
+                durations = None
+                if module_exists(root, module):
+                    durations = median_ms(import_statement, first_client, args.samples, root)
+                    totals.append(durations[2])
+                print_row(f"{name} ({label})", durations)
+            if len(totals) == 2:
+                print(f"{name + ' (total change)':<40}{'':>30}{totals[1] - totals[0]:>+12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,510 @@
+"""
+In-process stand-ins for the DynamoDB, SNS and Lambda clients.
+
+`FakeAws.install` replaces `cirrus_common.aws.client`, so the handlers run
+unchanged against in-memory tables without any network access. The DynamoDB
+stand-in implements the subset of the low-level API the functions use (item
+reads and writes, conditional puts, update expressions, queries on tables and
+global secondary indexes, scans and batch writes) with the request and response
+formats of the real service, including 1 MB result pages. It charges read and
+write units the way on-demand tables do: reads per 4 KB (half for eventually
+consistent reads), writes per 1 KB plus one write per affected index.
+"""
+import re
+import math
+import uuid
+import bisect
+import threading
+from decimal import Decimal
+from contextlib import contextmanager
+
+from botocore.exceptions import ClientError
+
+from cirrus_common import aws
+
+PAGE_BYTES = 1024 * 1024
+READ_UNIT_BYTES = 4096
+WRITE_UNIT_BYTES = 1024
+
+# The tables of the deployment: name -> ((hash key, range key), {index name: (hash key, range key)}).
+TABLE_SCHEMAS = {
+    'events': (('userIdentity', 'eventTime'), {'EventNameIndex': ('eventName', 'eventTime')}),
+    'rules': (('ruleId', None), {
+        'MetricIndex': ('metric', 'ruleId'),
+        'TargetIndex': ('target', 'ruleId'),
+        'RuleTypeIndex': ('ruleType', 'ruleId')
+    }),
+    'counters': (('counterKey', 'timeBucket'), {}),
+    'state': (('stateKey', None), {})
+}
+
+_COMPARISONS = {
+    '=': lambda a, b: a == b,
+    '<>': lambda a, b: a != b,
+    '<': lambda a, b: a < b,
+    '<=': lambda a, b: a <= b,
+    '>': lambda a, b: a > b,
+    '>=': lambda a, b: a >= b
+}
+_CONDITION_TERM = re.compile(
+    r'^(?:(attribute_exists|attribute_not_exists)\(\s*([#\w]+)\s*\)'
+    r'|begins_with\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)'
+    r'|([#\w]+)\s*(=|<>|<=|>=|<|>)\s*(:\w+)'
+    r'|([#\w]+)\s+BETWEEN\s+(:\w+)\s+AND\s+(:\w+))$'
+)
+
+
+def client_error(code, message, operation):
+    """
+    Returns the botocore error the real client raises for an error response.
+    """
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+def value_size(value):
+    """
+    Returns the approximate stored size of an attribute value in bytes.
+    """
+    if isinstance(value, str):
+        return len(value.encode('utf-8'))
+    if isinstance(value, (bytes, bytearray)):
+        return len(value)
+    if isinstance(value, bool) or value is None:
+        return 1
+    if isinstance(value, (int, float, Decimal)):
+        return len(str(value).lstrip('-').replace('.', '')) // 2 + 1
+    if isinstance(value, dict):
+        return 3 + sum(len(name.encode('utf-8')) + value_size(item) + 1 for name, item in value.items())
+    return 3 + sum(value_size(item) + 1 for item in value)
+
+
+def item_size(item):
+    """
+    Returns the approximate stored size of an item in bytes.
+    """
+    return sum(len(name.encode('utf-8')) + value_size(value) for name, value in item.items())
+
+
+def split_top_level(expression, separator):
+    """
+    Splits an expression on a separator outside of parentheses.
+    """
+    parts, depth, current = [], 0, ''
+    for char in expression:
+        depth += (char == '(') - (char == ')')
+        if char == separator and depth == 0:
+            parts.append(current.strip())
+            current = ''
+        else:
+            current += char
+    parts.append(current.strip())
+    return [part for part in parts if part]
+
+
+class Expression:
+    """
+    The placeholders of one request, used to evaluate its expressions.
+
+    Attributes:
+        names (dict): The 'ExpressionAttributeNames'.
+        values (dict): The 'ExpressionAttributeValues', as Python values.
+    """
+    def __init__(self, names=None, values=None):
+        self.names = names or {}
+        self.values = values or {}
+
+    def name(self, token):
+        return self.names[token] if token.startswith('#') else token
+
+    def value(self, token):
+        return self.values[token]
+
+    def matches(self, expression, item):
+        """
+        Evaluates a condition or filter expression of ANDed and ORed terms.
+
+        Args:
+            expression (str): The expression; parentheses and NOT are not supported.
+            item (dict): The item, or None if it does not exist.
+
+        Returns:
+            bool: Whether the item satisfies the expression.
+        """
+        item = item or {}
+        return any(
+            all(self._term(term, item) for term in self._conjuncts(disjunct))
+            for disjunct in re.split(r'\s+OR\s+', expression)
+        )
+
+    @staticmethod
+    def _conjuncts(expression):
+        terms = []
+        for part in re.split(r'\s+AND\s+', expression):
+            # The AND of 'x BETWEEN :low AND :high' belongs to the term.
+            if terms and re.search(r'\bBETWEEN\s+\S+$', terms[-1]):
+                terms[-1] += ' AND ' + part
+            else:
+                terms.append(part)
+        return terms
+
+    def _term(self, term, item):
+        match = _CONDITION_TERM.match(term.strip())
+        if not match:
+            raise NotImplementedError(f"Unsupported expression term: {term}")
+        function, name, prefix_name, prefix, compared, operator, operand, between, low, high = match.groups()
+        if function:
+            return (self.name(name) in item) == (function == 'attribute_exists')
+        if prefix_name:
+            value = item.get(self.name(prefix_name))
+            return isinstance(value, str) and value.startswith(self.value(prefix))
+        if compared:
+            value = item.get(self.name(compared))
+            return value is not None and _COMPARISONS[operator](value, self.value(operand))
+        value = item.get(self.name(between))
+        return value is not None and self.value(low) <= value <= self.value(high)
+
+    def projection(self, expression):
+        return [self.name(token.strip()) for token in expression.split(',')]
+
+    def update(self, expression, item):
+        """
+        Applies an update expression with SET, ADD and REMOVE clauses to an item in place.
+        """
+        for clause, body in re.findall(r'\b(SET|ADD|REMOVE)\s+(.*?)(?=\s+\b(?:SET|ADD|REMOVE)\b|$)', expression):
+            for action in split_top_level(body, ','):
+                if clause == 'SET':
+                    path, operand = (part.strip() for part in action.split('=', 1))
+                    item[self.name(path)] = self._operand(operand, item)
+                elif clause == 'ADD':
+                    path, operand = action.split()
+                    name, value = self.name(path), self.value(operand)
+                    if isinstance(value, set):
+                        item[name] = item.get(name, set()) | value
+                    else:
+                        item[name] = item.get(name, 0) + value
+                else:
+                    item.pop(self.name(action), None)
+
+    def _operand(self, operand, item):
+        match = re.match(r'^if_not_exists\(\s*([#\w]+)\s*,\s*(:\w+)\s*\)$', operand)
+        if match:
+            return item.get(self.name(match.group(1)), self.value(match.group(2)))
+        match = re.match(r'^([#\w]+)\s*([+-])\s*(:\w+)$', operand)
+        if match:
+            current, change = item.get(self.name(match.group(1)), 0), self.value(match.group(3))
+            return current + change if match.group(2) == '+' else current - change
+        return self.value(operand)
+
+
+class FakeTable:
+    """
+    An in-memory table with sorted partitions for the table and each index.
+
+    Attributes:
+        name (str): The table name.
+        key (tuple): The hash and range key attribute names (range key may be None).
+        indexes (dict): The global secondary indexes: name -> (hash key, range key).
+        items (dict): The items by primary key.
+    """
+    def __init__(self, name, key, indexes=None):
+        self.name = name
+        self.key = key
+        self.indexes = indexes or {}
+        self.items = {}
+        # Index name (None for the table) -> partition value -> sorted [(range value, primary key)].
+        self.partitions = {index: {} for index in [None, *self.indexes]}
+
+    def primary_key(self, item):
+        hash_key, range_key = self.key
+        return (item[hash_key], item[range_key] if range_key else None)
+
+    def _entries(self, item):
+        for index, (hash_key, range_key) in [(None, self.key), *self.indexes.items()]:
+            if hash_key in item and (range_key is None or range_key in item):
+                yield index, item[hash_key], (item[range_key] if range_key else None, self.primary_key(item))
+
+    def put(self, item):
+        """
+        Stores an item, returning the item it replaced (or None).
+        """
+        old = self.delete(self.primary_key(item))
+        self.items[self.primary_key(item)] = item
+        for index, partition, entry in self._entries(item):
+            bisect.insort(self.partitions[index].setdefault(partition, []), entry)
+        return old
+
+    def delete(self, primary_key):
+        """
+        Removes an item, returning it (or None).
+        """
+        old = self.items.pop(primary_key, None)
+        if old is not None:
+            for index, partition, entry in self._entries(old):
+                entries = self.partitions[index][partition]
+                del entries[bisect.bisect_left(entries, entry)]
+        return old
+
+    def written_indexes(self, *items):
+        """
+        Returns the number of indexes a write of these item versions touches.
+        """
+        return len({index for item in items if item for index, _, _ in self._entries(item) if index})
+
+
+class FakeDynamoDB:
+    """
+    A low-level DynamoDB client backed by `FakeTable`s.
+
+    Attributes:
+        tables (dict): The tables by name.
+        read_units (dict): The read units consumed per table.
+        write_units (dict): The write units consumed per table.
+        requests (dict): The number of requests per operation name.
+    """
+    def __init__(self, schemas=TABLE_SCHEMAS):
+        self.tables = {name: FakeTable(name, key, indexes) for name, (key, indexes) in schemas.items()}
+        self.read_units = {name: 0.0 for name in self.tables}
+        self.write_units = {name: 0.0 for name in self.tables}
+        self.requests = {}
+        self._lock = threading.Lock()
+
+    def seed(self, table_name, items):
+        """
+        Stores items without charging capacity, e.g. the rules of a benchmark.
+        """
+        for item in items:
+            self.tables[table_name].put(dict(item))
+
+    def _table(self, name, operation):
+        if name not in self.tables:
+            raise client_error('ResourceNotFoundException', f"Requested resource not found: {name}", operation)
+        return self.tables[name]
+
+    def _charge(self, operation, table_name, read=0.0, write=0.0, kwargs=None):
+        self.requests[operation] = self.requests.get(operation, 0) + 1
+        self.read_units[table_name] += read
+        self.write_units[table_name] += write
+        if kwargs is not None and kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            return {'ConsumedCapacity': {'TableName': table_name, 'CapacityUnits': read + write}}
+        return {}
+
+    @staticmethod
+    def _read_units(size, consistent):
+        units = max(1, math.ceil(size / READ_UNIT_BYTES))
+        return float(units) if consistent else units / 2
+
+    def _write_units(self, table, old, new):
+        size = max(item_size(old) if old else 0, item_size(new) if new else 0)
+        units = max(1, math.ceil(size / WRITE_UNIT_BYTES))
+        return float(units * (1 + table.written_indexes(old, new)))
+
+    @staticmethod
+    def _expression(kwargs):
+        values = kwargs.get('ExpressionAttributeValues')
+        return Expression(kwargs.get('ExpressionAttributeNames'), aws.deserialize(values) if values else None)
+
+    def _check_condition(self, kwargs, expression, item, operation):
+        condition = kwargs.get('ConditionExpression')
+        if condition and not expression.matches(condition, item):
+            raise client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+
+    def get_item(self, TableName, Key, ConsistentRead=False, **kwargs):
+        with self._lock:
+            table = self._table(TableName, 'GetItem')
+            item = table.items.get(table.primary_key(aws.deserialize(Key)))
+            response = self._charge('GetItem', TableName, read=self._read_units(item_size(item or {}), ConsistentRead), kwargs=kwargs)
+            if item is not None:
+                if 'ProjectionExpression' in kwargs:
+                    names = self._expression(kwargs).projection(kwargs['ProjectionExpression'])
+                    item = {name: item[name] for name in names if name in item}
+                response['Item'] = aws.serialize(item)
+            return response
+
+    def _put(self, table, item, kwargs, operation):
+        old = table.items.get(table.primary_key(item))
+        units = self._write_units(table, old, item)
+        try:
+            self._check_condition(kwargs, self._expression(kwargs), old, operation)
+        except ClientError:
+            # Failed conditional writes consume write units as well.
+            self.write_units[table.name] += units
+            raise
+        table.put(item)
+        return old, units
+
+    def _delete(self, table, key, kwargs, operation):
+        primary_key = table.primary_key(key)
+        old = table.items.get(primary_key)
+        self._check_condition(kwargs, self._expression(kwargs), old, operation)
+        table.delete(primary_key)
+        return old, self._write_units(table, old, None)
+
+    def put_item(self, TableName, Item, **kwargs):
+        with self._lock:
+            old, units = self._put(self._table(TableName, 'PutItem'), aws.deserialize(Item), kwargs, 'PutItem')
+            response = self._charge('PutItem', TableName, write=units, kwargs=kwargs)
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and old is not None:
+                response['Attributes'] = aws.serialize(old)
+            return response
+
+    def update_item(self, TableName, Key, UpdateExpression, **kwargs):
+        with self._lock:
+            table = self._table(TableName, 'UpdateItem')
+            key = aws.deserialize(Key)
+            old = table.items.get(table.primary_key(key))
+            expression = self._expression(kwargs)
+            self._check_condition(kwargs, expression, old, 'UpdateItem')
+            item = dict(old) if old else dict(key)
+            expression.update(UpdateExpression, item)
+            table.put(item)
+            response = self._charge('UpdateItem', TableName, write=self._write_units(table, old, item), kwargs=kwargs)
+            if kwargs.get('ReturnValues') in ('ALL_NEW', 'UPDATED_NEW'):
+                response['Attributes'] = aws.serialize(item)
+            elif kwargs.get('ReturnValues') == 'ALL_OLD' and old is not None:
+                response['Attributes'] = aws.serialize(old)
+            return response
+
+    def delete_item(self, TableName, Key, **kwargs):
+        with self._lock:
+            old, units = self._delete(self._table(TableName, 'DeleteItem'), aws.deserialize(Key), kwargs, 'DeleteItem')
+            response = self._charge('DeleteItem', TableName, write=units, kwargs=kwargs)
+            if kwargs.get('ReturnValues') == 'ALL_OLD' and old is not None:
+                response['Attributes'] = aws.serialize(old)
+            return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        if sum(len(requests) for requests in RequestItems.values()) > 25:
+            raise client_error('ValidationException', 'Too many items requested for the BatchWriteItem call', 'BatchWriteItem')
+        consumed = []
+        with self._lock:
+            for table_name, requests in RequestItems.items():
+                table = self._table(table_name, 'BatchWriteItem')
+                units = 0.0
+                for request in requests:
+                    if 'PutRequest' in request:
+                        units += self._put(table, aws.deserialize(request['PutRequest']['Item']), {}, 'BatchWriteItem')[1]
+                    else:
+                        units += self._delete(table, aws.deserialize(request['DeleteRequest']['Key']), {}, 'BatchWriteItem')[1]
+                self.write_units[table_name] += units
+                consumed.append({'TableName': table_name, 'CapacityUnits': units})
+            self.requests['BatchWriteItem'] = self.requests.get('BatchWriteItem', 0) + 1
+        response = {'UnprocessedItems': {}}
+        if kwargs.get('ReturnConsumedCapacity', 'NONE') != 'NONE':
+            response['ConsumedCapacity'] = consumed
+        return response
+
+    def query(self, TableName, KeyConditionExpression, **kwargs):
+        with self._lock:
+            table = self._table(TableName, 'Query')
+            index = kwargs.get('IndexName')
+            hash_key, range_key = table.indexes[index] if index else table.key
+            expression = self._expression(kwargs)
+            match = re.match(r'^\s*([#\w]+)\s*=\s*(:\w+)\s*(?:AND\s+(.+))?$', KeyConditionExpression)
+            if not match or expression.name(match.group(1)) != hash_key:
+                raise NotImplementedError(f"Unsupported key condition: {KeyConditionExpression}")
+            entries = table.partitions[index].get(expression.value(match.group(2)), [])
+            range_condition = match.group(3)
+            if range_condition:
+                entries = [entry for entry in entries if expression.matches(range_condition, {range_key: entry[0]})]
+            if not kwargs.get('ScanIndexForward', True):
+                entries = entries[::-1]
+            return self._read(table, 'Query', [entry[1] for entry in entries], expression, kwargs)
+
+    def scan(self, TableName, **kwargs):
+        with self._lock:
+            table = self._table(TableName, 'Scan')
+            return self._read(table, 'Scan', sorted(table.items, key=repr), self._expression(kwargs), kwargs)
+
+    def _read(self, table, operation, primary_keys, expression, kwargs):
+        """
+        Reads a page of items in key order, applying the filter, projection and 'Select'.
+        """
+        start = kwargs.get('ExclusiveStartKey')
+        if start:
+            start_key = table.primary_key(aws.deserialize(start))
+            position = next((i for i, key in enumerate(primary_keys) if key == start_key), -1)
+            primary_keys = primary_keys[position + 1:]
+
+        limit = kwargs.get('Limit')
+        read_bytes, scanned, items, last_key = 0, 0, [], None
+        for primary_key in primary_keys:
+            item = table.items[primary_key]
+            read_bytes += item_size(item)
+            scanned += 1
+            if 'FilterExpression' not in kwargs or expression.matches(kwargs['FilterExpression'], item):
+                items.append(item)
+            if (limit and scanned >= limit) or read_bytes >= PAGE_BYTES:
+                if scanned < len(primary_keys):
+                    last_key = item
+                break
+
+        response = self._charge(
+            operation, table.name, read=self._read_units(read_bytes, kwargs.get('ConsistentRead', False)), kwargs=kwargs
+        )
+        response.update({'Count': len(items), 'ScannedCount': scanned})
+        if kwargs.get('Select') != 'COUNT':
+            if 'ProjectionExpression' in kwargs:
+                names = expression.projection(kwargs['ProjectionExpression'])
+                items = [{name: item[name] for name in names if name in item} for item in items]
+            response['Items'] = [aws.serialize(item) for item in items]
+        if last_key is not None:
+            key_names = {table.key[0], table.key[1], *(kwargs.get('IndexName') and table.indexes[kwargs['IndexName']] or ())}
+            response['LastEvaluatedKey'] = aws.serialize({name: last_key[name] for name in key_names if name})
+        return response
+
+
+class FakeSns:
+    """
+    An SNS client that keeps the published messages.
+    """
+    def __init__(self):
+        self.messages = []
+
+    def publish(self, **kwargs):
+        self.messages.append(kwargs)
+        return {'MessageId': str(uuid.uuid4())}
+
+
+class FakeLambda:
+    """
+    A Lambda client that keeps the asynchronous invocations instead of running them.
+    """
+    def __init__(self):
+        self.invocations = []
+
+    def invoke(self, **kwargs):
+        self.invocations.append(kwargs)
+        return {'StatusCode': 202}
+
+
+class FakeAws:
+    """
+    The stand-in clients of one benchmark run.
+
+    Attributes:
+        dynamodb (FakeDynamoDB): The DynamoDB stand-in.
+        sns (FakeSns): The SNS stand-in.
+        lambda_client (FakeLambda): The Lambda stand-in.
+    """
+    def __init__(self, schemas=TABLE_SCHEMAS):
+        self.dynamodb = FakeDynamoDB(schemas)
+        self.sns = FakeSns()
+        self.lambda_client = FakeLambda()
+
+    def client(self, service_name, **config):
+        clients = {'dynamodb': self.dynamodb, 'sns': self.sns, 'lambda': self.lambda_client}
+        if service_name not in clients:
+            raise NotImplementedError(f"No stand-in for the {service_name} client")
+        return clients[service_name]
+
+    @contextmanager
+    def install(self):
+        """
+        Routes every client of `cirrus_common.aws` to the stand-ins while active.
+        """
+        original = aws.client
+        aws.client = self.client
+        try:
+            yield self
+        finally:
+            aws.client = original
@@ -0,0 +1,207 @@
+"""
+Offline benchmark of the ingestion and detector handlers.
+
+Each point of a (rules x events x window) grid runs the real `lambda_handler`s
+against the in-process stand-ins of `fake_aws` with synthetic CloudTrail events
+and rules (see `synthetic`), so no AWS account or network access is needed:
+
+1. The rules are stored in a fresh rules table together with a rules version marker.
+2. The events are delivered to the ingestion handler in SQS batches, and the
+   ingestion throughput and the read and write units it consumed are measured.
+3. The detector handler runs once at the end of the window (a cold run that loads
+   and compiles the rules) and once more (a warm run), and its latency and
+   consumed units are measured.
+
+Example:
+    python benchmarks/handlers.py --rules 10,100 --events 1000,10000 --windows 5,60
+    python benchmarks/handlers.py --json > baseline.jsonl
+"""
+import os
+import sys
+import json
+import time
+import uuid
+import argparse
+import importlib
+from datetime import datetime, timedelta
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+COMMON_LAYER = os.path.join(ROOT, 'src', 'layers', 'common', 'python')
+sys.path[:0] = [ROOT, COMMON_LAYER]
+
+# Configuration of the handler modules, read when they are imported.
+ENVIRONMENT = {
+    'AWS_DEFAULT_REGION': 'us-east-1',
+    'DYNAMODB_EVENTS_TABLE': 'events',
+    'DYNAMODB_RULES_TABLE': 'rules',
+    'DYNAMODB_COUNTERS_TABLE': 'counters',
+    'DYNAMODB_STATE_TABLE': 'state',
+    'SNS_TOPIC_NAME': 'alerts',
+    'SNS_TOPIC_ARN': 'arn:aws:sns:us-east-1:123456789012:alerts',
+    'DETECTOR_SHARDS': '1',
+    'LOG_LEVEL': 'ERROR',
+    'LOG_SAMPLE_RATE': '0'
+}
+
+from fake_aws import FakeAws
+from synthetic import generate_events, generate_rules, TIME_FORMAT
+
+# The end of every benchmark window; the detector evaluates the rules at this time.
+CURRENT_TIME = datetime(2026, 1, 1, 12, 0, 0)
+FUNCTION_ARN = 'arn:aws:lambda:us-east-1:123456789012:function:cloud-anomaly-detector'
+
+
+class Context:
+    """
+    A Lambda context with the attributes the handlers read.
+    """
+    invoked_function_arn = FUNCTION_ARN
+
+    def get_remaining_time_in_millis(self):
+        return 900000
+
+
+def load_handlers(filter_mode, count_source):
+    """
+    Imports the ingestion and detector modules with the benchmark configuration.
+
+    Args:
+        filter_mode (str): The INGEST_FILTER_MODE of the ingestion function.
+        count_source (str): The EVENT_COUNT_SOURCE of the detector.
+
+    Returns:
+        tuple: The ingestion and detector modules.
+    """
+    os.environ.update(ENVIRONMENT, INGEST_FILTER_MODE=filter_mode, EVENT_COUNT_SOURCE=count_source)
+    ingestion = importlib.import_module('src.functions.data_injestion.lambda_function')
+    detector = importlib.import_module('src.functions.anomaly_detector.lambda_function')
+    return ingestion, detector
+
+
+def reset_containers(ingestion, detector):
+    """
+    Clears the state warm containers keep between invocations.
+    """
+    ingestion._rule_index = (None, None)
+    ingestion.recent_event_keys.clear()
+    detector._cached_rules = (None, None, None)
+
+
+def units(fake):
+    """
+    Returns the read and write units consumed so far over all tables.
+    """
+    return sum(fake.dynamodb.read_units.values()), sum(fake.dynamodb.write_units.values())
+
+
+def sqs_batches(events, batch_size):
+    """
+    Wraps the events into SQS invocation payloads of at most batch_size records.
+    """
+    for i in range(0, len(events), batch_size):
+        yield {'Records': [{'messageId': str(i + j), 'body': json.dumps(event)} for j, event in enumerate(events[i:i + batch_size])]}
+
+
+def run_point(ingestion, detector, rule_count, event_count, window, batch_size, seed):
+    """
+    Runs ingestion and detection for one point of the grid.
+
+    Args:
+        ingestion (module): The ingestion function module.
+        detector (module): The detector function module.
+        rule_count (int): The number of rules.
+        event_count (int): The number of events ingested.
+        window (int): The time window of the rules in minutes.
+        batch_size (int): The number of events per ingestion invocation.
+        seed (int): The random seed of the synthetic data.
+
+    Returns:
+        dict: The measurements.
+    """
+    fake = FakeAws()
+    reset_containers(ingestion, detector)
+    rules = generate_rules(rule_count, window, event_count, seed=seed)
+    fake.dynamodb.seed('rules', rules)
+    fake.dynamodb.seed('state', [{'stateKey': detector.RULES_VERSION_STATE_KEY, 'version': str(uuid.uuid4())}])
+    # Half of the events fall into the rules' window.
+    events = generate_events(event_count, CURRENT_TIME - timedelta(minutes=2 * window), CURRENT_TIME, seed=seed)
+    payloads = list(sqs_batches(events, batch_size))
+    context = Context()
+
+    with fake.install():
+        started = time.perf_counter()
+        for payload in payloads:
+            ingestion.lambda_handler(payload, context)
+        ingest_seconds = time.perf_counter() - started
+        ingest_read, ingest_write = units(fake)
+
+        detect_event = {'currentTime': CURRENT_TIME.strftime(TIME_FORMAT)}
+        started = time.perf_counter()
+        detector.lambda_handler(detect_event, context)
+        cold_seconds = time.perf_counter() - started
+        detect_read, detect_write = units(fake)
+        # Every anomaly outside its cool-down claims an alert item in the state table.
+        anomalies = sum(1 for item in fake.dynamodb.tables['state'].items.values() if 'lastAlertAt' in item)
+        started = time.perf_counter()
+        detector.lambda_handler(detect_event, context)
+        warm_seconds = time.perf_counter() - started
+
+    return {
+        'rules': rule_count,
+        'events': event_count,
+        'window': window,
+        'ingestEventsPerSecond': round(event_count / ingest_seconds) if ingest_seconds else None,
+        'ingestReadUnits': ingest_read,
+        'ingestWriteUnits': ingest_write,
+        'detectColdMs': round(cold_seconds * 1000, 1),
+        'detectWarmMs': round(warm_seconds * 1000, 1),
+        'detectReadUnits': detect_read - ingest_read,
+        'detectWriteUnits': detect_write - ingest_write,
+        'anomalies': anomalies,
+        'alertMessages': len(fake.sns.messages)
+    }
+
+
+COLUMNS = [
+    ('rules', 'rules', 7), ('events', 'events', 8), ('window', 'window', 7),
+    ('ingestEventsPerSecond', 'ingest ev/s', 12), ('ingestReadUnits', 'ingest RU', 11), ('ingestWriteUnits', 'ingest WU', 11),
+    ('detectColdMs', 'detect ms', 11), ('detectWarmMs', 'warm ms', 10),
+    ('detectReadUnits', 'detect RU', 11), ('detectWriteUnits', 'detect WU', 11), ('anomalies', 'anomalies', 11)
+]
+
+
+def int_list(value):
+    return [int(part) for part in value.split(',') if part]
+
+
+def main(argv=None):
+    """
+    Command line entry point printing one row (or JSON line) per grid point.
+    """
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion and detector handlers offline.")
+    parser.add_argument('--rules', type=int_list, default=[10, 100, 1000], help="Comma-separated rule counts.")
+    parser.add_argument('--events', type=int_list, default=[1000, 10000], help="Comma-separated event counts.")
+    parser.add_argument('--windows', type=int_list, default=[5, 60], help="Comma-separated rule windows in minutes.")
+    parser.add_argument('--batch-size', type=int, default=100, help="Events per ingestion invocation.")
+    parser.add_argument('--filter-mode', default='aggregate', choices=['off', 'aggregate', 'skip'], help="INGEST_FILTER_MODE.")
+    parser.add_argument('--count-source', default='counters', choices=['counters', 'events', 'checkpoint'], help="EVENT_COUNT_SOURCE.")
+    parser.add_argument('--seed', type=int, default=0, help="Seed of the synthetic events and rules.")
+    parser.add_argument('--json', action='store_true', help="Print one JSON object per grid point.")
+    args = parser.parse_args(argv)
+
+    ingestion, detector = load_handlers(args.filter_mode, args.count_source)
+    if not args.json:
+        print(''.join(f"{title:>{width}}" for _, title, width in COLUMNS))
+    for rule_count in args.rules:
+        for event_count in args.events:
+            for window in args.windows:
+                result = run_point(ingestion, detector, rule_count, event_count, window, args.batch_size, args.seed)
+                if args.json:
+                    print(json.dumps(result))
+                else:
+                    print(''.join(f"{result[key]:>{width}}" for key, _, width in COLUMNS))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,144 @@
+"""
+Synthetic CloudTrail events and anomaly rules for the benchmarks.
+
+Event names and principals are drawn from skewed (Zipf-like) distributions, as in
+real trails a few principals and API calls make up most of the traffic. Everything
+is derived from a seed, so a benchmark run is reproducible.
+"""
+import uuid
+import random
+from datetime import timedelta
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+
+# (eventSource, eventName) pairs of common management events.
+EVENT_TYPES = [
+    ('ec2.amazonaws.com', 'RunInstances'),
+    ('ec2.amazonaws.com', 'TerminateInstances'),
+    ('ec2.amazonaws.com', 'DescribeInstances'),
+    ('ec2.amazonaws.com', 'AuthorizeSecurityGroupIngress'),
+    ('ec2.amazonaws.com', 'CreateSecurityGroup'),
+    ('s3.amazonaws.com', 'CreateBucket'),
+    ('s3.amazonaws.com', 'DeleteBucket'),
+    ('s3.amazonaws.com', 'PutBucketPolicy'),
+    ('iam.amazonaws.com', 'CreateUser'),
+    ('iam.amazonaws.com', 'AttachUserPolicy'),
+    ('iam.amazonaws.com', 'CreateAccessKey'),
+    ('iam.amazonaws.com', 'DeleteRole'),
+    ('lambda.amazonaws.com', 'CreateFunction20150331'),
+    ('lambda.amazonaws.com', 'UpdateFunctionCode20150331v2'),
+    ('rds.amazonaws.com', 'CreateDBInstance'),
+    ('rds.amazonaws.com', 'DeleteDBInstance'),
+    ('kms.amazonaws.com', 'ScheduleKeyDeletion'),
+    ('sts.amazonaws.com', 'AssumeRole'),
+    ('cloudtrail.amazonaws.com', 'StopLogging'),
+    ('dynamodb.amazonaws.com', 'DeleteTable')
+]
+REGIONS = ['us-east-1', 'us-west-2', 'eu-west-1', 'ap-southeast-1']
+
+
+def principal_ids(count):
+    """
+    Returns the principal IDs of the synthetic identities.
+
+    Args:
+        count (int): The number of principals.
+
+    Returns:
+        list: The principal IDs.
+    """
+    return [f"AIDABENCHMARK{index:07d}" for index in range(count)]
+
+
+def zipf_weights(count, exponent=1.1):
+    """
+    Returns Zipf-like weights for ranks 1 to count.
+    """
+    return [1 / rank ** exponent for rank in range(1, count + 1)]
+
+
+def generate_events(count, start_time, end_time, principals=50, seed=0):
+    """
+    Generates EventBridge events carrying CloudTrail management events.
+
+    Args:
+        count (int): The number of events.
+        start_time (datetime): The earliest event time (UTC).
+        end_time (datetime): The latest event time (UTC).
+        principals (int, optional): The number of distinct principals.
+        seed (int, optional): The random seed.
+
+    Returns:
+        list: The events, ordered by event time.
+    """
+    rng = random.Random(seed)
+    identities = principal_ids(principals)
+    span_seconds = max(1, int((end_time - start_time).total_seconds()))
+    event_types = rng.choices(EVENT_TYPES, weights=zipf_weights(len(EVENT_TYPES)), k=count)
+    principal_choices = rng.choices(identities, weights=zipf_weights(len(identities)), k=count)
+    offsets = sorted(rng.randrange(span_seconds + 1) for _ in range(count))
+
+    events = []
+    for offset, (event_source, event_name), principal_id in zip(offsets, event_types, principal_choices):
+        events.append({
+            'version': '0',
+            'id': str(uuid.UUID(int=rng.getrandbits(128))),
+            'detail-type': 'AWS API Call via CloudTrail',
+            'source': 'aws.' + event_source.split('.')[0],
+            'detail': {
+                'eventVersion': '1.08',
+                'userIdentity': {'type': 'IAMUser', 'principalId': principal_id},
+                'eventTime': (start_time + timedelta(seconds=offset)).strftime(TIME_FORMAT),
+                'eventSource': event_source,
+                'eventName': event_name,
+                'awsRegion': rng.choice(REGIONS),
+                'sourceIPAddress': f"198.51.100.{rng.randrange(1, 255)}",
+                'requestParameters': {'resourceId': f"res-{rng.getrandbits(32):08x}", 'dryRun': False},
+                'eventID': str(uuid.UUID(int=rng.getrandbits(128))),
+                'eventCategory': 'Management'
+            }
+        })
+    return events
+
+
+def generate_rules(count, window_minutes, event_count, principals=50, rule_types=('count-based',), seed=0):
+    """
+    Generates anomaly rules over the synthetic event names and principals.
+
+    Every third rule counts the events of any principal; the others are scoped to one
+    principal. Thresholds are drawn around the expected count of the rule's series,
+    so some of the rules fire.
+
+    Args:
+        count (int): The number of rules.
+        window_minutes (int): The 'timeWindow' of every rule.
+        event_count (int): The number of events in the window, to scale the thresholds.
+        principals (int, optional): The number of distinct principals.
+        rule_types (tuple, optional): The rule types, used in turn.
+        seed (int, optional): The random seed.
+
+    Returns:
+        list: The rules, as stored in the rules table.
+    """
+    rng = random.Random(seed)
+    identities = principal_ids(principals)
+    expected_per_name = max(1, event_count // len(EVENT_TYPES))
+    rules = []
+    for index in range(count):
+        rule_type = rule_types[index % len(rule_types)]
+        _, metric = rng.choices(EVENT_TYPES, weights=zipf_weights(len(EVENT_TYPES)))[0]
+        target = 'all' if index % 3 == 0 else rng.choice(identities)
+        expected = expected_per_name if target == 'all' else max(1, expected_per_name // principals)
+        rule = {
+            'ruleId': str(uuid.UUID(int=rng.getrandbits(128))),
+            'ruleType': rule_type,
+            'metric': metric,
+            'target': target,
+            'threshold': rng.randint(1, 2 * expected),
+            'timeWindow': window_minutes
+        }
+        if rule_type == 'distinct-count':
+            rule['distinctField'] = 'region'
+            rule['threshold'] = rng.randint(1, len(REGIONS))
+        rules.append(rule)
+    return rules
@@ -0,0 +1,161 @@
+# NumPy is imported by the functions that use it, so importing the detector (e.g. from
+# the stream handler) does not load it at cold start unless baseline rules are scored.
+DEFAULT_HISTORY_WINDOWS = 24
+MIN_STDDEV = 1.0
+
+def bucket_series(minute_counts, current_time, window_minutes, history_windows, max_series=None):
+    """
+    Bins per-minute event counts into per-identity count series of fixed-width buckets.
+
+    Each series has 'history_windows' past buckets followed by the current bucket,
+    each 'window_minutes' minute buckets wide. Like the count windows, the current
+    bucket ends with the minute bucket of 'current_time', including it. The binning
+    is done with NumPy for all counts at once instead of a Python loop per series.
+
+    Args:
+        minute_counts (dict): A mapping of minute bucket ('YYYY-MM-DDTHH:MM') to a
+            mapping of identity to event count.
+        current_time (datetime): The end of the current bucket (UTC).
+        window_minutes (int): The width of a bucket in minutes.
+        history_windows (int): The number of past buckets.
+        max_series (int, optional): Keeps only the busiest series to bound memory.
+
+    Returns:
+        tuple: The list of series identities and a float32 matrix of shape
+               (series, history_windows + 1) with the current bucket last.
+    """
+    import numpy as np
+    identities = [identity for counts in minute_counts.values() for identity in counts]
+    if not identities:
+        return [], np.zeros((0, history_windows + 1), dtype=np.float32)
+
+    buckets = np.array([bucket for bucket, counts in minute_counts.items() for _ in counts], dtype='datetime64[m]')
+    counts = np.array([count for counts in minute_counts.values() for count in counts.values()], dtype=np.float32)
+    now = np.datetime64(current_time.strftime('%Y-%m-%dT%H:%M'), 'm')
+    age = (now - buckets).astype(np.int64)
+    offsets = age // window_minutes
+    valid = (age >= 0) & (offsets <= history_windows)
+
+    series_ids, rows = np.unique(np.asarray(identities)[valid], return_inverse=True)
+    matrix = np.zeros((len(series_ids), history_windows + 1), dtype=np.float32)
+    np.add.at(matrix, (rows, history_windows - offsets[valid]), counts[valid])
+
+    if max_series is not None and len(series_ids) > max_series:
+        busiest = np.sort(np.argsort(matrix.sum(axis=1))[-max_series:])
+        series_ids, matrix = series_ids[busiest], matrix[busiest]
+    return series_ids.tolist(), matrix
+
+
+def stack_series(matrices):
+    """
+    Stacks series matrices of different history lengths into one matrix.
+
+    Shorter histories are padded on the left with NaN, so the current buckets of
+    all series line up in the last column.
+
+    Args:
+        matrices (list): Matrices of shape (series, history + 1).
+
+    Returns:
+        numpy.ndarray: A float32 matrix of shape (total series, longest history + 1).
+    """
+    import numpy as np
+    width = max((m.shape[1] for m in matrices), default=1)
+    stacked = np.full((sum(len(m) for m in matrices), width), np.nan, dtype=np.float32)
+    row = 0
+    for matrix in matrices:
+        stacked[row:row + len(matrix), width - matrix.shape[1]:] = matrix
+        row += len(matrix)
+    return stacked
+
+
+def ewma_baseline(history):
+    """
+    Computes the exponentially weighted mean and standard deviation of each series.
+
+    The smoothing factor of a series is 2 / (n + 1) for its n history buckets. The
+    recursion runs over the bucket columns and is vectorized across all series;
+    NaN padding is skipped.
+
+    Args:
+        history (numpy.ndarray): The history buckets, shape (series, buckets).
+
+    Returns:
+        tuple: Arrays of the baseline mean and standard deviation per series.
+    """
+    import numpy as np
+    alpha = 2.0 / (np.sum(~np.isnan(history), axis=1) + 1)
+    mean = np.full(len(history), np.nan)
+    var = np.zeros(len(history))
+    for column in history.T:
+        valid = ~np.isnan(column)
+        first = valid & np.isnan(mean)
+        mean[first] = column[first]
+        update = valid & ~first
+        diff = column[update] - mean[update]
+        increment = alpha[update] * diff
+        mean[update] += increment
+        var[update] = (1 - alpha[update]) * (var[update] + diff * increment)
+    return mean, np.sqrt(var)
+
+
+def score_series(stacked, use_ewma):
+    """
+    Scores the current bucket of every series against the series' own history.
+
+    The score is the deviation of the current bucket from the baseline mean in
+    units of the baseline standard deviation (floored at MIN_STDDEV so flat series
+    do not divide by zero). The baseline is either the plain mean and standard
+    deviation of the history (z-score) or their exponentially weighted versions.
+
+    Args:
+        stacked (numpy.ndarray): Series from `stack_series`, current bucket last.
+        use_ewma (numpy.ndarray): Per-series booleans selecting the EWMA baseline.
+
+    Returns:
+        tuple: Arrays of the score and the baseline mean per series.
+    """
+    import numpy as np
+    history = stacked[:, :-1]
+    current = stacked[:, -1]
+
+    mean = np.nanmean(history, axis=1)
+    std = np.nanstd(history, axis=1)
+    if np.any(use_ewma):
+        ewma_mean, ewma_std = ewma_baseline(history)
+        mean = np.where(use_ewma, ewma_mean, mean)
+        std = np.where(use_ewma, ewma_std, std)
+
+    return (current - mean) / np.maximum(std, MIN_STDDEV), mean
+
+
+def score_rules(blocks):
+    """
+    Scores the series of many baseline rules in one vectorized batch.
+
+    Args:
+        blocks (list): One (series_ids, matrix, threshold, use_ewma) tuple per rule.
+
+    Returns:
+        list: For each block, the (identity, current count, baseline mean, score)
+              tuples of the series whose score exceeds the rule's threshold.
+    """
+    import numpy as np
+    if not blocks:
+        return []
+
+    stacked = stack_series([matrix for _, matrix, _, _ in blocks])
+    thresholds = np.concatenate([np.full(len(ids), threshold, dtype=float) for ids, _, threshold, _ in blocks])
+    use_ewma = np.concatenate([np.full(len(ids), ewma, dtype=bool) for ids, _, _, ewma in blocks])
+    scores, means = score_series(stacked, use_ewma)
+    flagged = scores > thresholds
+
+    results = []
+    row = 0
+    for series_ids, _, _, _ in blocks:
+        results.append([
+            (series_ids[i - row], int(stacked[i, -1]), float(means[i]), float(scores[i]))
+            for i in np.flatnonzero(flagged[row:row + len(series_ids)]) + row
+        ])
+        row += len(series_ids)
+    return results
@@ -0,0 +1,115 @@
+import zlib
+import hashlib
+
+# NumPy is imported by the functions that use it, so it is only loaded at cold start
+# when distinct-count rules are evaluated.
+
+# 2^10 registers: ~1 KB per sketch (much less once compressed) and ~3% standard error.
+PRECISION = 10
+REGISTERS = 1 << PRECISION
+HASH_BITS = 64
+
+def new_sketch():
+    """
+    Returns an empty HyperLogLog sketch.
+
+    Returns:
+        numpy.ndarray: The uint8 registers of the sketch.
+    """
+    import numpy as np
+    return np.zeros(REGISTERS, dtype=np.uint8)
+
+
+def sketch_values(values):
+    """
+    Builds a HyperLogLog sketch of a collection of values.
+
+    Each value is hashed to 64 bits; the first PRECISION bits select a register and
+    the register keeps the maximum rank (position of the first set bit) of the
+    remaining bits seen so far.
+
+    Args:
+        values (iterable): The values to add, converted to strings.
+
+    Returns:
+        numpy.ndarray: The uint8 registers of the sketch.
+    """
+    import numpy as np
+    sketch = new_sketch()
+    indexes = []
+    ranks = []
+    suffix_bits = HASH_BITS - PRECISION
+    for value in values:
+        h = int.from_bytes(hashlib.blake2b(str(value).encode('utf-8'), digest_size=8).digest(), 'big')
+        indexes.append(h >> suffix_bits)
+        ranks.append(suffix_bits - (h & ((1 << suffix_bits) - 1)).bit_length() + 1)
+    if indexes:
+        np.maximum.at(sketch, np.array(indexes), np.array(ranks, dtype=np.uint8))
+    return sketch
+
+
+def merge_sketches(sketches):
+    """
+    Merges sketches into one describing the union of their values.
+
+    Args:
+        sketches (iterable): The sketches to merge.
+
+    Returns:
+        numpy.ndarray: The merged sketch.
+    """
+    import numpy as np
+    merged = new_sketch()
+    for sketch in sketches:
+        np.maximum(merged, sketch, out=merged)
+    return merged
+
+
+def estimate(sketch):
+    """
+    Estimates the number of distinct values in a sketch.
+
+    Uses the HyperLogLog estimator with linear counting for small cardinalities,
+    which makes estimates exact in practice for the handful of regions or resource
+    types a single identity touches.
+
+    Args:
+        sketch (numpy.ndarray): The sketch registers.
+
+    Returns:
+        int: The estimated number of distinct values.
+    """
+    import numpy as np
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS * REGISTERS / np.sum(np.power(2.0, -sketch.astype(np.float64)))
+    zeros = int(np.count_nonzero(sketch == 0))
+    if raw <= 2.5 * REGISTERS and zeros:
+        return int(round(REGISTERS * np.log(REGISTERS / zeros)))
+    return int(round(raw))
+
+
+def to_bytes(sketch):
+    """
+    Serializes a sketch into compressed bytes for storage.
+
+    Args:
+        sketch (numpy.ndarray): The sketch registers.
+
+    Returns:
+        bytes: The zlib-compressed registers.
+    """
+    return zlib.compress(sketch.tobytes())
+
+
+def from_bytes(data):
+    """
+    Restores a sketch serialized by `to_bytes`.
+
+    Args:
+        data (bytes): The zlib-compressed registers.
+
+    Returns:
+        numpy.ndarray: The sketch registers.
+    """
+    import numpy as np
+    return np.frombuffer(zlib.decompress(bytes(data)), dtype=np.uint8).copy()
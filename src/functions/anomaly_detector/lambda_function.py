@@ -1,139 +1,1334 @@
 import os
 import json
-import boto3
+import time
+import zlib
+from botocore.exceptions import ClientError
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 
-dynamodb = boto3.resource('dynamodb')
-sns = boto3.client('sns')
+from cirrus_common import aws
+from cirrus_common.logger import get_logger
+from cirrus_common.event_schema import FIELD_ATTRIBUTES, event_time_upper_bound
+from cirrus_common.rule_index import compile_rules, rule_target, WILDCARD_METRIC, RULES_VERSION_STATE_KEY
+from .baseline import bucket_series, score_rules, DEFAULT_HISTORY_WINDOWS
+from . import hyperloglog
+
+# Rules are evaluated concurrently; every worker can have one request in flight,
+# so the shared HTTP connection pool is sized to the number of workers.
+max_workers = int(os.environ.get('DETECTOR_MAX_WORKERS', '16'))
+
+# Low-level clients are created on first use and shared (see `cirrus_common.aws`).
+dynamodb = aws.DynamoDB(max_pool_connections=max_workers)
+sns = aws.LazyClient('sns', max_pool_connections=max_workers)
+lambda_client = aws.LazyClient('lambda')
+logger = get_logger('anomaly_detector')
 
 sns_topic_name = os.environ['SNS_TOPIC_NAME']
+sns_topic_arn = os.environ.get('SNS_TOPIC_ARN')
 
 events_table = dynamodb.Table(os.environ['DYNAMODB_EVENTS_TABLE'])
 rules_table = dynamodb.Table(os.environ['DYNAMODB_RULES_TABLE'])
 
+# Optional table of pre-aggregated per-minute event counters maintained at ingestion.
+counters_table_name = os.environ.get('DYNAMODB_COUNTERS_TABLE')
+counters_table = dynamodb.Table(counters_table_name) if counters_table_name else None
+
+# Optional table of detector state, such as the per-rule alert suppression windows.
+state_table_name = os.environ.get('DYNAMODB_STATE_TABLE')
+state_table = dynamodb.Table(state_table_name) if state_table_name else None
+alert_cooldown_minutes = int(os.environ.get('ALERT_COOLDOWN_MINUTES', '60'))
+
+# Where event counts come from: 'events' (raw event queries), 'counters' (per-minute
+# counters maintained at ingestion) or 'checkpoint' (incremental windows kept in the
+# state table). Defaults to 'counters' when a counters table is configured.
+event_count_source = os.environ.get('EVENT_COUNT_SOURCE')
+checkpoint_lateness_minutes = int(os.environ.get('CHECKPOINT_LATENESS_MINUTES', '5'))
+
+# Large rule sets are split into shards evaluated by parallel invocations of this function,
+# and each invocation hands the work it could not start within its time budget (the
+# remaining time minus a reserve for in-flight work and alerting) to a continuation.
+detector_shards = int(os.environ.get('DETECTOR_SHARDS', '1'))
+time_reserve_ms = int(os.environ.get('DETECTOR_TIME_RESERVE_MS', '30000'))
+
+# Upper bound on the identity series scored per baseline rule, to stay within Lambda memory.
+baseline_max_series = int(os.environ.get('BASELINE_MAX_SERIES', '5000'))
+
+# The rules loaded by this container, the rules version they were loaded at and when
+# (monotonic seconds): (version, rules, loaded at). Cached rules are reloaded after
+# RULES_CACHE_MAX_AGE_SECONDS even if the version is unchanged, so a missed version
+# change (e.g. a rule edited directly in DynamoDB) is picked up eventually.
+_cached_rules = (None, None, None)
+rules_cache_max_age_seconds = int(os.environ.get('RULES_CACHE_MAX_AGE_SECONDS', '900'))
+
+TIME_FORMAT = "%Y-%m-%dT%H:%M:%SZ"
+BUCKET_FORMAT = "%Y-%m-%dT%H:%M"
+EVENT_NAME_INDEX = "EventNameIndex"
+DISTINCT_FIELDS = ['region', 'resourceType']
+ALERT_SUBJECT = "Cloud Resource Anomaly Detected!"
+MAX_SNS_MESSAGE_BYTES = 250000
+# DynamoDB items are limited to 400 KB; leaves room for the key and other attributes.
+MAX_CHECKPOINT_ITEM_BYTES = 350000
+# Keeps continuation payloads well below the 256 KB limit of asynchronous invocations.
+MAX_CONTINUATION_UNITS = 500
+
+@aws.logs_consumed_capacity(logger)
 def lambda_handler(event, context):
     """
     Main function for the Lambda handler.
 
-    This function orchestrates the anomaly detection process. It scans for active rules in the
-    'rules_table' and, for each rule, triggers a check for anomalies based on events in the
-    'events_table'. If an anomaly is detected, it publishes an alert message to an SNS topic.
+    This function orchestrates the anomaly detection process. It loads the active rules from the
+    'rules_table' (scanning it only when the rules version changed, see `load_rules`), compiles
+    them into an index by metric and target (reused across runs of a warm container while the
+    rules are unchanged) and splits them into units of work, one per series (see
+    `build_work_units`). The units are evaluated concurrently on a bounded thread
+    pool. Each unit counts the matching events of its series once and then checks every rule
+    against those counts. Baseline rules are scored together in one vectorized batch (see
+    `evaluate_baseline_rules`) and distinct-count rules share one sketch per series (see
+    `evaluate_distinct_rules`). The anomalies of the run that are not inside their rule's
+    suppression window are published to an SNS topic as a single digest.
+
+    With 'DETECTOR_SHARDS' above one, the scheduled invocation only fans the units out to
+    one asynchronous invocation per shard. Units that could not be started before the time
+    budget ran out are never dropped: they are handed to a continuation invocation, which
+    evaluates them for the same point in time.
 
     Args:
-        event (dict): The event dictionary passed to the Lambda function.
+        event (dict): The event dictionary passed to the Lambda function. Shard and
+            continuation invocations carry 'currentTime' and either 'shard' and
+            'shardCount' or 'pendingUnits'.
         context (LambdaContext): The context object for the Lambda function.
 
     Returns:
         dict: A dictionary with a status code and a body message.
     """
-    print("Starting anomaly detection analysis.")
+    logger.start_invocation()
+    logger.info("Starting anomaly detection analysis.")
     
     aws_region = context.invoked_function_arn.split(":")[3]
     aws_account_id = context.invoked_function_arn.split(":")[4]
 
-    send_alert_with_context = lambda msg: send_alert(msg, aws_region, aws_account_id)
-
     # Get all active rules from the DynamoDB rules table.
     try:
-        rules_response = rules_table.scan()
-        rules = rules_response['Items']
+        rules, rules_version = load_rules()
     except Exception as e:
-        print(f"Error scanning rules table: {e}")
+        logger.error("Error scanning rules table", error=str(e))
         return
 
     if not rules:
-        print("No anomaly rules found. Exiting.")
+        logger.info("No anomaly rules found. Exiting.")
         return
-        
-    for rule in rules:
-        try:
-            # For each rule, query the resource events table.
-            check_anomaly(rule, send_alert_with_context)
-        except Exception as e:
-            print(f"Error processing rule {rule.get('ruleId')}: {e}")
 
-    print("Anomaly detection analysis complete.")
+    if event.get('currentTime'):
+        current_time = datetime.strptime(event['currentTime'], TIME_FORMAT)
+    else:
+        current_time = datetime.utcnow().replace(microsecond=0)
+    work_units = build_work_units(compile_rules(rules, rules_version))
+
+    if detector_shards > 1 and 'shard' not in event and 'pendingUnits' not in event:
+        fan_out_shards(detector_shards, current_time, context)
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f"Analysis fanned out to {detector_shards} shards.")
+        }
+    work_units = select_work_units(work_units, event)
+
+    anomalies = []
+    report_anomaly = lambda rule, message: anomalies.append((rule, message))
+    started_units = []
+    deferred_units = []
+
+    def run_unit(key, function, *args):
+        # At least one unit runs per invocation, so continuations always make progress.
+        if started_units and time_budget_exhausted(context):
+            deferred_units.append(key)
+            return None
+        started_units.append(key)
+        return function(*args)
+
+    # Evaluate the units concurrently on a bounded worker pool.
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        baseline_rules = []
+        for key, (rule_type, unit_rules) in work_units.items():
+            if rule_type == 'baseline':
+                baseline_rules.extend(unit_rules)
+            elif rule_type == 'distinct-count':
+                executor.submit(run_unit, key, evaluate_distinct_rules, unit_rules, report_anomaly, current_time)
+            else:
+                executor.submit(run_unit, key, evaluate_rules, unit_rules, report_anomaly, current_time)
+        evaluate_baseline_rules(baseline_rules, report_anomaly, current_time, executor, run_unit)
+
+    publish_anomalies(anomalies, current_time, aws_region, aws_account_id)
+
+    if deferred_units:
+        schedule_continuations(sorted(deferred_units), current_time, context)
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f"Analysis continued for {len(deferred_units)} of {len(work_units)} units.")
+        }
+
+    logger.info("Anomaly detection analysis complete.", units=len(work_units), anomalies=len(anomalies))
     return {
         'statusCode': 200,
         'body': json.dumps('Analysis complete.')
     }
 
 
-def check_anomaly(rule, send_alert_function):
+def build_work_units(rule_index):
+    """
+    Splits a compiled rule set into the detector's units of work.
+
+    Count-based rules form one unit per (metric, target) series, distinct-count rules
+    one unit per series and distinct field, and every baseline rule is a unit of its
+    own. Unit keys are stable across runs, so they can be used to shard the work and
+    to resume it in another invocation.
+
+    Args:
+        rule_index (RuleIndex): The compiled rules.
+
+    Returns:
+        dict: A mapping of unit key to (rule type, list of rules), sorted by key.
+    """
+    work_units = {}
+    for (metric, target), series_rules in rule_index.series('count-based').items():
+        work_units[f"count#{counter_key(metric, target)}"] = ('count-based', series_rules)
+    for (metric, target), series_rules in rule_index.series('distinct-count').items():
+        for rule in series_rules:
+            key = f"distinct#{rule.get('distinctField')}#{counter_key(metric, target)}"
+            work_units.setdefault(key, ('distinct-count', []))[1].append(rule)
+    for series_rules in rule_index.series('baseline').values():
+        for rule in series_rules:
+            work_units[f"baseline#{rule['ruleId']}"] = ('baseline', [rule])
+    return dict(sorted(work_units.items()))
+
+
+def select_work_units(work_units, event):
+    """
+    Returns the units of work an invocation is responsible for.
+
+    A shard invocation evaluates the units whose key hashes to its shard, and a
+    continuation evaluates the units listed in its event. Otherwise all units are
+    evaluated.
+
+    Args:
+        work_units (dict): All units of work, see `build_work_units`.
+        event (dict): The invocation event.
+
+    Returns:
+        dict: The selected units of work.
+    """
+    if 'pendingUnits' in event:
+        pending = set(event['pendingUnits'])
+        return {key: unit for key, unit in work_units.items() if key in pending}
+    if 'shard' in event:
+        shard, shard_count = int(event['shard']), int(event['shardCount'])
+        return {
+            key: unit for key, unit in work_units.items()
+            if zlib.crc32(key.encode('utf-8')) % shard_count == shard
+        }
+    return work_units
+
+
+def time_budget_exhausted(context):
+    """
+    Returns whether the invocation should stop starting new units of work.
+
+    Args:
+        context (LambdaContext): The context object for the Lambda function.
+
+    Returns:
+        bool: True once the remaining time is below the configured reserve.
+    """
+    return context.get_remaining_time_in_millis() < time_reserve_ms
+
+
+def invoke_self(payload, context):
+    """
+    Invokes this function asynchronously with the given event.
+
+    Args:
+        payload (dict): The event of the new invocation.
+        context (LambdaContext): The context object for the Lambda function.
+    """
+    lambda_client.invoke(
+        FunctionName=context.invoked_function_arn,
+        InvocationType='Event',
+        Payload=json.dumps(payload).encode('utf-8')
+    )
+
+
+def fan_out_shards(shard_count, current_time, context):
+    """
+    Starts one asynchronous invocation per shard of the rule set.
+
+    Args:
+        shard_count (int): The number of shards.
+        current_time (datetime): The point in time every shard evaluates (UTC).
+        context (LambdaContext): The context object for the Lambda function.
+    """
+    current_time_str = current_time.strftime(TIME_FORMAT)
+    for shard in range(shard_count):
+        invoke_self({'currentTime': current_time_str, 'shard': shard, 'shardCount': shard_count}, context)
+    logger.info("Fanned out anomaly detection", shards=shard_count)
+
+
+def schedule_continuations(pending_units, current_time, context):
+    """
+    Hands the units of work that were not started to continuation invocations.
+
+    Each continuation receives at most MAX_CONTINUATION_UNITS unit keys. A failure to
+    start a continuation is raised, so the invocation fails visibly instead of
+    silently skipping rules.
+
+    Args:
+        pending_units (list): The keys of the units that were not started.
+        current_time (datetime): The point in time the units are evaluated for (UTC).
+        context (LambdaContext): The context object for the Lambda function.
+    """
+    current_time_str = current_time.strftime(TIME_FORMAT)
+    for i in range(0, len(pending_units), MAX_CONTINUATION_UNITS):
+        chunk = pending_units[i:i + MAX_CONTINUATION_UNITS]
+        try:
+            invoke_self({'currentTime': current_time_str, 'pendingUnits': chunk}, context)
+        except Exception as e:
+            logger.error("Error scheduling continuation", units=chunk, error=str(e))
+            raise e
+    logger.warning("Time budget exhausted; continuing in a new invocation.", pendingUnits=len(pending_units))
+
+
+def evaluate_rules(rules, report_anomaly, current_time):
+    """
+    Counts the events for a group of rules and checks each rule for anomalies.
+
+    This function is the unit of work of the detector's worker pool. Errors are
+    isolated per rule: a failure to load the counts is reported for every rule of
+    the group, and a failure while checking one rule does not affect the others.
+
+    Args:
+        rules (list): The rules to evaluate, typically all rules on one metric and target.
+        report_anomaly (function): A callback receiving the breached rule and its alert message.
+        current_time (datetime): The end of the evaluation window (UTC).
+    """
+    try:
+        event_counts = load_event_counts(rules, current_time)
+    except Exception as e:
+        for rule in rules:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+        return
+
+    for rule in rules:
+        try:
+            check_anomaly(rule, lambda message, rule=rule: report_anomaly(rule, message), event_counts, current_time)
+        except Exception as e:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+
+
+def rule_window_minutes(rule):
+    """
+    Returns the time window of a rule in minutes, or None if it cannot be parsed.
+
+    Args:
+        rule (dict): A dictionary representing a single anomaly detection rule.
+
+    Returns:
+        int: The rule's time window in minutes, or None for a malformed rule.
+    """
+    try:
+        return int(rule['timeWindow'])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
+def counter_key(metric, target=None):
+    """
+    Returns the counter key of a metric, optionally scoped to a target identity.
+
+    The format matches the counters maintained by the data ingestion function:
+    the event name for metric-wide counters and 'identity#eventName' otherwise.
+
+    Args:
+        metric (str): The event name.
+        target (str, optional): The target identity.
+
+    Returns:
+        str: The counter key.
+    """
+    return f"{target}#{metric}" if target else metric
+
+
+def read_rules_version():
+    """
+    Returns the current rules version marker.
+
+    Rule management changes the marker in the state table on every write to the
+    rules table, so reading it is a single strongly consistent item read.
+
+    Returns:
+        str: The version marker, or None if there is no state table or no marker yet.
+    """
+    if state_table is None:
+        return None
+    item = state_table.get_item(Key={'stateKey': RULES_VERSION_STATE_KEY}, ConsistentRead=True).get('Item')
+    return item['version'] if item else None
+
+
+def scan_rules():
+    """
+    Reads every rule of the rules table, following pagination.
+
+    Returns:
+        list: The anomaly detection rules.
+    """
+    scan_kwargs = {'ConsistentRead': True}
+    rules = []
+    while True:
+        response = rules_table.scan(**scan_kwargs)
+        rules.extend(response.get('Items', []))
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            return rules
+        scan_kwargs['ExclusiveStartKey'] = last_key
+
+
+def load_rules():
+    """
+    Returns the active rules, scanning the rules table only when they changed.
+
+    The rules are kept at module level with the version marker they were loaded at
+    and reused by later runs of the warm container while the marker is unchanged,
+    for at most RULES_CACHE_MAX_AGE_SECONDS. The marker is read before the scan, so
+    a write racing with a reload is picked up by the next run at the latest. Without
+    a marker, every run scans the table.
+
+    Returns:
+        tuple: The list of rules and their version marker (None without a marker).
+    """
+    global _cached_rules
+    version = read_rules_version()
+    cached_version, cached, loaded_at = _cached_rules
+    now = time.monotonic()
+    if (version is not None and cached is not None and cached_version == version
+            and now - loaded_at < rules_cache_max_age_seconds):
+        return cached, version
+
+    rules = scan_rules()
+    _cached_rules = (version, rules, now) if version is not None else (None, None, None)
+    logger.debug("Loaded the rules", ruleCount=len(rules), rulesVersion=version)
+    return rules, version
+
+
+def query_events(metric, target, start_time_str, end_time_str, **query_kwargs):
+    """
+    Queries the events of a metric within a time range, following pagination.
+
+    For a target identity, the query reads only that identity's partition of the
+    events table (keyed on 'userIdentity' and 'eventTime') and filters on the event
+    name. For any identity, it reads the metric's partition of the 'EventNameIndex'
+    (keyed on 'eventName' and 'eventTime'). Either way, only the matching partition
+    is paid for instead of scanning the whole table. The wildcard metric '*' matches
+    every event name and is only supported for a target identity. The range ends
+    after the last 'eventTime' of the end second, including its event ID suffix.
+
+    Args:
+        metric (str): The event name to query.
+        target (str): The target identity, or None for any identity.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+        **query_kwargs: Extra arguments for the query, such as 'Select' or 'ProjectionExpression'.
+
+    Yields:
+        dict: Each page returned by DynamoDB.
+
+    Raises:
+        ValueError: If the metric is the wildcard and no target identity is given.
+    """
+    expression_values = {
+        ':start_time': start_time_str,
+        ':end_time': event_time_upper_bound(end_time_str)
+    }
+    if target:
+        expression_values[':target'] = target
+        query_kwargs['KeyConditionExpression'] = 'userIdentity = :target AND eventTime BETWEEN :start_time AND :end_time'
+        if metric != WILDCARD_METRIC:
+            expression_values[':metric'] = metric
+            query_kwargs['FilterExpression'] = 'eventName = :metric'
+    elif metric == WILDCARD_METRIC:
+        raise ValueError("A wildcard metric requires a target identity.")
+    else:
+        expression_values[':metric'] = metric
+        query_kwargs.update({
+            'IndexName': EVENT_NAME_INDEX,
+            'KeyConditionExpression': 'eventName = :metric AND eventTime BETWEEN :start_time AND :end_time'
+        })
+    query_kwargs['ExpressionAttributeValues'] = expression_values
+
+    while True:
+        response = events_table.query(**query_kwargs)
+        yield response
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+
+
+def count_events(metric, target, start_time_str, end_time_str):
+    """
+    Counts the events of a metric within a time range using 'Select=COUNT'.
+
+    Args:
+        metric (str): The event name to count.
+        target (str): The target identity, or None for any identity.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        int: The number of matching events across all pages.
+    """
+    return sum(
+        page.get('Count', 0)
+        for page in query_events(metric, target, start_time_str, end_time_str, Select='COUNT')
+    )
+
+
+def query_event_times(metric, target, start_time_str, end_time_str):
+    """
+    Returns the event times of a metric within a time range.
+
+    Args:
+        metric (str): The event name to query.
+        target (str): The target identity, or None for any identity.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        list: The 'eventTime' strings of all matching events.
+    """
+    return [
+        item['eventTime']
+        for page in query_events(metric, target, start_time_str, end_time_str, ProjectionExpression='eventTime')
+        for item in page.get('Items', [])
+    ]
+
+
+def query_bucket_counts(counter_key, start_bucket, end_bucket):
+    """
+    Returns the per-minute counts of a counter within a range of minute buckets.
+
+    Args:
+        counter_key (str): The counter key, see `counter_key`.
+        start_bucket (str): The inclusive first minute bucket ('YYYY-MM-DDTHH:MM').
+        end_bucket (str): The inclusive last minute bucket.
+
+    Returns:
+        dict: A mapping of minute bucket to event count.
+    """
+    query_kwargs = {
+        'KeyConditionExpression': 'counterKey = :key AND timeBucket BETWEEN :start_bucket AND :end_bucket',
+        'ProjectionExpression': 'timeBucket, eventCount',
+        'ExpressionAttributeValues': {
+            ':key': counter_key,
+            ':start_bucket': start_bucket,
+            ':end_bucket': end_bucket
+        }
+    }
+    bucket_counts = {}
+    while True:
+        response = counters_table.query(**query_kwargs)
+        for item in response.get('Items', []):
+            bucket_counts[item['timeBucket']] = int(item['eventCount'])
+        last_key = response.get('LastEvaluatedKey')
+        if not last_key:
+            break
+        query_kwargs['ExclusiveStartKey'] = last_key
+    return bucket_counts
+
+
+def load_bucketed_event_counts(windows_by_series, current_time):
+    """
+    Counts events from the pre-aggregated per-minute counters.
+
+    A window of N minutes is answered from the last N minute buckets, including the
+    current one, so the cost of a rule depends on its window length and not on the
+    number of events. Each series' counters are read once for its widest window.
+
+    Args:
+        windows_by_series (dict): A mapping of (metric, target) to the set of rule windows.
+        current_time (datetime): The end of the evaluation window (UTC).
+
+    Returns:
+        dict: A mapping of (metric, target, window minutes) to the number of events.
+    """
+    end_bucket = current_time.strftime(BUCKET_FORMAT)
+    event_counts = {}
+    for (metric, target), windows in windows_by_series.items():
+        start_buckets = {
+            window: (current_time - timedelta(minutes=window - 1)).strftime(BUCKET_FORMAT)
+            for window in windows
+        }
+        bucket_counts = query_bucket_counts(counter_key(metric, target), start_buckets[max(windows)], end_bucket)
+        for window in windows:
+            event_counts[(metric, target, window)] = sum(
+                count for bucket, count in bucket_counts.items() if bucket >= start_buckets[window]
+            )
+    return event_counts
+
+
+def refresh_checkpoint(state_key, window_minutes, current_time, fetch_buckets, encode=int, decode=int):
+    """
+    Slides the checkpointed per-minute buckets of a series forward to the current time.
+
+    The checkpoint is an item in the 'state_table' holding the per-minute buckets of
+    the series and the watermark of the run that wrote it. Only events newer than the
+    watermark are read, minus a small lateness allowance: the buckets from that point
+    on are recomputed from the raw events so late-arriving events are still included,
+    while older buckets are reused as they are. Buckets that slid out of the window are
+    dropped before the checkpoint is written back. A full read happens only without a
+    checkpoint or when the window grew. Without a state table, every run is a full read.
+    A run older than the checkpoint (e.g. a delayed continuation) only reuses buckets
+    before its own minute and never writes its older watermark back.
+
+    Args:
+        state_key (str): The key of the checkpoint item.
+        window_minutes (int): The widest window of the series in minutes.
+        current_time (datetime): The end of the window (UTC).
+        fetch_buckets (function): Builds the buckets of a time range from the raw events,
+            given the inclusive start and end time strings.
+        encode (function, optional): Converts a bucket value for storage.
+        decode (function, optional): Restores a stored bucket value.
+
+    Returns:
+        dict: A mapping of minute bucket to bucket value, covering the window.
+    """
+    current_time_str = current_time.strftime(TIME_FORMAT)
+    current_bucket = current_time.strftime(BUCKET_FORMAT)
+    oldest_bucket = (current_time - timedelta(minutes=window_minutes - 1)).strftime(BUCKET_FORMAT)
+
+    refresh_bucket = oldest_bucket
+    buckets = {}
+    checkpoint = state_table.get_item(Key={'stateKey': state_key}).get('Item') if state_table else None
+    newer_checkpoint = bool(checkpoint) and checkpoint['watermark'] > current_time_str
+    if checkpoint and int(checkpoint.get('windowMinutes', 0)) >= window_minutes:
+        watermark = datetime.strptime(checkpoint['watermark'], TIME_FORMAT)
+        # A continuation can run at an older time than the checkpoint's watermark; the
+        # current minute is always re-read and later buckets are never reused.
+        refresh_bucket = min(current_bucket, max(
+            oldest_bucket,
+            (watermark - timedelta(minutes=checkpoint_lateness_minutes)).strftime(BUCKET_FORMAT)
+        ))
+        buckets = {
+            bucket: decode(value) for bucket, value in checkpoint.get('buckets', {}).items()
+            if oldest_bucket <= bucket < refresh_bucket
+        }
+
+    buckets.update(fetch_buckets(f"{refresh_bucket}:00Z", current_time_str))
+
+    if state_table and not newer_checkpoint:
+        put_checkpoint({
+            'stateKey': state_key,
+            'watermark': current_time_str,
+            'windowMinutes': window_minutes,
+            'buckets': {bucket: encode(value) for bucket, value in buckets.items()},
+            'expiresAt': epoch_seconds(current_time + timedelta(minutes=window_minutes, days=1))
+        })
+    return buckets
+
+
+def epoch_seconds(time):
+    """
+    Returns a UTC datetime as whole seconds since the epoch, as the 'expiresAt' TTL attribute.
+    """
+    return int((time - datetime(1970, 1, 1)).total_seconds())
+
+
+def put_checkpoint(item):
+    """
+    Writes a checkpoint item to the 'state_table' unless a newer one exists.
+
+    Errors are logged and ignored: a checkpoint only saves reads, so a failed write
+    means the next run reads the events it covered again.
+
+    Args:
+        item (dict): The checkpoint item, with its 'stateKey' and 'watermark'.
+    """
+    try:
+        state_table.put_item(
+            Item=item,
+            # A concurrent run may have written a newer checkpoint in the meantime.
+            ConditionExpression='attribute_not_exists(stateKey) OR watermark <= :watermark',
+            ExpressionAttributeValues={':watermark': item['watermark']}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.warning("Error writing checkpoint", stateKey=item['stateKey'], error=str(e))
+
+
+def refresh_chunked_checkpoint(state_key, chunk_minutes, span_minutes, current_time, fetch_buckets):
+    """
+    Slides per-minute buckets of {identity: count} forward, checkpointed per chunk.
+
+    Works as `refresh_checkpoint`, but the buckets are kept in one state item per
+    chunk of 'chunk_minutes' minutes, aligned to the epoch, so no item has to hold
+    the whole span and chunks that are complete are never rewritten. Each chunk item
+    ('<state key>#<chunk start>') holds the zlib-compressed JSON of its buckets and the
+    watermark of the run that wrote it. The events are read from the first minute a
+    chunk does not cover yet (minus the lateness allowance) on, and only the chunks
+    from that minute on are written back. A chunk whose item would exceed
+    MAX_CHECKPOINT_ITEM_BYTES is not written, so those minutes are read again by the
+    next run instead of failing the write.
+
+    Args:
+        state_key (str): The key prefix of the chunk items.
+        chunk_minutes (int): The length of a chunk in minutes.
+        span_minutes (int): The length of the series in minutes.
+        current_time (datetime): The end of the series (UTC).
+        fetch_buckets (function): Builds the buckets of a time range from the raw events,
+            given the inclusive start and end time strings.
+
+    Returns:
+        dict: A mapping of minute bucket to {identity: count}, covering the span.
+    """
+    current_time_str = current_time.strftime(TIME_FORMAT)
+    current_bucket = current_time.strftime(BUCKET_FORMAT)
+    oldest_time = current_time - timedelta(minutes=span_minutes - 1)
+    oldest_bucket = oldest_time.strftime(BUCKET_FORMAT)
+
+    chunks = []
+    first_chunk = epoch_seconds(oldest_time) // 60 // chunk_minutes
+    last_chunk = epoch_seconds(current_time) // 60 // chunk_minutes
+    for chunk in range(first_chunk, last_chunk + 1):
+        chunk_start = datetime(1970, 1, 1) + timedelta(minutes=chunk * chunk_minutes)
+        chunks.append((
+            f"{state_key}#{chunk_start.strftime(BUCKET_FORMAT)}",
+            chunk_start.strftime(BUCKET_FORMAT),
+            (chunk_start + timedelta(minutes=chunk_minutes)).strftime(BUCKET_FORMAT)
+        ))
+
+    buckets = {}
+    refresh_bucket = None
+    newer_chunks = set()
+    for chunk_key, chunk_start, chunk_end in chunks:
+        checkpoint = state_table.get_item(Key={'stateKey': chunk_key}).get('Item') if state_table else None
+        chunk_refresh = max(oldest_bucket, chunk_start)
+        if checkpoint:
+            if checkpoint['watermark'] > current_time_str:
+                newer_chunks.add(chunk_key)
+            watermark = datetime.strptime(checkpoint['watermark'], TIME_FORMAT)
+            chunk_refresh = min(current_bucket, max(
+                chunk_refresh,
+                (watermark - timedelta(minutes=checkpoint_lateness_minutes)).strftime(BUCKET_FORMAT)
+            ))
+            for bucket, counts in json.loads(zlib.decompress(bytes(checkpoint['buckets']))).items():
+                if oldest_bucket <= bucket < chunk_refresh:
+                    buckets[bucket] = counts
+        if refresh_bucket is None and chunk_refresh < chunk_end:
+            refresh_bucket = chunk_refresh
+
+    # Everything from the first minute not covered by a chunk on is read again.
+    buckets = {bucket: counts for bucket, counts in buckets.items() if bucket < refresh_bucket}
+    buckets.update(fetch_buckets(f"{refresh_bucket}:00Z", current_time_str))
+
+    if state_table:
+        expires_at = epoch_seconds(current_time + timedelta(minutes=span_minutes, days=1))
+        for chunk_key, chunk_start, chunk_end in chunks:
+            if chunk_end <= refresh_bucket or chunk_key in newer_chunks:
+                continue
+            data = zlib.compress(json.dumps(
+                {bucket: counts for bucket, counts in buckets.items() if chunk_start <= bucket < chunk_end},
+                separators=(',', ':')
+            ).encode('utf-8'))
+            if len(data) + len(chunk_key) > MAX_CHECKPOINT_ITEM_BYTES:
+                logger.warning("Checkpoint chunk too large, not written", stateKey=chunk_key, size=len(data))
+                continue
+            put_checkpoint({
+                'stateKey': chunk_key,
+                'watermark': current_time_str,
+                'buckets': data,
+                'expiresAt': expires_at
+            })
+    return buckets
+
+
+def count_buckets(metric, target, start_time_str, end_time_str):
+    """
+    Returns the per-minute event counts of a series within a time range.
+
+    Args:
+        metric (str): The event name.
+        target (str): The target identity, or None for any identity.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        dict: A mapping of minute bucket to event count.
+    """
+    bucket_counts = {}
+    for event_time in query_event_times(metric, target, start_time_str, end_time_str):
+        bucket_counts[event_time[:16]] = bucket_counts.get(event_time[:16], 0) + 1
+    return bucket_counts
+
+
+def load_checkpointed_event_counts(windows_by_series, current_time):
+    """
+    Counts events from the incremental per-series checkpoints.
+
+    Like the per-minute counters, a window of N minutes is answered from the last N
+    minute buckets, including the current one. The checkpoint of a series is the
+    'window#<counter key>' item of the state table, see `refresh_checkpoint`.
+
+    Args:
+        windows_by_series (dict): A mapping of (metric, target) to the set of rule windows.
+        current_time (datetime): The end of the evaluation window (UTC).
+
+    Returns:
+        dict: A mapping of (metric, target, window minutes) to the number of events.
+    """
+    event_counts = {}
+    for (metric, target), windows in windows_by_series.items():
+        bucket_counts = refresh_checkpoint(
+            f"window#{counter_key(metric, target)}", max(windows), current_time,
+            lambda start, end: count_buckets(metric, target, start, end)
+        )
+        for window in windows:
+            start_bucket = (current_time - timedelta(minutes=window - 1)).strftime(BUCKET_FORMAT)
+            event_counts[(metric, target, window)] = sum(
+                count for bucket, count in bucket_counts.items() if bucket >= start_bucket
+            )
+    return event_counts
+
+
+def load_event_counts(rules, current_time):
+    """
+    Counts the events for every (metric, target, time window) used by the rules.
+
+    Rules are grouped into series by metric and target so each series is read at most
+    once. With the 'counters' source, the counts come from the per-minute counters; with
+    the 'checkpoint' source, from the incremental windows in the state table. Otherwise
+    the series' partition is queried (see `query_events`): when all rules of a series
+    share the same window, the count is taken with 'Select=COUNT'; otherwise the event
+    times for the widest window are fetched once and counted in memory for each window.
+
+    Args:
+        rules (list): The anomaly detection rules to be evaluated.
+        current_time (datetime): The end of the evaluation window (UTC).
+
+    Returns:
+        dict: A mapping of (metric, target, window minutes) to the number of events.
+    """
+    windows_by_series = {}
+    for rule in rules:
+        window = rule_window_minutes(rule)
+        if window and rule.get('metric'):
+            windows_by_series.setdefault((rule['metric'], rule_target(rule)), set()).add(window)
+
+    source = event_count_source or ('counters' if counters_table is not None else 'events')
+    if source == 'counters':
+        return load_bucketed_event_counts(windows_by_series, current_time)
+    if source == 'checkpoint':
+        return load_checkpointed_event_counts(windows_by_series, current_time)
+
+    current_time_str = current_time.strftime(TIME_FORMAT)
+    cutoffs = {}
+    event_counts = {}
+    for (metric, target), windows in windows_by_series.items():
+        for window in windows:
+            cutoffs[window] = (current_time - timedelta(minutes=window)).strftime(TIME_FORMAT)
+
+        widest = max(windows)
+        logger.debug("Querying events", series=counter_key(metric, target), start=cutoffs[widest], end=current_time_str)
+
+        if len(windows) == 1:
+            event_counts[(metric, target, widest)] = count_events(metric, target, cutoffs[widest], current_time_str)
+            continue
+
+        event_times = query_event_times(metric, target, cutoffs[widest], current_time_str)
+        for window in windows:
+            event_counts[(metric, target, window)] = sum(1 for t in event_times if t >= cutoffs[window])
+
+    return event_counts
+
+
+def identity_bucket_counts(metric, target, start_time_str, end_time_str):
+    """
+    Returns the per-minute event counts of every identity within a time range.
+
+    Each page of events is binned as it arrives, so memory holds one page of items
+    plus the counts, not every event of the range.
+
+    Args:
+        metric (str): The event name.
+        target (str): The target identity, or None for any identity.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        dict: A mapping of minute bucket to a mapping of identity to event count.
+    """
+    minute_counts = {}
+    pages = query_events(metric, target, start_time_str, end_time_str, ProjectionExpression='userIdentity, eventTime')
+    for page in pages:
+        for item in page.get('Items', []):
+            counts = minute_counts.setdefault(item['eventTime'][:16], {})
+            counts[item['userIdentity']] = counts.get(item['userIdentity'], 0) + 1
+    return minute_counts
+
+
+def load_baseline_series(rule, current_time):
+    """
+    Loads the per-identity count series of a baseline rule.
+
+    The per-minute counts of every identity of the rule's metric (and target, if any)
+    cover the current window and 'historyWindows' past windows. They are kept in a
+    'baseline#<window minutes>#<counter key>#<chunk start>' checkpoint item per window
+    of the state table, so each run only reads the events since the previous one (see
+    `refresh_chunked_checkpoint`), and are binned per identity, so each identity is
+    compared with its own history.
+
+    Args:
+        rule (dict): A baseline anomaly detection rule.
+        current_time (datetime): The end of the current window (UTC).
+
+    Returns:
+        tuple: The list of series identities and their count matrix, see `bucket_series`.
+    """
+    window = int(rule['timeWindow'])
+    history_windows = int(rule.get('historyWindows', DEFAULT_HISTORY_WINDOWS))
+    span_minutes = window * (history_windows + 1)
+    metric, target = rule['metric'], rule_target(rule)
+
+    minute_counts = refresh_chunked_checkpoint(
+        f"baseline#{window}#{counter_key(metric, target)}", window, span_minutes, current_time,
+        lambda start, end: identity_bucket_counts(metric, target, start, end)
+    )
+    return bucket_series(minute_counts, current_time, window, history_windows, baseline_max_series)
+
+
+def evaluate_baseline_rules(rules, report_anomaly, current_time, executor, run_unit=None):
+    """
+    Checks baseline rules by scoring all their series in one vectorized batch.
+
+    The series of every rule are loaded concurrently on the worker pool. The
+    current window of each series is then scored against the series' own history
+    (z-score, or EWMA when the rule's 'method' is 'ewma') for all rules at once,
+    and every rule with series above its threshold reports a single anomaly.
+    Errors are isolated per rule.
+
+    Args:
+        rules (list): The baseline rules to evaluate.
+        report_anomaly (function): A callback receiving the breached rule and its alert message.
+        current_time (datetime): The end of the current window (UTC).
+        executor (ThreadPoolExecutor): The detector's worker pool.
+        run_unit (function, optional): Runs the loading of a rule's series as a unit of
+            work, given its key, the function and its arguments. Returns None for units
+            that were deferred; those rules are skipped.
+    """
+    if run_unit is None:
+        run_unit = lambda key, function, *args: function(*args)
+    futures = [
+        (rule, executor.submit(run_unit, f"baseline#{rule['ruleId']}", load_baseline_series, rule, current_time))
+        for rule in rules
+    ]
+
+    loaded_rules = []
+    blocks = []
+    for rule, future in futures:
+        try:
+            series = future.result()
+            if series is None:
+                continue
+            series_ids, matrix = series
+            block = (series_ids, matrix, float(rule['threshold']), rule.get('method') == 'ewma')
+        except Exception as e:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+            continue
+        loaded_rules.append(rule)
+        blocks.append(block)
+
+    for rule, deviations in zip(loaded_rules, score_rules(blocks)):
+        if deviations:
+            message = build_baseline_alert_message(rule, deviations)
+            logger.info("Anomaly detected", ruleId=rule['ruleId'], deviations=len(deviations))
+            report_anomaly(rule, message)
+
+
+def distinct_sketch_buckets(metric, target, field, start_time_str, end_time_str):
+    """
+    Returns per-minute HyperLogLog sketches of an event field within a time range.
+
+    The field is read from its compact attribute (see `cirrus_common.event_schema`),
+    falling back to the full field name of items written before the compact schema.
+
+    Args:
+        metric (str): The event name, or '*' for any event of the target.
+        target (str): The target identity, or None for any identity.
+        field (str): The event field whose distinct values are counted, e.g. 'region'.
+        start_time_str (str): The inclusive start of the time range.
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        dict: A mapping of minute bucket to sketch.
+    """
+    attribute = FIELD_ATTRIBUTES[field]
+    values_by_bucket = {}
+    pages = query_events(
+        metric, target, start_time_str, end_time_str,
+        ProjectionExpression='eventTime, #field, #legacy_field',
+        ExpressionAttributeNames={'#field': attribute, '#legacy_field': field}
+    )
+    for page in pages:
+        for item in page.get('Items', []):
+            value = item.get(attribute, item.get(field))
+            if value is not None:
+                values_by_bucket.setdefault(item['eventTime'][:16], []).append(value)
+    return {bucket: hyperloglog.sketch_values(values) for bucket, values in values_by_bucket.items()}
+
+
+def evaluate_distinct_rules(rules, report_anomaly, current_time):
+    """
+    Checks distinct-count rules sharing a metric, target and distinct field.
+
+    The distinct values of the series are kept as one HyperLogLog sketch per minute
+    bucket in a 'distinct#<field>#<counter key>' checkpoint of the state table, so
+    each run only reads the events since the previous one (see `refresh_checkpoint`).
+    A rule's window is answered by merging the sketches of its last N minute buckets,
+    which estimates the number of distinct values in constant memory. Errors are
+    isolated per rule.
+
+    Args:
+        rules (list): The distinct-count rules of one (metric, target, field) series.
+        report_anomaly (function): A callback receiving the breached rule and its alert message.
+        current_time (datetime): The end of the evaluation window (UTC).
+    """
+    metric = rules[0]['metric']
+    target = rule_target(rules[0])
+    field = rules[0]['distinctField']
+    try:
+        if field not in DISTINCT_FIELDS:
+            raise ValueError(f"Unsupported distinct field: {field}")
+        windows = [rule_window_minutes(rule) for rule in rules]
+        sketches = refresh_checkpoint(
+            f"distinct#{field}#{counter_key(metric, target)}", max(windows), current_time,
+            lambda start, end: distinct_sketch_buckets(metric, target, field, start, end),
+            encode=hyperloglog.to_bytes, decode=hyperloglog.from_bytes
+        )
+    except Exception as e:
+        for rule in rules:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+        return
+
+    for rule, window in zip(rules, windows):
+        try:
+            start_bucket = (current_time - timedelta(minutes=window - 1)).strftime(BUCKET_FORMAT)
+            distinct_count = hyperloglog.estimate(hyperloglog.merge_sketches(
+                sketch for bucket, sketch in sketches.items() if bucket >= start_bucket
+            ))
+            logger.debug("Estimated distinct values", ruleId=rule.get('ruleId'), field=field, distinctCount=distinct_count)
+            if distinct_count > int(rule['threshold']):
+                message = build_distinct_alert_message(rule, distinct_count)
+                logger.info("Anomaly detected", ruleId=rule['ruleId'], distinctCount=distinct_count)
+                report_anomaly(rule, message)
+        except Exception as e:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+
+
+def check_anomaly(rule, send_alert_function, event_counts=None, current_time=None):
     """
     Checks for anomalies based on a specific rule.
 
-    This function queries the 'events_table' for events matching a specific metric
-    within a defined time window. It then compares the count of these events against
-    the rule's threshold. If the count exceeds the threshold, an alert is sent.
+    This function looks up the number of events matching the rule's metric (and target
+    identity, if any) within the rule's time window in the counts built by
+    `load_event_counts`. It then compares the count against the rule's threshold. If the
+    count exceeds the threshold, an alert is sent. When no shared counts are given, they
+    are loaded for this rule alone.
 
     Args:
         rule (dict): A dictionary representing a single anomaly detection rule.
         send_alert_function (function): A callback function to send an alert message.
+        event_counts (dict, optional): Event counts keyed by (metric, target, window minutes).
+        current_time (datetime, optional): The end of the evaluation window (UTC).
     """
-    rule_id = rule['ruleId']
-    rule_name = rule.get('ruleName', 'Unnamed Rule')
     rule_type = rule['ruleType']
     metric = rule['metric']
     threshold = int(rule['threshold'])
     time_window_minutes = int(rule['timeWindow'])
 
-    time_format = "%Y-%m-%dT%H:%M:%SZ"
-    current_time = datetime.utcnow().replace(microsecond=0)
-    time_cutoff = current_time - timedelta(minutes=time_window_minutes)
+    if current_time is None:
+        current_time = datetime.utcnow().replace(microsecond=0)
+    if event_counts is None:
+        event_counts = load_event_counts([rule], current_time)
 
-    time_cutoff_str = time_cutoff.strftime(time_format)
-    current_time_str = current_time.strftime(time_format)
+    target = rule_target(rule)
+    count = event_counts[(metric, target, time_window_minutes)]
 
-    print(f"Querying events from {time_cutoff_str} to {current_time_str}")
+    logger.debug("Counted matching events", ruleId=rule.get('ruleId'), series=counter_key(metric, target), count=count)
 
-    # Scan the events table to get all events in time window
-    response = events_table.scan(
-        FilterExpression='eventTime BETWEEN :start_time AND :end_time',
-        ExpressionAttributeValues={
-            ':start_time': time_cutoff_str,
-            ':end_time': current_time_str
-        }
+    if rule_type == 'count-based' and count > threshold:
+        message = build_alert_message(rule, count)
+        logger.info("Anomaly detected", ruleId=rule['ruleId'], count=count)
+        send_alert_function(message)
+    else:
+        logger.debug("No anomaly detected", ruleId=rule.get('ruleId'))
+
+def build_alert_message(rule, count):
+    """
+    Builds the alert message for a count-based rule that exceeded its threshold.
+
+    Args:
+        rule (dict): The anomaly detection rule that was breached.
+        count (int): The number of matching events in the rule's time window.
+
+    Returns:
+        str: The alert message body.
+    """
+    return (
+        f"ANOMALY DETECTED: {rule.get('ruleName', 'Unnamed Rule')}\n"
+        f"Rule ID: {rule['ruleId']}\n"
+        f"Metric: {rule['metric']}\n"
+        f"Target: {rule_target(rule) or 'any'}\n"
+        f"Count: {count}, Threshold: {int(rule['threshold'])} in last {int(rule['timeWindow'])} mins."
     )
 
-    events = response.get('Items', [])
-    count = sum(1 for e in events if e['eventName'] == metric)
+def build_baseline_alert_message(rule, deviations, max_listed=20):
+    """
+    Builds the alert message for a baseline rule with series above its threshold.
 
-    print(f"[Rule: {rule_name}] Found {count} matching events for metric {metric}")
+    Args:
+        rule (dict): The anomaly detection rule that was breached.
+        deviations (list): (identity, count, baseline mean, score) tuples.
+        max_listed (int, optional): The maximum number of series listed in the message.
 
-    if rule_type == 'count-based' and count > threshold:
-        message = (
-            f"ANOMALY DETECTED: {rule_name}\n"
-            f"Rule ID: {rule_id}\n"
-            f"Metric: {metric}\n"
-            f"Count: {count}, Threshold: {threshold} in last {time_window_minutes} mins."
+    Returns:
+        str: The alert message body.
+    """
+    deviations = sorted(deviations, key=lambda d: d[3], reverse=True)
+    lines = [
+        f"  {identity}: count {count}, baseline {mean:.1f}, score {score:.1f}"
+        for identity, count, mean, score in deviations[:max_listed]
+    ]
+    if len(deviations) > max_listed:
+        lines.append(f"  ... and {len(deviations) - max_listed} more")
+    return (
+        f"ANOMALY DETECTED: {rule.get('ruleName', 'Unnamed Rule')}\n"
+        f"Rule ID: {rule['ruleId']}\n"
+        f"Metric: {rule['metric']}\n"
+        f"Target: {rule_target(rule) or 'any'}\n"
+        f"Deviations from baseline ({rule.get('method', 'zscore')}, threshold {rule['threshold']}) "
+        f"in last {int(rule['timeWindow'])} mins:\n" + "\n".join(lines)
+    )
+
+def build_distinct_alert_message(rule, distinct_count):
+    """
+    Builds the alert message for a distinct-count rule that exceeded its threshold.
+
+    Args:
+        rule (dict): The anomaly detection rule that was breached.
+        distinct_count (int): The estimated number of distinct values in the rule's time window.
+
+    Returns:
+        str: The alert message body.
+    """
+    return (
+        f"ANOMALY DETECTED: {rule.get('ruleName', 'Unnamed Rule')}\n"
+        f"Rule ID: {rule['ruleId']}\n"
+        f"Metric: {rule['metric']}\n"
+        f"Target: {rule_target(rule) or 'any'}\n"
+        f"Distinct {rule['distinctField']} values: ~{distinct_count}, Threshold: {int(rule['threshold'])} "
+        f"in last {int(rule['timeWindow'])} mins."
+    )
+
+def rule_cooldown_minutes(rule):
+    """
+    Returns the alert suppression window of a rule in minutes.
+
+    Args:
+        rule (dict): A dictionary representing a single anomaly detection rule.
+
+    Returns:
+        int: The rule's 'cooldownMinutes', or the detector-wide default.
+    """
+    try:
+        return int(rule['cooldownMinutes'])
+    except (KeyError, TypeError, ValueError):
+        return alert_cooldown_minutes
+
+
+def claim_alert(rule, current_time):
+    """
+    Records an alert for a rule unless the rule is inside its suppression window.
+
+    The suppression state is a per-rule item in the 'state_table', written with a
+    conditional put that only succeeds when the previous alert of the rule is older
+    than its cool-down. This makes the check atomic across concurrent detector runs,
+    so an ongoing anomaly is sent once per cool-down instead of on every run. The item
+    expires through the table's TTL. Every alert is allowed when no state table is
+    configured.
+
+    Args:
+        rule (dict): The anomaly detection rule that was breached.
+        current_time (datetime): The time of the detection (UTC).
+
+    Returns:
+        bool: True if the alert should be sent, False if it is suppressed.
+    """
+    if state_table is None:
+        return True
+
+    cooldown = rule_cooldown_minutes(rule)
+    cooldown_start = (current_time - timedelta(minutes=cooldown)).strftime(TIME_FORMAT)
+    expires_at = int((current_time + timedelta(minutes=cooldown) - datetime(1970, 1, 1)).total_seconds())
+    try:
+        state_table.put_item(
+            Item={
+                'stateKey': f"alert#{rule['ruleId']}",
+                'lastAlertAt': current_time.strftime(TIME_FORMAT),
+                'expiresAt': expires_at
+            },
+            ConditionExpression='attribute_not_exists(stateKey) OR lastAlertAt <= :cooldown_start',
+            ExpressionAttributeValues={':cooldown_start': cooldown_start}
         )
-        print(f"Anomaly detected! Sending alert: {message}")
-        send_alert_function(message)
-    else:
-        print(f"No anomaly detected for rule {rule_name}.")
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.info("Suppressing alert within the rule's cool-down", ruleId=rule['ruleId'], cooldownMinutes=cooldown)
+            return False
+        raise
+
 
-def send_alert(message, region, account_id):
+def release_alert(rule, current_time):
+    """
+    Removes the suppression state an alert claimed, after its publish failed.
+
+    The state is only removed while it still holds this run's claim, so a later
+    claim by a concurrent run is kept. The previous alert of the rule was older
+    than the cool-down when the claim succeeded, so removing the item allows the
+    next run to alert again, as the previous state would have.
+
+    Args:
+        rule (dict): The anomaly detection rule whose alert was not delivered.
+        current_time (datetime): The time of the detection (UTC).
+    """
+    try:
+        state_table.delete_item(
+            Key={'stateKey': f"alert#{rule['ruleId']}"},
+            ConditionExpression='lastAlertAt = :claimed_at',
+            ExpressionAttributeValues={':claimed_at': current_time.strftime(TIME_FORMAT)}
+        )
+    except ClientError as e:
+        if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+            logger.error("Error releasing alert suppression", ruleId=rule.get('ruleId'), error=str(e))
+
+
+def publish_anomalies(anomalies, current_time, region, account_id):
+    """
+    Publishes the anomalies of a run as a digest, skipping suppressed rules.
+
+    Alerts are claimed (see `claim_alert`) before they are published. The claims
+    of the messages that could not be published are released again, so a failed
+    publish does not suppress the anomaly for the rule's cool-down.
+
+    Args:
+        anomalies (list): (rule, message) pairs reported during the run.
+        current_time (datetime): The time of the detection (UTC).
+        region (str): The AWS region of the SNS topic.
+        account_id (str): The AWS account ID where the SNS topic resides.
+    """
+    messages = []
+    claimed_rules = []
+    for rule, message in anomalies:
+        try:
+            if claim_alert(rule, current_time):
+                messages.append(message)
+                claimed_rules.append(rule if state_table is not None else None)
+        except Exception as e:
+            # Prefer a duplicate alert over a lost one when the suppression state is unavailable.
+            logger.error("Error checking alert suppression", ruleId=rule.get('ruleId'), error=str(e))
+            messages.append(message)
+            claimed_rules.append(None)
+
+    if not messages:
+        return
+    for index in send_alert_digest(messages, region, account_id):
+        if claimed_rules[index] is not None:
+            release_alert(claimed_rules[index], current_time)
+
+
+def send_alert_digest(messages, region, account_id):
+    """
+    Publishes many alert messages with as few SNS calls as possible.
+
+    The messages are joined into digests that stay below the SNS message size limit,
+    so an incident storm results in a handful of publishes instead of one per rule.
+
+    Args:
+        messages (list): The alert messages to publish.
+        region (str): The AWS region of the SNS topic.
+        account_id (str): The AWS account ID where the SNS topic resides.
+
+    Returns:
+        list: The indexes of the messages whose digest could not be published.
+    """
+    digests = [[]]
+    digest_size = 0
+    for index, message in enumerate(messages):
+        message_size = len(message.encode('utf-8')) + 2
+        if digests[-1] and digest_size + message_size > MAX_SNS_MESSAGE_BYTES:
+            digests.append([])
+            digest_size = 0
+        digests[-1].append(index)
+        digest_size += message_size
+
+    failed = []
+    for digest in digests:
+        subject = ALERT_SUBJECT if len(digest) == 1 else f"{len(digest)} Cloud Resource Anomalies Detected!"
+        if not send_alert("\n\n".join(messages[index] for index in digest), region, account_id, subject):
+            failed.extend(digest)
+    return failed
+
+
+def get_sns_topic_arn(region, account_id):
+    """
+    Returns the ARN of the alerts topic.
+
+    The ARN is taken from the 'SNS_TOPIC_ARN' environment variable when set, and
+    is otherwise built once from the region, account ID and topic name and kept
+    for the lifetime of the warm container.
+
+    Args:
+        region (str): The AWS region of the SNS topic.
+        account_id (str): The AWS account ID where the SNS topic resides.
+
+    Returns:
+        str: The topic ARN.
+    """
+    global sns_topic_arn
+    if not sns_topic_arn:
+        sns_topic_arn = f"arn:aws:sns:{region}:{account_id}:{sns_topic_name}"
+    return sns_topic_arn
+
+
+def send_alert(message, region, account_id, subject=ALERT_SUBJECT):
     """
     Publishes a message to the specified SNS topic.
 
     This function is responsible for sending alert messages via Amazon SNS.
-    It constructs the Topic ARN using the provided region and account ID
-    and publishes the message with a predefined subject.
+    It resolves the Topic ARN using the provided region and account ID
+    and publishes the message with the given subject.
 
     Args:
         message (str): The message body of the alert.
         region (str): The AWS region of the SNS topic.
         account_id (str): The AWS account ID where the SNS topic resides.
+        subject (str, optional): The subject of the SNS message.
+
+    Returns:
+        bool: True if the message was published, False if publishing failed.
     """
     try:
-        sns_topic_arn = f"arn:aws:sns:{region}:{account_id}:{sns_topic_name}"
-
         sns.publish(
-            TopicArn=sns_topic_arn,
+            TopicArn=get_sns_topic_arn(region, account_id),
             Message=message,
-            Subject="Cloud Resource Anomaly Detected!"
+            Subject=subject
         )
-        print("Alert published to SNS topic.")
+        logger.info("Alert published to SNS topic.")
+        return True
     except Exception as e:
-        print(f"Failed to publish to SNS: {e}")
\ No newline at end of file
+        logger.error("Failed to publish to SNS", error=str(e))
+        return False
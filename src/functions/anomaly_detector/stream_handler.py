@@ -0,0 +1,146 @@
+import json
+from datetime import datetime, timedelta
+
+from cirrus_common import aws
+from cirrus_common.logger import get_logger
+from cirrus_common.rule_index import compile_rules
+from .lambda_function import (
+    load_rules, load_event_counts, publish_anomalies, build_alert_message, rule_window_minutes, rule_target, TIME_FORMAT
+)
+
+logger = get_logger('anomaly_stream_detector')
+
+# The rules this container last saw in breach, so an alert is sent on the crossing and
+# not for every batch. Containers share the alert suppression windows of `claim_alert`.
+breached_rules = set()
+
+@aws.logs_consumed_capacity(logger)
+def lambda_handler(event, context):
+    """
+    Main function for the DynamoDB Streams Lambda handler.
+
+    This function receives batches of newly ingested events from the stream of the
+    events table and re-evaluates only the count-based rules that the batch's events are
+    routed to by the compiled rule index. The touched series are counted from the same
+    shared source as the scheduled detector (the per-minute counters, see
+    `load_event_counts`), so the counts cover every shard of the stream and survive cold
+    starts. An alert is published when a rule crosses its threshold, so anomalies are
+    reported within seconds instead of on the next scheduled run. Alerts share the
+    scheduled detector's digest publishing and per-rule suppression windows. The counters
+    may lag the stream by the ingestion of the batch, so the scheduled detector remains
+    the authoritative backstop.
+
+    Args:
+        event (dict): The DynamoDB Streams event with a list of 'Records'.
+        context (LambdaContext): The context object for the Lambda function.
+
+    Returns:
+        dict: A dictionary with a status code and a body message.
+    """
+    logger.start_invocation()
+    aws_region = context.invoked_function_arn.split(":")[3]
+    aws_account_id = context.invoked_function_arn.split(":")[4]
+
+    items = parse_stream_records(event.get('Records', []))
+    if not items:
+        return {
+            'statusCode': 200,
+            'body': json.dumps('No new events.')
+        }
+
+    try:
+        rules, rules_version = load_rules()
+    except Exception as e:
+        logger.error("Error scanning rules table", error=str(e))
+        raise e
+
+    current_time = datetime.utcnow().replace(microsecond=0)
+    rule_index = compile_rules(rules, rules_version)
+    max_window = max([w for w in (rule_window_minutes(rule) for rule in rules) if w] or [1])
+    oldest_event_time = (current_time - timedelta(minutes=max_window)).strftime(TIME_FORMAT)
+
+    touched_rules = {}
+    for item in items:
+        if item['eventTime'] >= oldest_event_time:
+            for rule in rule_index.match(item['eventName'], item['userIdentity'], 'count-based'):
+                touched_rules[rule['ruleId']] = rule
+    if not touched_rules:
+        return {
+            'statusCode': 200,
+            'body': json.dumps(f"Processed {len(items)} events.")
+        }
+
+    try:
+        event_counts = load_event_counts(list(touched_rules.values()), current_time)
+    except Exception as e:
+        logger.error("Error loading event counts", error=str(e))
+        raise e
+
+    anomalies = []
+    for rule in touched_rules.values():
+        try:
+            evaluate_rule(rule, event_counts, lambda message, rule=rule: anomalies.append((rule, message)))
+        except Exception as e:
+            logger.error("Error processing rule", ruleId=rule.get('ruleId'), error=str(e))
+
+    publish_anomalies(anomalies, current_time, aws_region, aws_account_id)
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps(f"Processed {len(items)} events.")
+    }
+
+
+def parse_stream_records(records):
+    """
+    Extracts the newly inserted event items from DynamoDB stream records.
+
+    Only 'INSERT' records carry new events; modifications and removals (e.g. TTL
+    expiry) are ignored. The 'NewImage' of each record is converted from the
+    DynamoDB attribute-value format into a plain dictionary.
+
+    Args:
+        records (list): The 'Records' of a DynamoDB Streams event.
+
+    Returns:
+        list: The new event items.
+    """
+    items = []
+    for record in records:
+        if record.get('eventName') != 'INSERT':
+            continue
+        new_image = record.get('dynamodb', {}).get('NewImage')
+        if not new_image:
+            continue
+        items.append(aws.deserialize(new_image))
+    return items
+
+
+def evaluate_rule(rule, event_counts, send_alert_function):
+    """
+    Evaluates a count-based rule against the counts of its series.
+
+    An alert is only sent when the rule crosses its threshold, not for every batch
+    while it stays in breach. Once the count falls back to the threshold, the rule
+    can alert again.
+
+    Args:
+        rule (dict): A dictionary representing a single anomaly detection rule.
+        event_counts (dict): A mapping of (metric, target, window minutes) to the number
+            of events, see `load_event_counts`.
+        send_alert_function (function): A callback function to send an alert message.
+    """
+    rule_id = rule['ruleId']
+    count = event_counts.get((rule['metric'], rule_target(rule), rule_window_minutes(rule)), 0)
+
+    if count <= int(rule['threshold']):
+        breached_rules.discard(rule_id)
+        return
+
+    if rule_id in breached_rules:
+        return
+
+    breached_rules.add(rule_id)
+    message = build_alert_message(rule, count)
+    logger.info("Anomaly detected from stream", ruleId=rule_id, count=count)
+    send_alert_function(message)
@@ -0,0 +1,283 @@
+import io
+import os
+import sys
+import gzip
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from cirrus_common import aws
+from cirrus_common.logger import get_logger
+
+from .lambda_function import (
+    parse_cloudtrail_event, write_batch_to_dynamodb, counter_keys, counters_table, counter_ttl_days, BATCH_WRITE_SIZE
+)
+
+s3 = aws.LazyClient('s3')
+logger = get_logger('data_backfill')
+
+# Each worker writes one chunk of items at a time; at most twice as many chunks are
+# buffered, which bounds memory no matter how many events are loaded.
+backfill_max_workers = int(os.environ.get('BACKFILL_MAX_WORKERS', '8'))
+BACKFILL_CHUNK_SIZE = 4 * BATCH_WRITE_SIZE
+READ_CHUNK_CHARS = 1 << 16
+LOG_FILE_SUFFIX = '.json.gz'
+
+def iter_cloudtrail_records(stream, read_chunk_chars=READ_CHUNK_CHARS):
+    """
+    Parses the records of a gzipped CloudTrail log file incrementally.
+
+    CloudTrail log files hold a single JSON object with a 'Records' array. Instead
+    of loading the whole file, the decompressed text is read in chunks and each
+    record is decoded as soon as it is complete, so memory use is bounded by the
+    largest record rather than by the file size.
+
+    Args:
+        stream (file-like): The gzipped log file, opened in binary mode.
+        read_chunk_chars (int, optional): The number of characters read at a time.
+
+    Yields:
+        dict: Each CloudTrail record of the file.
+
+    Raises:
+        json.JSONDecodeError: If the file is truncated or malformed.
+    """
+    decoder = json.JSONDecoder()
+    reader = io.TextIOWrapper(gzip.GzipFile(fileobj=stream), encoding='utf-8')
+    buffer = ''
+    eof = False
+
+    while True:
+        start = buffer.find('"Records"')
+        bracket = buffer.find('[', start) if start >= 0 else -1
+        if bracket >= 0:
+            buffer = buffer[bracket + 1:]
+            break
+        if eof:
+            return
+        data = reader.read(read_chunk_chars)
+        eof = not data
+        buffer += data
+
+    position = 0
+    while True:
+        while position < len(buffer) and buffer[position] in ' \t\r\n,':
+            position += 1
+        if position < len(buffer) and buffer[position] == ']':
+            return
+        try:
+            record, position = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            if eof:
+                raise
+            buffer = buffer[position:]
+            position = 0
+            data = reader.read(read_chunk_chars)
+            eof = not data
+            buffer += data
+            continue
+        yield record
+
+
+def iter_local_log_files(directory):
+    """
+    Opens the CloudTrail log files below a local directory, in name order.
+
+    Args:
+        directory (str): The directory, searched recursively for '*.json.gz' files.
+
+    Yields:
+        tuple: The file path and the file opened in binary mode.
+    """
+    paths = []
+    for root, _, files in os.walk(directory):
+        paths.extend(os.path.join(root, name) for name in files if name.endswith(LOG_FILE_SUFFIX))
+    for path in sorted(paths):
+        with open(path, 'rb') as stream:
+            yield path, stream
+
+
+def iter_s3_log_files(bucket, prefix=''):
+    """
+    Opens the CloudTrail log files below an S3 prefix, streaming their contents.
+
+    Args:
+        bucket (str): The bucket name.
+        prefix (str, optional): The key prefix, e.g. 'AWSLogs/123456789012/CloudTrail/'.
+
+    Yields:
+        tuple: The object key and its streaming body.
+    """
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            if obj['Key'].endswith(LOG_FILE_SUFFIX):
+                yield obj['Key'], s3.get_object(Bucket=bucket, Key=obj['Key'])['Body']
+
+
+def write_chunk(items):
+    """
+    Writes a chunk of backfilled items.
+
+    Overwriting an item that live ingestion already stored is harmless, so the
+    chunk is written with batched writes. The counters are not touched here, as
+    live ingestion may already have counted the same events.
+
+    Args:
+        items (list): The parsed event items.
+    """
+    write_batch_to_dynamodb(items)
+
+
+def rebuild_counters(counts):
+    """
+    Sets the per-minute counters of the backfilled buckets to the loaded counts.
+
+    The counters are replaced with `SET` instead of incremented, so a rerun or a
+    range live ingestion has already counted is not counted twice. This is only
+    correct when the backfill loaded every event of those minutes.
+
+    Args:
+        counts (dict): The number of events per (counter key, time bucket).
+    """
+    if counters_table is None:
+        return
+    for (counter_key, time_bucket), count in counts.items():
+        bucket_time = datetime.strptime(time_bucket, "%Y-%m-%dT%H:%M")
+        expires_at = int((bucket_time + timedelta(days=counter_ttl_days) - datetime(1970, 1, 1)).total_seconds())
+        counters_table.update_item(
+            Key={'counterKey': counter_key, 'timeBucket': time_bucket},
+            UpdateExpression='SET eventCount = :count, expiresAt = :expires_at',
+            ExpressionAttributeValues={':count': count, ':expires_at': expires_at}
+        )
+    logger.info("Rebuilt event counters", counterCount=len(counts))
+
+
+def backfill(log_files, event_names=None, max_workers=None, rebuild=False):
+    """
+    Loads CloudTrail log files into the events table.
+
+    Records are parsed incrementally with `iter_cloudtrail_records`, converted with
+    `parse_cloudtrail_event` exactly like live deliveries, and written in chunks by a
+    pool of workers using batched writes. Records that cannot be parsed (e.g. without
+    a principal ID or with a malformed event time) are counted and skipped. The per-minute counters are left alone
+    unless `rebuild` is set: the counters of the loaded minutes newer than the
+    counters' TTL are then replaced with the loaded counts (see `rebuild_counters`),
+    which requires the log files to cover those minutes completely.
+
+    Args:
+        log_files (iterable): (name, binary stream) pairs of gzipped log files.
+        event_names (set, optional): Only load events with these names.
+        max_workers (int, optional): The number of parallel writers.
+        rebuild (bool, optional): Whether to rebuild the counters of the loaded minutes.
+
+    Returns:
+        dict: The number of files read and of events loaded and skipped.
+
+    Raises:
+        ValueError: If counters are to be rebuilt from a subset of the event names.
+    """
+    if rebuild and event_names:
+        raise ValueError("Counters can only be rebuilt from complete log files, without an event name filter.")
+    max_workers = max_workers or backfill_max_workers
+    counters_cutoff = (datetime.utcnow() - timedelta(days=counter_ttl_days)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    stats = {'files': 0, 'loaded': 0, 'skipped': 0}
+    pending = []
+    chunk = []
+    counts = {}
+
+    def submit(executor, chunk):
+        # Bound the buffered chunks; surface write errors as soon as they happen.
+        while len(pending) >= 2 * max_workers:
+            pending.pop(0).result()
+        pending.append(executor.submit(write_chunk, chunk))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        for name, stream in log_files:
+            for record in iter_cloudtrail_records(stream):
+                if event_names and record.get('eventName') not in event_names:
+                    continue
+                try:
+                    item = parse_cloudtrail_event({'detail': record})
+                except (KeyError, TypeError, AttributeError, ValueError):
+                    stats['skipped'] += 1
+                    continue
+                chunk.append(item)
+                stats['loaded'] += 1
+                if rebuild and item['eventTime'] >= counters_cutoff:
+                    for counter_key in counter_keys(item):
+                        key = (counter_key, item['eventTime'][:16])
+                        counts[key] = counts.get(key, 0) + 1
+                if len(chunk) == BACKFILL_CHUNK_SIZE:
+                    submit(executor, chunk)
+                    chunk = []
+            stats['files'] += 1
+            logger.info("Read CloudTrail log file", file=name, **stats)
+        if chunk:
+            submit(executor, chunk)
+        for future in pending:
+            future.result()
+
+    if rebuild:
+        rebuild_counters(counts)
+    logger.info("Backfill complete.", **stats)
+    return stats
+
+
+@aws.logs_consumed_capacity(logger)
+def lambda_handler(event, context):
+    """
+    Main handler for backfilling from CloudTrail log files in S3.
+
+    Args:
+        event (dict): 'bucket' and optional 'prefix' of the log files, and optional
+            'eventNames' to load or 'rebuildCounters'.
+        context (LambdaContext): The context object for the Lambda function.
+
+    Returns:
+        dict: A dictionary with a status code and the backfill statistics.
+    """
+    logger.start_invocation()
+    event_names = set(event['eventNames']) if event.get('eventNames') else None
+    stats = backfill(
+        iter_s3_log_files(event['bucket'], event.get('prefix', '')), event_names,
+        rebuild=bool(event.get('rebuildCounters'))
+    )
+    return {
+        'statusCode': 200,
+        'body': json.dumps(stats)
+    }
+
+
+def main(argv=None):
+    """
+    Command line entry point for backfilling from a local directory or S3.
+
+    Example:
+        python -m src.functions.data_injestion.backfill s3://bucket/AWSLogs/123456789012/CloudTrail/
+    """
+    parser = argparse.ArgumentParser(description="Backfill the events table from CloudTrail log files.")
+    parser.add_argument('source', help="A local directory or an s3://bucket/prefix URL.")
+    parser.add_argument('--event-names', nargs='*', help="Only load events with these names.")
+    parser.add_argument('--workers', type=int, default=None, help="The number of parallel writers.")
+    parser.add_argument(
+        '--rebuild-counters', action='store_true',
+        help="Replace the counters of the loaded minutes; the logs must cover them completely."
+    )
+    args = parser.parse_args(argv)
+
+    if args.source.startswith('s3://'):
+        bucket, _, prefix = args.source[len('s3://'):].partition('/')
+        log_files = iter_s3_log_files(bucket, prefix)
+    else:
+        log_files = iter_local_log_files(args.source)
+    if args.rebuild_counters and args.event_names:
+        parser.error("--rebuild-counters cannot be combined with --event-names.")
+    stats = backfill(log_files, set(args.event_names) if args.event_names else None, args.workers, args.rebuild_counters)
+    print(json.dumps(stats))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
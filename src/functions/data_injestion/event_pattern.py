@@ -0,0 +1,82 @@
+import sys
+import json
+import argparse
+
+from cirrus_common import aws
+from cirrus_common.rule_index import RuleIndex, WILDCARD_METRIC
+
+CLOUDTRAIL_DETAIL_TYPE = 'AWS API Call via CloudTrail'
+
+def build_event_pattern(index):
+    """
+    Returns the narrowest EventBridge pattern that still delivers every event a rule can match.
+
+    The pattern lists the event names the rules reference. When a rule uses the
+    wildcard metric, every event name can match; the pattern is then narrowed to
+    the rules' target identities instead, as long as every rule has a target.
+    The ingestion pre-filter (see `lambda_function.filter_events`) still decides
+    per event, so the pattern only needs to be a superset of the matching events.
+
+    Args:
+        index (RuleIndex): The index of the active rules.
+
+    Returns:
+        dict: The EventBridge event pattern.
+    """
+    detail = {'eventCategory': ['Management']}
+    if WILDCARD_METRIC not in index.metrics:
+        detail['eventName'] = sorted(index.metrics)
+    elif index.targets and all(target for _, target in index.series()):
+        detail['userIdentity'] = {'principalId': sorted(index.targets)}
+    return {
+        'detail-type': [CLOUDTRAIL_DETAIL_TYPE],
+        'detail': detail
+    }
+
+
+def load_rules(table_name):
+    """
+    Reads the metric and target of every rule in a rules table.
+
+    Args:
+        table_name (str): The name of the rules table.
+
+    Returns:
+        list: The rules.
+    """
+    table = aws.DynamoDB().Table(table_name)
+    scan_kwargs = {
+        'ProjectionExpression': '#rule_id, #metric, #target',
+        'ExpressionAttributeNames': {'#rule_id': 'ruleId', '#metric': 'metric', '#target': 'target'}
+    }
+    rules = []
+    while True:
+        response = table.scan(**scan_kwargs)
+        rules.extend(response.get('Items', []))
+        if not response.get('LastEvaluatedKey'):
+            return rules
+        scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+def main(argv=None):
+    """
+    Command line entry point printing the event pattern for the rules of a table.
+
+    The output can be set as the 'ingestion_event_pattern' Terraform variable.
+
+    Example:
+        python -m src.functions.data_injestion.event_pattern cloud_resource_anomaly_detector_rules
+    """
+    parser = argparse.ArgumentParser(description="Generate a narrow EventBridge pattern from the rules.")
+    parser.add_argument('rules_table', help="The name of the rules table.")
+    args = parser.parse_args(argv)
+
+    rules = load_rules(args.rules_table)
+    if not rules:
+        parser.error("The rules table is empty; no events would be delivered.")
+    print(json.dumps(build_event_pattern(RuleIndex(rules))))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,11 +1,69 @@
 import os
 import json
-import boto3
-from datetime import datetime
+import zlib
+import time
+import base64
+import random
+from botocore.exceptions import ClientError
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
 
-dynamodb = boto3.resource('dynamodb')
+from cirrus_common import aws
+from cirrus_common.logger import get_logger
+from cirrus_common.rule_index import compile_rules
+from cirrus_common.event_schema import (
+    USER_IDENTITY, EVENT_TIME, EVENT_NAME, REGION, RESOURCE_TYPE, REQUEST_PARAMETERS, EXPIRES_AT, event_sort_key
+)
+
+# Low-level clients are created on first use and shared (see `cirrus_common.aws`).
+dynamodb = aws.DynamoDB()
 table_name = os.environ['DYNAMODB_EVENTS_TABLE']
 table = dynamodb.Table(table_name)
+logger = get_logger('data_injestion')
+
+# Optional table of pre-aggregated per-minute event counters.
+counters_table_name = os.environ.get('DYNAMODB_COUNTERS_TABLE')
+counters_table = dynamodb.Table(counters_table_name) if counters_table_name else None
+counter_ttl_days = int(os.environ.get('COUNTER_TTL_DAYS', '7'))
+
+# Optional pre-filtering of events against the active rules (see `filter_events`):
+# 'off' stores every event, 'aggregate' only counts events no rule can match and
+# 'skip' drops them. The rules are reloaded every RULES_REFRESH_SECONDS.
+rules_table_name = os.environ.get('DYNAMODB_RULES_TABLE')
+rules_table = dynamodb.Table(rules_table_name) if rules_table_name else None
+ingest_filter_mode = os.environ.get('INGEST_FILTER_MODE', 'off')
+rules_refresh_seconds = int(os.environ.get('RULES_REFRESH_SECONDS', '300'))
+# The rule index loaded by this container: (load time, RuleIndex).
+_rule_index = (None, None)
+
+# Optional state table holding 'seen' markers of events that are only counted, so a
+# redelivered event is not counted twice (see `mark_event_seen`).
+state_table_name = os.environ.get('DYNAMODB_STATE_TABLE')
+state_table = dynamodb.Table(state_table_name) if state_table_name else None
+SEEN_MARKER_PREFIX = 'seen#'
+
+# Conditional puts of a batch run concurrently on this many threads.
+ingest_write_workers = int(os.environ.get('INGEST_WRITE_WORKERS', '8'))
+
+# Event items expire through the table's TTL after EVENT_TTL_DAYS (0 keeps them forever).
+event_ttl_days = int(os.environ.get('EVENT_TTL_DAYS', '30'))
+# How request parameters are stored: 'truncated' (JSON cut to REQUEST_PARAMETERS_MAX_BYTES),
+# 'compressed' (zlib-compressed JSON), 'full' or 'none'.
+request_parameters_mode = os.environ.get('REQUEST_PARAMETERS_MODE', 'truncated')
+request_parameters_max_bytes = int(os.environ.get('REQUEST_PARAMETERS_MAX_BYTES', '256'))
+
+# Keys of the events written by this container, least recently seen first, so that
+# redeliveries are dropped before any DynamoDB call (0 disables the cache).
+event_dedup_cache_size = int(os.environ.get('EVENT_DEDUP_CACHE_SIZE', '10000'))
+recent_event_keys = OrderedDict()
+
+# DynamoDB accepts at most 25 put requests per BatchWriteItem call.
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_ATTEMPTS = 8
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+BATCH_WRITE_MAX_DELAY_SECONDS = 2.0
+EVENT_KEY_ATTRIBUTES = (USER_IDENTITY, EVENT_TIME)
 
 def parse_cloudtrail_event(event):
     """
@@ -14,7 +72,12 @@ def parse_cloudtrail_event(event):
     This function takes a raw AWS CloudTrail event (received from services like EventBridge)
     and processes it to extract relevant details such as the user identity, event time,
     event name, resource type, and region. These details are then formatted into a
-    dictionary suitable for storage in a DynamoDB table.
+    compact dictionary suitable for storage in a DynamoDB table: only the fields rules
+    need are kept, non-key attributes use the short names of `cirrus_common.event_schema`,
+    the request parameters are encoded according to REQUEST_PARAMETERS_MODE and an
+    'expiresAt' TTL attribute is added when EVENT_TTL_DAYS is set. The 'eventTime'
+    sort key carries the CloudTrail 'eventID' (see `cirrus_common.event_schema`), so
+    every event has its own key and a redelivered event maps to the same item.
 
     Args:
         event (dict): The raw CloudTrail event dictionary.
@@ -28,58 +91,501 @@ def parse_cloudtrail_event(event):
     event_name = cloudtrail_event['eventName']
     resource_type = cloudtrail_event['eventSource'].split('.')[0]
     region = cloudtrail_event['awsRegion']
-    request_params = cloudtrail_event.get('requestParameters', {})
+    request_params = cloudtrail_event.get('requestParameters')
 
     item = {
-        'userIdentity': user_identity,        
-        'eventTime': event_time,           
-        'eventName': event_name,
-        'resourceType': resource_type,
-        'region': region,
-        'requestParameters': json.dumps(request_params)
+        USER_IDENTITY: user_identity,
+        EVENT_TIME: event_sort_key(event_time, cloudtrail_event.get('eventID')),
+        EVENT_NAME: event_name,
+        RESOURCE_TYPE: resource_type,
+        REGION: region
     }
+    encoded_params = encode_request_parameters(request_params)
+    if encoded_params:
+        item[REQUEST_PARAMETERS] = encoded_params
+    if event_ttl_days > 0:
+        expires = datetime.strptime(event_time[:19], "%Y-%m-%dT%H:%M:%S") + timedelta(days=event_ttl_days)
+        item[EXPIRES_AT] = int((expires - datetime(1970, 1, 1)).total_seconds())
     return item
 
+
+def encode_request_parameters(request_params):
+    """
+    Encodes the request parameters of an event for storage.
+
+    Args:
+        request_params (dict): The event's 'requestParameters', or None.
+
+    Returns:
+        str or bytes: The encoded parameters, or None if nothing is stored.
+    """
+    if not request_params or request_parameters_mode == 'none':
+        return None
+    encoded = json.dumps(request_params, separators=(',', ':'))
+    if request_parameters_mode == 'compressed':
+        return zlib.compress(encoded.encode('utf-8'))
+    if request_parameters_mode == 'truncated':
+        return encoded.encode('utf-8')[:request_parameters_max_bytes].decode('utf-8', 'ignore')
+    return encoded
+
+
 def write_to_dynamodb(item):
     """
     Writes a formatted item to the DynamoDB table.
 
     This function attempts to store a single item (a dictionary of event data)
-    into the configured DynamoDB table. It logs the success or failure of the
-    write operation, including any exceptions that occur.
+    into the configured DynamoDB table. The write is conditioned on the item not
+    existing yet, so a redelivered event is neither rewritten nor counted again.
+    It logs failures of the write operation; the written item itself is only
+    logged at debug level.
 
     Args:
         item (dict): The dictionary of event data to be written to DynamoDB.
+
+    Returns:
+        bool: True if the item was written, False if it already existed.
+    """
+    try:
+        table.put_item(Item=item, ConditionExpression=f"attribute_not_exists({EVENT_TIME})")
+        logger.debug("Wrote item to DynamoDB", item=item)
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            logger.debug("Skipping an event that was already written", item=item)
+            return False
+        logger.error("Error writing to DynamoDB", error=str(e))
+        raise e
+    except Exception as e:
+        logger.error("Error writing to DynamoDB", error=str(e))
+        raise e
+
+
+def mark_event_seen(item):
+    """
+    Records that an event which is only counted (not stored) has been counted.
+
+    A small marker item is put into the state table on the condition that it does
+    not exist yet, which makes counting such events idempotent just like storing
+    them. Markers expire with the counters they protect (COUNTER_TTL_DAYS).
+
+    Args:
+        item (dict): The parsed event item.
+
+    Returns:
+        bool: True if the event was not seen before, False for a redelivery.
+    """
+    expires = datetime.strptime(item[EVENT_TIME][:19], "%Y-%m-%dT%H:%M:%S") + timedelta(days=counter_ttl_days)
+    try:
+        state_table.put_item(
+            Item={
+                'stateKey': f"{SEEN_MARKER_PREFIX}{item[USER_IDENTITY]}#{item[EVENT_TIME]}",
+                EXPIRES_AT: int((expires - datetime(1970, 1, 1)).total_seconds())
+            },
+            ConditionExpression='attribute_not_exists(stateKey)'
+        )
+        return True
+    except ClientError as e:
+        if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+            return False
+        logger.error("Error marking an event as counted", error=str(e))
+        raise e
+
+
+def put_new_items(put_if_absent, items):
+    """
+    Runs a conditional put for every item and sorts the items by its outcome.
+
+    BatchWriteItem cannot be conditional, so it cannot tell a new event from a
+    redelivered one; the conditional puts of a batch run concurrently on
+    INGEST_WRITE_WORKERS threads instead. Every put has its own outcome: an error
+    other than a failed condition only fails that item, while the puts that
+    succeeded are still reported, so their events can be counted before the
+    failed ones are retried.
+
+    Args:
+        put_if_absent (function): `write_to_dynamodb` or `mark_event_seen`.
+        items (list): The parsed event items, with distinct keys.
+
+    Returns:
+        tuple: The items that did not exist yet and the (item, error) pairs of the
+               failed puts, both in delivery order.
+    """
+    futures = None
+    if len(items) > 1:
+        with ThreadPoolExecutor(max_workers=min(ingest_write_workers, len(items))) as executor:
+            futures = [executor.submit(put_if_absent, item) for item in items]
+
+    new_items, failures = [], []
+    for position, item in enumerate(items):
+        try:
+            new = futures[position].result() if futures else put_if_absent(item)
+        except Exception as e:
+            failures.append((item, e))
+            continue
+        if new:
+            new_items.append(item)
+    return new_items, failures
+
+
+def event_key(item):
+    """
+    Returns the primary key of an event item as a tuple.
+
+    Args:
+        item (dict): The parsed event item.
+
+    Returns:
+        tuple: The values of EVENT_KEY_ATTRIBUTES.
+    """
+    return tuple(item[k] for k in EVENT_KEY_ATTRIBUTES)
+
+
+def drop_seen_events(items):
+    """
+    Drops the events this container has written recently and duplicates within a batch.
+
+    EventBridge, SQS and Kinesis deliver at least once, so the same event can
+    arrive again in a later invocation served by the same warm container. Such
+    events are dropped here, before any DynamoDB call is made.
+
+    Args:
+        items (list): The parsed event items.
+
+    Returns:
+        list: The items that still need to be written, in delivery order.
+    """
+    unseen = {}
+    for item in items:
+        key = event_key(item)
+        if key in recent_event_keys:
+            recent_event_keys.move_to_end(key)
+        else:
+            unseen[key] = item
+    return list(unseen.values())
+
+
+def remember_events(items):
+    """
+    Adds written events to the bounded cache of recent event keys.
+
+    The least recently seen keys are evicted once EVENT_DEDUP_CACHE_SIZE keys are
+    cached, which bounds the memory of a long-lived container.
+
+    Args:
+        items (list): The parsed event items that are stored in the table.
+    """
+    if event_dedup_cache_size <= 0:
+        return
+    for item in items:
+        key = event_key(item)
+        recent_event_keys[key] = True
+        recent_event_keys.move_to_end(key)
+    while len(recent_event_keys) > event_dedup_cache_size:
+        recent_event_keys.popitem(last=False)
+
+
+def extract_cloudtrail_events(event):
+    """
+    Returns the CloudTrail events delivered in an invocation.
+
+    The handler can be invoked directly by EventBridge with a single event, with a
+    list of EventBridge events, or with a batch of SQS or Kinesis records whose
+    payloads are EventBridge events (or bare CloudTrail records). Every event is
+    returned in the EventBridge shape expected by `parse_cloudtrail_event`.
+
+    Args:
+        event (dict or list): The event passed to the Lambda function.
+
+    Returns:
+        list: The EventBridge-style events, each with a 'detail' key.
+    """
+    if isinstance(event, list):
+        entries = event
+    elif 'Records' in event:
+        entries = []
+        for record in event['Records']:
+            if 'kinesis' in record:
+                entries.append(json.loads(base64.b64decode(record['kinesis']['data'])))
+            else:
+                entries.append(json.loads(record['body']))
+    else:
+        entries = [event]
+    return [entry if 'detail' in entry else {'detail': entry} for entry in entries]
+
+
+def record_id(record):
+    """
+    Returns the identifier of a stream or queue record used to report its failure.
+
+    Args:
+        record (dict): An SQS or Kinesis record.
+
+    Returns:
+        str: The SQS 'messageId' or the Kinesis 'sequenceNumber'.
+    """
+    if 'kinesis' in record:
+        return record['kinesis'].get('sequenceNumber')
+    return record.get('messageId')
+
+
+def parse_records(event):
+    """
+    Parses the CloudTrail events of an invocation, isolating malformed records.
+
+    A record of an SQS or Kinesis batch that cannot be decoded or parsed is logged
+    and reported as failed instead of failing the whole batch, so only that record
+    is redelivered (and eventually moved to the dead-letter queue). Malformed
+    events delivered without records still raise.
+
+    Args:
+        event (dict or list): The event passed to the Lambda function.
+
+    Returns:
+        tuple: The parsed items, the identifiers of the failed records and a mapping
+               of event key (see `event_key`) to the identifier of the record that
+               delivered the event, empty without records.
+    """
+    if isinstance(event, dict) and 'Records' in event:
+        items, failed, item_records = [], [], {}
+        for record in event['Records']:
+            try:
+                parsed = [parse_cloudtrail_event(entry) for entry in extract_cloudtrail_events({'Records': [record]})]
+            except (KeyError, TypeError, ValueError, AttributeError) as e:
+                logger.warning("Skipping malformed record", recordId=record_id(record), error=repr(e))
+                failed.append(record_id(record))
+                continue
+            for item in parsed:
+                item_records[event_key(item)] = record_id(record)
+            items.extend(parsed)
+        return items, failed, item_records
+    return [parse_cloudtrail_event(entry) for entry in extract_cloudtrail_events(event)], [], {}
+
+
+def write_batch_to_dynamodb(items):
+    """
+    Writes items to the DynamoDB table with batched writes.
+
+    The items are written in chunks of BATCH_WRITE_SIZE with `batch_write_item`.
+    Items that DynamoDB returns as 'UnprocessedItems' (e.g. while the table is being
+    throttled) are retried with exponential backoff and full jitter. Items sharing a
+    primary key are written once (the last one wins), as a batch may not contain
+    duplicate keys.
+
+    Args:
+        items (list): The dictionaries of event data to be written to DynamoDB.
+
+    Raises:
+        Exception: If items are still unprocessed after BATCH_WRITE_MAX_ATTEMPTS attempts,
+            or if a batch write fails.
+    """
+    unique_items = list({event_key(item): item for item in items}.values())
+    for i in range(0, len(unique_items), BATCH_WRITE_SIZE):
+        request_items = {
+            table_name: [{'PutRequest': {'Item': item}} for item in unique_items[i:i + BATCH_WRITE_SIZE]]
+        }
+        for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+            try:
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+            except Exception as e:
+                logger.error("Error writing batch to DynamoDB", error=str(e))
+                raise e
+            request_items = response.get('UnprocessedItems') or {}
+            if not request_items:
+                break
+            delay = min(BATCH_WRITE_MAX_DELAY_SECONDS, BATCH_WRITE_BASE_DELAY_SECONDS * 2 ** attempt)
+            time.sleep(random.uniform(0, delay))
+        else:
+            unprocessed = sum(len(requests) for requests in request_items.values())
+            raise Exception(f"{unprocessed} items still unprocessed after {BATCH_WRITE_MAX_ATTEMPTS} attempts")
+    logger.debug("Wrote items to DynamoDB", itemCount=len(unique_items))
+
+
+def active_rule_index():
+    """
+    Returns the index of the active rules, reloading it every RULES_REFRESH_SECONDS.
+
+    Only the attributes that decide which events a rule can match are read, with a
+    paginated scan of the rules table. If the rules cannot be loaded, the previous
+    index is kept and loading is retried on the next invocation.
+
+    Returns:
+        RuleIndex: The index of the active rules, or None if none could be loaded yet.
+    """
+    global _rule_index
+    loaded_at, index = _rule_index
+    now = time.monotonic()
+    if index is not None and now - loaded_at < rules_refresh_seconds:
+        return index
+
+    scan_kwargs = {
+        'ProjectionExpression': '#rule_id, #metric, #target',
+        'ExpressionAttributeNames': {'#rule_id': 'ruleId', '#metric': 'metric', '#target': 'target'}
+    }
+    rules = []
+    try:
+        while True:
+            response = rules_table.scan(**scan_kwargs)
+            rules.extend(response.get('Items', []))
+            if not response.get('LastEvaluatedKey'):
+                break
+            scan_kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+    except Exception as e:
+        logger.warning("Error loading the rules for pre-filtering", error=str(e))
+        return index
+
+    index = compile_rules(rules)
+    _rule_index = (now, index)
+    logger.debug("Loaded the rules for pre-filtering", ruleCount=len(index))
+    return index
+
+
+def filter_events(items):
+    """
+    Splits events by whether any active rule can match them.
+
+    Events that no rule references (by event name or the wildcard metric, for any
+    identity or for the event's identity) are never queried by the detector, so
+    they are not stored: with INGEST_FILTER_MODE 'aggregate' they still update the
+    counters, with 'skip' they are dropped. Every event is kept when the mode is
+    'off', when no rules table is configured or when no rules could be loaded.
+
+    Args:
+        items (list): The parsed event items.
+
+    Returns:
+        tuple: The items to store and the items to only count.
+    """
+    if ingest_filter_mode == 'off' or rules_table is None:
+        return items, []
+    index = active_rule_index()
+    if index is None:
+        return items, []
+
+    stored, unmatched = [], []
+    for item in items:
+        if index.matches_any(item[EVENT_NAME], item[USER_IDENTITY]):
+            stored.append(item)
+        else:
+            unmatched.append(item)
+    if unmatched:
+        logger.debug("Filtered out events no rule can match", eventCount=len(unmatched), mode=ingest_filter_mode)
+    return stored, unmatched if ingest_filter_mode == 'aggregate' else []
+
+
+def counter_keys(item):
+    """
+    Returns the counter keys an event contributes to.
+
+    Each event is counted once per event name and once per identity and event name,
+    so the detector can answer both metric-wide and per-principal rules from counters.
+
+    Args:
+        item (dict): The parsed event item.
+
+    Returns:
+        list: The counter keys for the event.
+    """
+    return [
+        item['eventName'],
+        f"{item['userIdentity']}#{item['eventName']}"
+    ]
+
+
+def update_counters(items):
+    """
+    Increments the per-minute counters for a batch of events.
+
+    Each counter item is keyed on a counter key and the minute bucket of the event
+    ('YYYY-MM-DDTHH:MM') and is incremented with an atomic `ADD`, so concurrent
+    invocations never lose updates. The events of a batch are aggregated first, so
+    every counter touched by the batch is updated once. Counter items expire through
+    the table's TTL. Nothing is done when no counters table is configured.
+
+    Args:
+        items (list): The parsed event items.
     """
+    if counters_table is None:
+        return
+
+    increments = {}
+    for item in items:
+        time_bucket = item['eventTime'][:16]
+        for counter_key in counter_keys(item):
+            increments[(counter_key, time_bucket)] = increments.get((counter_key, time_bucket), 0) + 1
+
     try:
-        table.put_item(Item=item)
-        print(f"Successfully wrote item to DynamoDB: {item}")
+        for (counter_key, time_bucket), count in increments.items():
+            bucket_time = datetime.strptime(time_bucket, "%Y-%m-%dT%H:%M")
+            expires_at = int((bucket_time + timedelta(days=counter_ttl_days) - datetime(1970, 1, 1)).total_seconds())
+            counters_table.update_item(
+                Key={'counterKey': counter_key, 'timeBucket': time_bucket},
+                UpdateExpression='ADD eventCount :count SET expiresAt = if_not_exists(expiresAt, :expires_at)',
+                ExpressionAttributeValues={':count': count, ':expires_at': expires_at}
+            )
     except Exception as e:
-        print(f"Error writing to DynamoDB: {e}")
+        logger.error("Error updating event counters", error=str(e))
         raise e
 
 
+@aws.logs_consumed_capacity(logger)
 def lambda_handler(event, context):
     """
     Main handler for the Lambda function.
 
-    This function is triggered by an event from a source like EventBridge, typically
-    with a CloudTrail event payload. It calls `parse_cloudtrail_event` to extract
-    the necessary data and then `write_to_dynamodb` to persist that data.
-    It logs the incoming event and provides a status response.
+    This function is triggered by EventBridge with a CloudTrail event payload, or with
+    a batch of them through an SQS queue, a Kinesis stream or a list of EventBridge
+    entries (see `extract_cloudtrail_events`). It calls `parse_cloudtrail_event` to
+    extract the necessary data and persists it with conditional puts
+    (`write_to_dynamodb`, run concurrently by `put_new_items`). Events this container has
+    already written are dropped first (see `drop_seen_events`), and events no rule
+    can match are only counted or dropped (see `filter_events`). It also increments
+    the pre-aggregated event counters used by the anomaly detector for the events
+    that were newly written, or only counted and not seen before (see `mark_event_seen`),
+    so redelivered events are never counted twice. Events whose put fails are not
+    counted; every other event of the batch is counted, and only the records of the
+    failed events are returned in 'batchItemFailures' (or, without records, the
+    invocation fails after counting), so the retry writes and counts them. If the
+    counter update itself fails, the written events are undercounted rather than
+    counted twice. Malformed records of a batch are returned in 'batchItemFailures'
+    as well (see `parse_records`), so only they are retried.
+    The full incoming event is only logged at debug level or for sampled invocations
+    (see `cirrus_common.logger`). It provides a status response.
 
     Args:
-        event (dict): The event dictionary passed to the Lambda function.
+        event (dict or list): The event passed to the Lambda function.
         context (LambdaContext): The context object for the Lambda function.
 
     Returns:
-        dict: A dictionary with a status code and a body message.
+        dict: A dictionary with a status code, a body message and, for SQS and
+              Kinesis batches, the 'batchItemFailures'.
     """
-    print("Received event: " + json.dumps(event, indent=2))
-    item = parse_cloudtrail_event(event)
-    write_to_dynamodb(item)
+    logger.start_invocation()
+    logger.debug("Received event", event=event)
+    parsed, failed_records, item_records = parse_records(event)
+    items = drop_seen_events(parsed)
+    if len(items) < len(parsed):
+        logger.info("Dropped redelivered events", duplicateCount=len(parsed) - len(items))
+    stored, counted = filter_events(items)
+    written, failures = put_new_items(write_to_dynamodb, stored)
+    newly_counted = counted
+    if counted and state_table is not None:
+        newly_counted, marker_failures = put_new_items(mark_event_seen, counted)
+        failures += marker_failures
+    update_counters(written + newly_counted)
+    failed_keys = {event_key(item) for item, _ in failures}
+    remember_events([item for item in stored + counted if event_key(item) not in failed_keys])
 
-    return {
+    if failures:
+        logger.error("Events could not be written and will be retried", eventCount=len(failures))
+        if not item_records:
+            raise failures[0][1]
+        failed_records += [item_records[event_key(item)] for item, _ in failures]
+
+    event_count = len(parsed)
+    response = {
         'statusCode': 200,
-        'body': json.dumps('Event processed successfully!')
-    } 
\ No newline at end of file
+        'body': json.dumps('Event processed successfully!' if event_count == 1 else f"{event_count} events processed successfully!")
+    }
+    if isinstance(event, dict) and 'Records' in event:
+        response['batchItemFailures'] = [{'itemIdentifier': failed} for failed in dict.fromkeys(failed_records)]
+    return response
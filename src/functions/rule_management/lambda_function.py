@@ -1,33 +1,195 @@
 import os
 import json
-import boto3
+import time
 import uuid
+import random
+import base64
+import hashlib
+import binascii
 from decimal import Decimal
+from datetime import datetime, timezone
+from email.utils import format_datetime
 
+from cirrus_common import aws
+from cirrus_common.logger import get_logger
+from cirrus_common.rule_index import WILDCARD_METRIC, WILDCARD_TARGETS, RULES_VERSION_STATE_KEY
 
-dynamodb = boto3.resource('dynamodb')
+# Low-level clients are created on first use and shared (see `cirrus_common.aws`).
+dynamodb = aws.DynamoDB()
 table_name = os.environ['DYNAMODB_RULES_TABLE']
 table = dynamodb.Table(table_name)
+logger = get_logger('rule_management')
+
+# Optional detector state table holding the rules version marker, which lets warm
+# detector containers reuse their rules until they change.
+state_table_name = os.environ.get('DYNAMODB_STATE_TABLE')
+state_table = dynamodb.Table(state_table_name) if state_table_name else None
+
+SUPPORTED_RULE_TYPES = ['count-based', 'baseline', 'distinct-count']
+BASELINE_METHODS = ['zscore', 'ewma']
+MAX_HISTORY_WINDOWS = 720
+DISTINCT_FIELDS = ['region', 'resourceType']
+# DynamoDB accepts at most 25 put requests per BatchWriteItem call.
+BATCH_WRITE_SIZE = 25
+BATCH_WRITE_MAX_ATTEMPTS = 8
+BATCH_WRITE_BASE_DELAY_SECONDS = 0.05
+BATCH_WRITE_MAX_DELAY_SECONDS = 2.0
+RULES_VERSION_MAX_ATTEMPTS = 3
+MAX_IMPORT_RULES = 1000
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+# Export pages stay below the 6 MB payload limit of Lambda and API Gateway responses.
+MAX_EXPORT_BYTES = 5 * 1024 * 1024
+# The rule attributes GET /rules filters on and the secondary index keyed on each,
+# in order of preference when several filters are given.
+FILTER_INDEXES = [('metric', 'MetricIndex'), ('target', 'TargetIndex'), ('ruleType', 'RuleTypeIndex')]
 
 def decimal_default(obj):
     """
-    Helper function to serialize Decimal objects to float for JSON encoding.
+    Helper function to serialize Decimal objects to numbers for JSON encoding.
     
     DynamoDB returns numbers as Decimal objects, which are not directly
-    JSON serializable. This function converts them to floats, allowing
-    them to be included in the JSON response body.
+    JSON serializable. This function converts integral values to ints and
+    the others to floats, allowing them to be included in the JSON response
+    body without turning a threshold of 5 into 5.0.
     """
     if isinstance(obj, Decimal):
-        return float(obj)
+        return int(obj) if obj == obj.to_integral_value() else float(obj)
     raise TypeError
 
+def bump_rules_version():
+    """
+    Changes the rules version marker after a write to the rules table.
+
+    The marker is set to a new random value, so detectors that loaded the rules
+    at any earlier marker reload them on their next run, and the ETags of rule
+    reads change (see `conditional_get`). The time of the change is kept as
+    'updatedAt'. Nothing is done when no state table is configured.
+
+    The rules write has already succeeded when this is called, so a failed update
+    is retried with backoff and then logged as an error instead of raised: the
+    request still reports the write, and warm detectors pick the change up when
+    their rules cache expires (RULES_CACHE_MAX_AGE_SECONDS).
+
+    Returns:
+        bool: True if the marker was changed (or there is no state table), False otherwise.
+    """
+    if state_table is None:
+        return True
+    for attempt in range(RULES_VERSION_MAX_ATTEMPTS):
+        try:
+            state_table.update_item(
+                Key={'stateKey': RULES_VERSION_STATE_KEY},
+                UpdateExpression='SET version = :version, updatedAt = :updated_at',
+                ExpressionAttributeValues={
+                    ':version': str(uuid.uuid4()),
+                    ':updated_at': datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+                }
+            )
+            return True
+        except Exception as e:
+            error = e
+            if attempt + 1 < RULES_VERSION_MAX_ATTEMPTS:
+                delay = min(BATCH_WRITE_MAX_DELAY_SECONDS, BATCH_WRITE_BASE_DELAY_SECONDS * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+    logger.error(
+        "Rules changed but the rules version was not updated; detectors keep cached rules until they expire",
+        error=str(error)
+    )
+    return False
+
+
+def request_header(event, name):
+    """
+    Returns a request header, matching its name case-insensitively.
+
+    Args:
+        event (dict): The API Gateway event payload.
+        name (str): The header name.
+
+    Returns:
+        str: The header value, or None if the header is missing.
+    """
+    for key, value in (event.get('headers') or {}).items():
+        if key.lower() == name.lower():
+            return value
+    return None
+
+
+def if_none_match_tags(event):
+    """
+    Returns the entity tags of the request's 'If-None-Match' header, weak tags as strong.
+    """
+    if_none_match = request_header(event, 'If-None-Match') or ''
+    return [tag.strip().replace('W/', '', 1) for tag in if_none_match.split(',')]
+
+
+def conditional_get(event, resource, wildcard=True):
+    """
+    Returns the caching headers of a rule read and whether the client's copy is current.
+
+    Every write to the rules table changes the rules version marker, so the marker
+    identifies the state of every rule. The ETag is derived from the marker and the
+    requested resource (the path and query parameters), and is compared with the
+    request's 'If-None-Match' header. Only the marker item is read, never the rules.
+    Without a state table or marker, no caching headers are returned.
+
+    Args:
+        event (dict): The API Gateway event payload.
+        resource (str): The requested resource, e.g. the path and sorted query parameters.
+        wildcard (bool, optional): Whether 'If-None-Match: *' matches. Only valid when
+            the resource always exists; single rules have to be read first.
+
+    Returns:
+        tuple: The response headers ('ETag' and 'Last-Modified') and True if the
+               client's copy is current and a 304 response can be returned.
+    """
+    if state_table is None:
+        return {}, False
+    try:
+        marker = state_table.get_item(Key={'stateKey': RULES_VERSION_STATE_KEY}, ConsistentRead=True).get('Item')
+    except Exception as e:
+        logger.warning("Error reading the rules version", error=str(e))
+        return {}, False
+    if not marker:
+        return {}, False
+
+    etag = '"' + hashlib.sha1(f"{marker['version']}|{resource}".encode('utf-8')).hexdigest()[:20] + '"'
+    headers = {'ETag': etag}
+    if marker.get('updatedAt'):
+        updated_at = datetime.strptime(marker['updatedAt'], "%Y-%m-%dT%H:%M:%SZ").replace(tzinfo=timezone.utc)
+        headers['Last-Modified'] = format_datetime(updated_at, usegmt=True)
+
+    client_etags = if_none_match_tags(event)
+    return headers, etag in client_etags or (wildcard and '*' in client_etags)
+
+
+def not_modified_response(headers):
+    """
+    Returns a 304 response with the caching headers and no body.
+
+    Args:
+        headers (dict): The 'ETag' and 'Last-Modified' headers.
+
+    Returns:
+        dict: An API Gateway-compatible response.
+    """
+    return {
+        'statusCode': 304,
+        'headers': headers,
+        'body': ''
+    }
+
+
+@aws.logs_consumed_capacity(logger)
 def lambda_handler(event, context):
     """
     Main Lambda handler for the anomaly rules API.
 
     This function acts as a dispatcher, routing incoming API Gateway requests
     to the appropriate function based on the HTTP method and path. It supports
-    CRUD (Create, Read, Update, Delete) operations for anomaly detection rules.
+    CRUD (Create, Read, Update, Delete) operations for anomaly detection rules,
+    as well as bulk import ('POST /rules/import') and export ('GET /rules/export').
 
     Args:
         event (dict): The API Gateway event payload, including HTTP method, path, and body.
@@ -38,12 +200,18 @@ def lambda_handler(event, context):
     """
     http_method = event['httpMethod']
     path = event['path']
+    logger.start_invocation()
+    logger.debug("Received request", httpMethod=http_method, path=path)
 
     if http_method == 'POST':
+        if path == '/rules/import':
+            return import_rules(event)
         return create_rule(event)
     elif http_method == 'GET':
         if path == '/rules':
-            return get_all_rules()
+            return get_all_rules(event)
+        elif path == '/rules/export':
+            return export_rules(event)
         else:
             return get_rule_by_id(event)
     elif http_method == 'DELETE':
@@ -61,7 +229,13 @@ def validate_rule_body(body):
     
     This function checks if all required fields are present and if their values
     meet the specified criteria, such as a positive integer for 'threshold' and
-    a supported value for 'ruleType'.
+    a supported value for 'ruleType'. For 'baseline' rules, 'threshold' is the
+    number of standard deviations above the series' own history that is flagged,
+    and the optional 'historyWindows' and 'method' fields are checked as well.
+    For 'distinct-count' rules, 'threshold' is the number of distinct values of
+    'distinctField' that is flagged; the metric '*' (any event) is only allowed
+    together with a concrete target identity. Empty 'metric' and 'target' values
+    are rejected, as they cannot be stored in the secondary indexes.
     
     Args:
         body (dict): The parsed JSON body of the API request.
@@ -75,14 +249,37 @@ def validate_rule_body(body):
     if missing_fields:
         return False, f"Missing required fields: {', '.join(missing_fields)}"
 
-    if body['ruleType'] not in ['count-based']:
-        return False, "Unsupported ruleType. Supported values: count-based"
+    if not isinstance(body['metric'], str) or not isinstance(body['target'], str):
+        return False, "metric and target must be strings"
+
+    # Both are keys of the rules table's secondary indexes, which reject empty strings.
+    if not body['metric'] or not body['target']:
+        return False, "metric and target must not be empty"
+
+    if body['ruleType'] not in SUPPORTED_RULE_TYPES:
+        return False, f"Unsupported ruleType. Supported values: {', '.join(SUPPORTED_RULE_TYPES)}"
     
     if not isinstance(body['threshold'], int) or body['threshold'] <= 0:
         return False, "threshold must be a positive integer"
     
     if not isinstance(body['timeWindow'], int) or body['timeWindow'] <= 0:
         return False, "timeWindow must be a positive integer (minutes)"
+
+    if 'cooldownMinutes' in body and (not isinstance(body['cooldownMinutes'], int) or body['cooldownMinutes'] <= 0):
+        return False, "cooldownMinutes must be a positive integer (minutes)"
+
+    if body['ruleType'] == 'baseline':
+        history_windows = body.get('historyWindows', 24)
+        if not isinstance(history_windows, int) or not 2 <= history_windows <= MAX_HISTORY_WINDOWS:
+            return False, f"historyWindows must be an integer between 2 and {MAX_HISTORY_WINDOWS}"
+        if body.get('method', 'zscore') not in BASELINE_METHODS:
+            return False, f"Unsupported method. Supported values: {', '.join(BASELINE_METHODS)}"
+
+    if body['ruleType'] == 'distinct-count':
+        if body.get('distinctField') not in DISTINCT_FIELDS:
+            return False, f"distinctField must be one of: {', '.join(DISTINCT_FIELDS)}"
+        if body['metric'] == WILDCARD_METRIC and body['target'].lower() in WILDCARD_TARGETS:
+            return False, "A wildcard metric requires a concrete target identity"
     
     return True, None
 
@@ -117,6 +314,7 @@ def create_rule(event):
         body['timeWindow'] = body.pop('timeWindow')
 
         table.put_item(Item=body)
+        bump_rules_version()
 
         return {
             'statusCode': 201,
@@ -124,24 +322,332 @@ def create_rule(event):
         }
 
     except Exception as e:
-        print(f"Error in create_rule: {str(e)}")
+        logger.error("Error in create_rule", error=str(e))
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Internal server error'})
+        }
+
+def parse_import_body(body):
+    """
+    Parses the rules of an import request.
+
+    The body is either a JSON object with a 'rules' array or newline-delimited
+    JSON with one rule per line, as returned by `export_rules`. Numbers with a
+    fraction are parsed as Decimal, as DynamoDB does not accept floats.
+
+    Args:
+        body (str): The request body.
+
+    Returns:
+        list: The rules, in request order.
+
+    Raises:
+        ValueError: If the body is not valid JSON or NDJSON.
+    """
+    try:
+        parsed = json.loads(body, parse_float=Decimal)
+    except ValueError:
+        return [json.loads(line, parse_float=Decimal) for line in body.splitlines() if line.strip()]
+    if isinstance(parsed, dict) and isinstance(parsed.get('rules'), list):
+        return parsed['rules']
+    if isinstance(parsed, dict):
+        return [parsed]
+    raise ValueError("Expected an object with a 'rules' array or one rule per line")
+
+
+def batch_put_rules(rules):
+    """
+    Writes rules with batched writes, retrying unprocessed items.
+
+    The rules are written in chunks of BATCH_WRITE_SIZE with `batch_write_item`.
+    Rules that DynamoDB returns as 'UnprocessedItems' are retried with exponential
+    backoff and full jitter. A chunk whose write fails is logged and its pending
+    rules are reported as failed, and the next chunks are still written.
+
+    Args:
+        rules (list): The validated rules, each with a unique 'ruleId'.
+
+    Returns:
+        set: The IDs of the rules that were not written, because they are still
+             unprocessed after BATCH_WRITE_MAX_ATTEMPTS attempts or their chunk failed.
+    """
+    failed = set()
+    for i in range(0, len(rules), BATCH_WRITE_SIZE):
+        request_items = {table_name: [{'PutRequest': {'Item': rule}} for rule in rules[i:i + BATCH_WRITE_SIZE]]}
+        try:
+            for attempt in range(BATCH_WRITE_MAX_ATTEMPTS):
+                response = dynamodb.batch_write_item(RequestItems=request_items)
+                request_items = response.get('UnprocessedItems') or {}
+                if not request_items:
+                    break
+                delay = min(BATCH_WRITE_MAX_DELAY_SECONDS, BATCH_WRITE_BASE_DELAY_SECONDS * 2 ** attempt)
+                time.sleep(random.uniform(0, delay))
+        except Exception as e:
+            logger.error("Error writing a chunk of rules", error=str(e))
+        failed.update(request['PutRequest']['Item']['ruleId'] for request in request_items.get(table_name, []))
+    return failed
+
+
+def import_rules(event):
+    """
+    Creates or replaces many rules in one request.
+
+    This function handles POST requests to the /rules/import endpoint. Every rule
+    is checked with `validate_rule_body`. A rule with a 'ruleId' replaces the
+    stored rule with that ID, and a rule without one is created with a new ID.
+    The valid rules are written with batched writes (see `batch_put_rules`) and
+    the rules version marker is changed once for the whole import. Invalid rules
+    do not prevent the others from being written.
+
+    Args:
+        event (dict): The API Gateway event payload.
+
+    Returns:
+        dict: An API Gateway-compatible response with a result per rule, in request
+              order. The status code is 200 if every rule was written, 207 otherwise.
+    """
+    try:
+        rules = parse_import_body(event.get('body') or '')
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f"Invalid request body: {e}"})
+        }
+    if not rules or len(rules) > MAX_IMPORT_RULES:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f"Provide between 1 and {MAX_IMPORT_RULES} rules"})
+        }
+
+    results = []
+    valid_rules = []
+    seen_ids = set()
+    for position, rule in enumerate(rules):
+        if not isinstance(rule, dict):
+            results.append({'index': position, 'statusCode': 400, 'message': 'A rule must be an object'})
+            continue
+        is_valid, error_msg = validate_rule_body(rule)
+        rule_id = str(rule.get('ruleId') or uuid.uuid4())
+        if is_valid and rule_id in seen_ids:
+            is_valid, error_msg = False, "Duplicate ruleId in the request"
+        if not is_valid:
+            results.append({'index': position, 'statusCode': 400, 'message': error_msg})
+            continue
+        created = 'ruleId' not in rule
+        seen_ids.add(rule_id)
+        valid_rules.append(dict(rule, ruleId=rule_id))
+        results.append({'index': position, 'ruleId': rule_id, 'statusCode': 201 if created else 200})
+
+    failed_ids = batch_put_rules(valid_rules)
+    if len(failed_ids) < len(valid_rules):
+        bump_rules_version()
+
+    for result in results:
+        if result.get('ruleId') in failed_ids:
+            result.update({'statusCode': 503, 'message': 'Write failed, retry the rule'})
+    written = sum(1 for result in results if result['statusCode'] in (200, 201))
+    logger.info("Imported rules", ruleCount=len(rules), writtenCount=written)
+    return {
+        'statusCode': 200 if written == len(rules) else 207,
+        'body': json.dumps({'written': written, 'failed': len(rules) - written, 'results': results})
+    }
+
+
+def export_rules(event):
+    """
+    Exports one page of rules as newline-delimited JSON.
+
+    This function handles GET requests to the /rules/export endpoint. Like `GET /rules`,
+    it reads at most 'limit' rules (default 100, at most 1000) per request. When more
+    remain, or the page would exceed MAX_EXPORT_BYTES, the response carries an opaque
+    continuation token in the 'X-Next-Token' header to pass back as 'nextToken'. The
+    body stays plain NDJSON, so the pages can be passed unchanged to `import_rules`
+    to sync a rule set.
+
+    Args:
+        event (dict): The API Gateway event payload.
+
+    Returns:
+        dict: An API Gateway-compatible response with an 'application/x-ndjson' body.
+    """
+    params = event.get('queryStringParameters') or {}
+    limit = page_limit(params)
+    if limit is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f"limit must be an integer between 1 and {MAX_PAGE_SIZE}"})
+        }
+    scan_kwargs = {'Limit': limit}
+    if params.get('nextToken'):
+        try:
+            scan_kwargs['ExclusiveStartKey'] = decode_next_token(params['nextToken'], None)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'message': str(e)})
+            }
+
+    try:
+        response = table.scan(**scan_kwargs)
+    except Exception as e:
+        logger.error("Error in export_rules", error=str(e))
         return {
             'statusCode': 500,
             'body': json.dumps({'message': 'Internal server error'})
         }
 
-def get_all_rules():
+    lines = []
+    size = 0
+    last_key = response.get('LastEvaluatedKey')
+    for rule in response['Items']:
+        line = json.dumps(rule, separators=(',', ':'), default=decimal_default) + '\n'
+        if lines and size + len(line) > MAX_EXPORT_BYTES:
+            # The scan resumes after the last exported rule, keyed by its ruleId.
+            last_key = {'ruleId': json.loads(lines[-1])['ruleId']}
+            break
+        lines.append(line)
+        size += len(line)
+
+    headers = {'Content-Type': 'application/x-ndjson'}
+    if last_key:
+        headers['X-Next-Token'] = encode_next_token(last_key, None)
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': ''.join(lines)
+    }
+
+
+def page_limit(params):
     """
-    Retrieves all anomaly detection rules from DynamoDB.
+    Returns the page size requested with the 'limit' query parameter.
+
+    Args:
+        params (dict): The query string parameters.
+
+    Returns:
+        int: The page size (DEFAULT_PAGE_SIZE if not given), or None if it is not
+             an integer between 1 and MAX_PAGE_SIZE.
+    """
+    try:
+        limit = int(params.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError:
+        return None
+    return limit if 1 <= limit <= MAX_PAGE_SIZE else None
+
+
+def encode_next_token(last_key, index_name):
+    """
+    Encodes the position after a page of rules as an opaque continuation token.
+
+    Args:
+        last_key (dict): The 'LastEvaluatedKey' of the page.
+        index_name (str): The index the page was read from, or None for the table.
+
+    Returns:
+        str: The URL-safe token.
+    """
+    payload = json.dumps({'index': index_name, 'key': last_key}, separators=(',', ':'), default=decimal_default)
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii')
+
+
+def decode_next_token(token, index_name):
+    """
+    Decodes a continuation token returned by `encode_next_token`.
+
+    Args:
+        token (str): The token from the 'nextToken' query parameter.
+        index_name (str): The index the next page is read from, or None for the table.
+
+    Returns:
+        dict: The key to start the next page after.
+
+    Raises:
+        ValueError: If the token is malformed or was issued for other filters.
+    """
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode('ascii')))
+    except (binascii.Error, UnicodeError, ValueError):
+        raise ValueError("Invalid nextToken")
+    if not isinstance(payload, dict) or payload.get('index') != index_name or not isinstance(payload.get('key'), dict):
+        raise ValueError("Invalid nextToken")
+    return payload['key']
+
+
+def get_all_rules(event):
+    """
+    Retrieves one page of anomaly detection rules from DynamoDB.
     
-    This function handles GET requests to the /rules endpoint. It performs a
-    scan operation on the DynamoDB rules table and returns all items found.
+    This function handles GET requests to the /rules endpoint. The optional query
+    parameters 'metric', 'target' and 'ruleType' filter the rules: the first of them
+    that is given (in that order) selects the secondary index that is queried, so
+    only the matching rules are read, and the others are applied as a filter
+    expression. Without filters, the table is scanned. At most 'limit' rules
+    (default 100, at most 1000) are read per request; when more remain, the response
+    carries an opaque 'nextToken' to pass back for the next page. A filtered page
+    may hold fewer rules than 'limit' while a 'nextToken' is still returned.
+    Pages carry an ETag; a request whose 'If-None-Match' matches it is answered
+    with 304 from the rules version marker alone (see `conditional_get`).
+
+    Args:
+        event (dict): The API Gateway event payload.
+
+    Returns:
+        dict: An API Gateway-compatible response with the 'rules' of the page and
+              the 'nextToken', if any.
     """
+    params = event.get('queryStringParameters') or {}
+    limit = page_limit(params)
+    if limit is None:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f"limit must be an integer between 1 and {MAX_PAGE_SIZE}"})
+        }
+
+    filters = [(name, index_name) for name, index_name in FILTER_INDEXES if params.get(name)]
+    request_kwargs = {'Limit': limit}
+    names = {}
+    values = {}
+    index_name = None
+    if filters:
+        key_name, index_name = filters.pop(0)
+        names['#key'] = key_name
+        values[':key'] = params[key_name]
+        request_kwargs.update({'IndexName': index_name, 'KeyConditionExpression': '#key = :key'})
+    if filters:
+        conditions = []
+        for position, (name, _) in enumerate(filters):
+            names[f"#f{position}"] = name
+            values[f":f{position}"] = params[name]
+            conditions.append(f"#f{position} = :f{position}")
+        request_kwargs['FilterExpression'] = ' AND '.join(conditions)
+    if names:
+        request_kwargs.update({'ExpressionAttributeNames': names, 'ExpressionAttributeValues': values})
+
+    if params.get('nextToken'):
+        try:
+            request_kwargs['ExclusiveStartKey'] = decode_next_token(params['nextToken'], index_name)
+        except ValueError as e:
+            return {
+                'statusCode': 400,
+                'body': json.dumps({'message': str(e)})
+            }
+
+    resource = '/rules?' + '&'.join(f"{name}={params[name]}" for name in sorted(params))
+    headers, not_modified = conditional_get(event, resource)
+    if not_modified:
+        return not_modified_response(headers)
+
     try:
-        response = table.scan()
+        response = table.query(**request_kwargs) if index_name else table.scan(**request_kwargs)
+        page = {'rules': response['Items']}
+        if response.get('LastEvaluatedKey'):
+            page['nextToken'] = encode_next_token(response['LastEvaluatedKey'], index_name)
         return {
             'statusCode': 200,
-            'body': json.dumps(response['Items'], default=decimal_default)
+            'headers': headers,
+            'body': json.dumps(page, default=decimal_default)
         }
     except Exception as e:
         return {
@@ -155,13 +661,22 @@ def get_rule_by_id(event):
     
     This function handles GET requests to a specific rule endpoint (e.g., /rules/{ruleId}).
     It uses a `get_item` operation with the provided `ruleId` to fetch the specific rule.
+    The response carries an ETag; a request whose 'If-None-Match' matches it is
+    answered with 304 without reading the rule (see `conditional_get`). 'If-None-Match: *'
+    is answered with 304 only once the rule was read and exists.
     """
     rule_id = event['pathParameters']['ruleId']
+    headers, not_modified = conditional_get(event, f"/rules/{rule_id}", wildcard=False)
+    if not_modified:
+        return not_modified_response(headers)
     try:
         response = table.get_item(Key={'ruleId': rule_id})
         if 'Item' in response:
+            if headers and '*' in if_none_match_tags(event):
+                return not_modified_response(headers)
             return {
                 'statusCode': 200,
+                'headers': headers,
                 'body': json.dumps(response['Item'], default=decimal_default)
             }
         else:
@@ -192,6 +707,7 @@ def delete_rule(event):
         )
 
         if 'Attributes' in response:
+            bump_rules_version()
             return {
                 'statusCode': 200,
                 'body': json.dumps({'message': 'Rule deleted successfully'})
@@ -203,7 +719,7 @@ def delete_rule(event):
             }
 
     except Exception as e:
-        print(f"Error in delete_rule: {str(e)}")
+        logger.error("Error in delete_rule", error=str(e))
         return {
             'statusCode': 500,
             'body': json.dumps({'message': 'Internal server error'})
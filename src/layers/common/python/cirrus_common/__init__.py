@@ -0,0 +1,3 @@
+"""
+Code shared by the Cirrus Lambda functions, deployed as the 'common' Lambda layer.
+"""
@@ -0,0 +1,312 @@
+"""
+Lazily created, shared low-level AWS clients.
+
+Creating `boto3.resource('dynamodb')` at import time loads the resource model and
+generates its classes, which is the slowest part of boto3 to load and adds to
+every cold start. The helpers here create plain low-level clients on first use
+only, keep them for the lifetime of the container and share them between all
+modules and threads. `DynamoDB` and `Table` expose the subset of the resource
+interface the functions use (items are plain Python values), implemented on the
+low-level client with the same type serializer as the resource layer.
+
+DynamoDB clients use botocore's adaptive retry mode: throttled requests are retried
+with jittered exponential backoff, and a client-side token bucket slows the
+container down while the table throttles, so bursts degrade into latency instead
+of failed invocations. Every DynamoDB request asks for its consumed capacity,
+which is accumulated per calling function, table and operation and written as
+one log record per invocation by `log_consumed_capacity`.
+"""
+import os
+import sys
+import json
+import functools
+import threading
+
+# Retry behavior of DynamoDB clients: botocore's 'adaptive' mode adds client-side
+# rate limiting to the jittered retries of the 'standard' mode.
+dynamodb_retry_mode = os.environ.get('DYNAMODB_RETRY_MODE', 'adaptive')
+dynamodb_max_attempts = int(os.environ.get('DYNAMODB_MAX_ATTEMPTS', '10'))
+# Whether DynamoDB requests return and accumulate their consumed capacity.
+track_consumed_capacity = os.environ.get('DYNAMODB_TRACK_CAPACITY', 'true').lower() == 'true'
+
+_clients = {}
+_lock = threading.Lock()
+_serializer = None
+_deserializer = None
+# (calling function, table, operation) -> [requests, capacity units], since the last log record.
+_consumed_capacity = {}
+_capacity_lock = threading.Lock()
+
+
+def client(service_name, **config):
+    """
+    Returns the shared low-level client of a service, creating it on first use.
+
+    Args:
+        service_name (str): The service name, e.g. 'dynamodb'.
+        **config: Options of `botocore.config.Config`, e.g. 'max_pool_connections'.
+
+    Returns:
+        botocore.client.BaseClient: The client.
+    """
+    key = (service_name, json.dumps(config, sort_keys=True))
+    cached = _clients.get(key)
+    if cached is None:
+        with _lock:
+            cached = _clients.get(key)
+            if cached is None:
+                import boto3
+                from botocore.config import Config
+                cached = boto3.client(service_name, config=Config(**config) if config else None)
+                _clients[key] = cached
+    return cached
+
+
+class LazyClient:
+    """
+    A stand-in for a low-level client that creates the shared client on first use.
+
+    Attributes:
+        service_name (str): The service name.
+        config (dict): Options of `botocore.config.Config`.
+    """
+    def __init__(self, service_name, **config):
+        self.service_name = service_name
+        self.config = config
+
+    def __getattr__(self, name):
+        return getattr(client(self.service_name, **self.config), name)
+
+
+def _types():
+    """
+    Returns the DynamoDB type serializer and deserializer, created on first use.
+    """
+    global _serializer, _deserializer
+    if _serializer is None:
+        from boto3.dynamodb.types import TypeSerializer, TypeDeserializer
+        _serializer, _deserializer = TypeSerializer(), TypeDeserializer()
+    return _serializer, _deserializer
+
+
+def serialize(values):
+    """
+    Converts a mapping of Python values to DynamoDB attribute values.
+    """
+    serializer = _types()[0]
+    return {name: serializer.serialize(value) for name, value in values.items()}
+
+
+def deserialize(values):
+    """
+    Converts a mapping of DynamoDB attribute values to Python values.
+    """
+    deserializer = _types()[1]
+    return {name: deserializer.deserialize(value) for name, value in values.items()}
+
+
+# Request parameters and response fields holding attribute values.
+SERIALIZED_PARAMETERS = ('Item', 'Key', 'ExpressionAttributeValues', 'ExclusiveStartKey')
+DESERIALIZED_FIELDS = ('Item', 'Attributes', 'LastEvaluatedKey')
+_OPERATION_NAMES = {
+    'get_item': 'GetItem', 'put_item': 'PutItem', 'update_item': 'UpdateItem',
+    'delete_item': 'DeleteItem', 'query': 'Query', 'scan': 'Scan'
+}
+
+
+def _caller():
+    """
+    Returns the name of the function outside this module that made the current request.
+    """
+    frame = sys._getframe(1)
+    while frame is not None and frame.f_globals.get('__name__') == __name__:
+        frame = frame.f_back
+    if frame is None:
+        return 'unknown'
+    return f"{frame.f_globals.get('__name__', '')}.{frame.f_code.co_name}"
+
+
+def record_consumed_capacity(operation, consumed):
+    """
+    Adds the consumed capacity of a request to the totals of its calling function.
+
+    Args:
+        operation (str): The DynamoDB operation, e.g. 'Query'.
+        consumed (dict or list): The 'ConsumedCapacity' of the response, one entry
+            per table for batch operations.
+    """
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    caller = _caller()
+    with _capacity_lock:
+        for entry in consumed:
+            totals = _consumed_capacity.setdefault((caller, entry.get('TableName'), operation), [0, 0.0])
+            totals[0] += 1
+            totals[1] += float(entry.get('CapacityUnits', 0))
+
+
+def log_consumed_capacity(logger):
+    """
+    Writes the capacity consumed since the last call as one log record and resets it.
+
+    Args:
+        logger (StructuredLogger): The function's logger.
+    """
+    with _capacity_lock:
+        entries = [
+            {'caller': caller, 'table': table, 'operation': operation, 'requests': requests, 'capacityUnits': round(units, 1)}
+            for (caller, table, operation), (requests, units) in sorted(_consumed_capacity.items())
+        ]
+        _consumed_capacity.clear()
+    if entries:
+        logger.info(
+            "DynamoDB consumed capacity",
+            capacityUnits=round(sum(entry['capacityUnits'] for entry in entries), 1),
+            consumedCapacity=entries
+        )
+
+
+def logs_consumed_capacity(logger):
+    """
+    Decorates a Lambda handler to log its consumed capacity when it returns or raises.
+
+    Args:
+        logger (StructuredLogger): The function's logger.
+
+    Returns:
+        function: The decorator.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(event, context):
+            try:
+                return handler(event, context)
+            finally:
+                log_consumed_capacity(logger)
+        return wrapper
+    return decorator
+
+
+class DynamoDB:
+    """
+    A lightweight replacement for the DynamoDB service resource.
+
+    Unless given, the client is configured with the DYNAMODB_RETRY_MODE and
+    DYNAMODB_MAX_ATTEMPTS retries.
+
+    Attributes:
+        config (dict): Options of `botocore.config.Config` for the shared client.
+    """
+    def __init__(self, **config):
+        config.setdefault('retries', {'mode': dynamodb_retry_mode, 'max_attempts': dynamodb_max_attempts})
+        self.config = config
+
+    @property
+    def client(self):
+        return client('dynamodb', **self.config)
+
+    def Table(self, name):
+        """
+        Returns a table handle; no client is created until the first request.
+
+        Args:
+            name (str): The table name.
+
+        Returns:
+            Table: The table.
+        """
+        return Table(self, name)
+
+    def call(self, operation, **kwargs):
+        """
+        Calls an operation with Python values, as the resource layer does.
+
+        Args:
+            operation (str): The client method name, e.g. 'query'.
+            **kwargs: The request parameters, with plain Python attribute values.
+
+        Returns:
+            dict: The response, with plain Python attribute values.
+        """
+        for parameter in SERIALIZED_PARAMETERS:
+            if parameter in kwargs:
+                kwargs[parameter] = serialize(kwargs[parameter])
+        if track_consumed_capacity:
+            kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        response = getattr(self.client, operation)(**kwargs)
+        if response.get('ConsumedCapacity'):
+            record_consumed_capacity(_OPERATION_NAMES[operation], response['ConsumedCapacity'])
+        for field in DESERIALIZED_FIELDS:
+            if field in response:
+                response[field] = deserialize(response[field])
+        if 'Items' in response:
+            response['Items'] = [deserialize(item) for item in response['Items']]
+        return response
+
+    def batch_write_item(self, RequestItems, **kwargs):
+        """
+        Writes a batch of put and delete requests given with Python values.
+
+        Args:
+            RequestItems (dict): A list of 'PutRequest'/'DeleteRequest' entries per table name.
+            **kwargs: Other request parameters.
+
+        Returns:
+            dict: The response, with 'UnprocessedItems' in the same form as the request.
+        """
+        if track_consumed_capacity:
+            kwargs.setdefault('ReturnConsumedCapacity', 'TOTAL')
+        response = self.client.batch_write_item(RequestItems=_convert_requests(RequestItems, serialize), **kwargs)
+        if response.get('ConsumedCapacity'):
+            record_consumed_capacity('BatchWriteItem', response['ConsumedCapacity'])
+        if response.get('UnprocessedItems'):
+            response['UnprocessedItems'] = _convert_requests(response['UnprocessedItems'], deserialize)
+        return response
+
+
+def _convert_requests(request_items, convert):
+    """
+    Converts the items and keys of batch write requests with `serialize` or `deserialize`.
+    """
+    converted = {}
+    for table_name, requests in request_items.items():
+        converted[table_name] = [
+            {'PutRequest': {'Item': convert(request['PutRequest']['Item'])}} if 'PutRequest' in request
+            else {'DeleteRequest': {'Key': convert(request['DeleteRequest']['Key'])}}
+            for request in requests
+        ]
+    return converted
+
+
+class Table:
+    """
+    A lightweight replacement for a DynamoDB table resource.
+
+    Attributes:
+        name (str): The table name.
+    """
+    def __init__(self, dynamodb, name):
+        self._dynamodb = dynamodb
+        self.name = name
+
+    @property
+    def table_name(self):
+        return self.name
+
+    def get_item(self, **kwargs):
+        return self._dynamodb.call('get_item', TableName=self.name, **kwargs)
+
+    def put_item(self, **kwargs):
+        return self._dynamodb.call('put_item', TableName=self.name, **kwargs)
+
+    def update_item(self, **kwargs):
+        return self._dynamodb.call('update_item', TableName=self.name, **kwargs)
+
+    def delete_item(self, **kwargs):
+        return self._dynamodb.call('delete_item', TableName=self.name, **kwargs)
+
+    def query(self, **kwargs):
+        return self._dynamodb.call('query', TableName=self.name, **kwargs)
+
+    def scan(self, **kwargs):
+        return self._dynamodb.call('scan', TableName=self.name, **kwargs)
@@ -0,0 +1,59 @@
+"""
+Attribute names of the items in the events table.
+
+The key attributes ('userIdentity', 'eventTime') and the 'EventNameIndex' key
+('eventName') keep their names; every other attribute is stored under a short name
+to keep items small, as attribute names count towards the item size.
+
+The 'eventTime' sort key holds the event time followed by the CloudTrail 'eventID'
+('2023-01-01T00:00:00Z#<eventID>'), so distinct events of a principal within the
+same second get distinct keys and a redelivered event overwrites itself. Readers
+only use the time prefix, and range queries end at `event_time_upper_bound`.
+"""
+
+USER_IDENTITY = 'userIdentity'
+EVENT_TIME = 'eventTime'
+EVENT_NAME = 'eventName'
+REGION = 'rg'
+RESOURCE_TYPE = 'rt'
+REQUEST_PARAMETERS = 'rp'
+EXPIRES_AT = 'expiresAt'
+EVENT_ID_SEPARATOR = '#'
+
+# Maps the field names used in rules (and in items written before the compact
+# schema) to the stored attribute names.
+FIELD_ATTRIBUTES = {
+    'region': REGION,
+    'resourceType': RESOURCE_TYPE,
+    'requestParameters': REQUEST_PARAMETERS
+}
+
+
+def event_sort_key(event_time, event_id=None):
+    """
+    Returns the 'eventTime' sort key value of an event.
+
+    Args:
+        event_time (str): The CloudTrail 'eventTime'.
+        event_id (str, optional): The CloudTrail 'eventID'; the time alone is used without it.
+
+    Returns:
+        str: The sort key value.
+    """
+    return f"{event_time}{EVENT_ID_SEPARATOR}{event_id}" if event_id else event_time
+
+
+def event_time_upper_bound(end_time_str):
+    """
+    Returns the inclusive upper bound of a sort key range ending at a time.
+
+    The bound sorts after every 'eventTime' value of that second, with or without
+    an event ID suffix.
+
+    Args:
+        end_time_str (str): The inclusive end of the time range.
+
+    Returns:
+        str: The upper bound for a 'BETWEEN' key condition.
+    """
+    return end_time_str + '~'
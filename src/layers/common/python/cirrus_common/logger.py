@@ -0,0 +1,109 @@
+import os
+import sys
+import json
+import random
+from datetime import datetime
+
+LEVELS = {'DEBUG': 10, 'INFO': 20, 'WARNING': 30, 'ERROR': 40}
+
+# The minimum level written, e.g. 'INFO'; 'DEBUG' turns on verbose logging, including payloads.
+log_level = os.environ.get('LOG_LEVEL', 'INFO').upper()
+# The fraction of invocations that write their debug lines regardless of the level.
+log_sample_rate = float(os.environ.get('LOG_SAMPLE_RATE', '0'))
+
+_loggers = {}
+
+class StructuredLogger:
+    """
+    Writes compact, single-line JSON log records to standard output.
+
+    Each record carries the level, the logger name, a message and any extra fields,
+    so CloudWatch Logs Insights can filter and aggregate on them. Records below the
+    configured LOG_LEVEL are dropped before they are formatted. With LOG_SAMPLE_RATE
+    above zero, a random sample of invocations writes its debug records as well, so
+    verbose output (such as full payloads) is available without paying for it on
+    every invocation.
+
+    Attributes:
+        name (str): The name written with every record, e.g. the function name.
+        level (int): The minimum level written.
+        sampled (bool): Whether the current invocation writes its debug records.
+    """
+    def __init__(self, name, level=None, sample_rate=None):
+        """
+        Initializes the logger.
+
+        Args:
+            name (str): The name written with every record.
+            level (str, optional): The minimum level, defaults to LOG_LEVEL.
+            sample_rate (float, optional): The debug sampling rate, defaults to LOG_SAMPLE_RATE.
+        """
+        self.name = name
+        self.level = LEVELS.get(level or log_level, LEVELS['INFO'])
+        self.sample_rate = log_sample_rate if sample_rate is None else sample_rate
+        self.sampled = False
+
+    def start_invocation(self):
+        """
+        Decides whether the invocation that is starting is sampled for debug records.
+        """
+        self.sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def is_enabled(self, level):
+        """
+        Returns whether records of a level are written for the current invocation.
+
+        Args:
+            level (str): The level name.
+
+        Returns:
+            bool: True if such records are written.
+        """
+        return LEVELS[level] >= self.level or (self.sampled and level == 'DEBUG')
+
+    def log(self, level, message, **fields):
+        """
+        Writes a record if its level is enabled.
+
+        Args:
+            level (str): The level name.
+            message (str): The log message.
+            **fields: Extra fields of the record; values that are not JSON types are written as strings.
+        """
+        if not self.is_enabled(level):
+            return
+        record = {
+            'time': datetime.utcnow().isoformat(timespec='milliseconds') + 'Z',
+            'level': level,
+            'logger': self.name,
+            'message': message
+        }
+        record.update(fields)
+        sys.stdout.write(json.dumps(record, separators=(',', ':'), default=str) + '\n')
+
+    def debug(self, message, **fields):
+        self.log('DEBUG', message, **fields)
+
+    def info(self, message, **fields):
+        self.log('INFO', message, **fields)
+
+    def warning(self, message, **fields):
+        self.log('WARNING', message, **fields)
+
+    def error(self, message, **fields):
+        self.log('ERROR', message, **fields)
+
+
+def get_logger(name):
+    """
+    Returns the logger of a name, creating it on first use.
+
+    Args:
+        name (str): The logger name.
+
+    Returns:
+        StructuredLogger: The shared logger.
+    """
+    if name not in _loggers:
+        _loggers[name] = StructuredLogger(name)
+    return _loggers[name]
@@ -0,0 +1,171 @@
+import json
+import hashlib
+
+WILDCARD_TARGETS = {'*', 'any', 'all'}
+WILDCARD_METRIC = '*'
+# The detector state item holding the rules version marker, which rule management
+# changes on every write to the rules table.
+RULES_VERSION_STATE_KEY = 'rules#version'
+
+# The index compiled by `compile_rules`, kept in the warm container:
+# (version, the rules list it was compiled from, RuleIndex).
+_cached_index = (None, None, None)
+
+def rule_target(rule):
+    """
+    Returns the identity a rule is scoped to, or None for a wildcard rule.
+
+    A missing or empty target, or one of the wildcard values '*', 'any' and 'all',
+    means the rule counts the events of every principal.
+
+    Args:
+        rule (dict): A dictionary representing a single anomaly detection rule.
+
+    Returns:
+        str: The target identity, or None if the rule applies to any identity.
+    """
+    target = rule.get('target')
+    if not target or str(target).lower() in WILDCARD_TARGETS:
+        return None
+    return target
+
+
+class RuleIndex:
+    """
+    Anomaly detection rules compiled into a lookup table keyed by metric and target.
+
+    An event can only be matched by the rules on its event name or on the wildcard
+    metric, each either scoped to the event's identity or to any identity. Routing
+    an event therefore takes at most four dictionary lookups, independent of the
+    number of rules, instead of comparing the event with every rule.
+
+    Attributes:
+        rules (list): All compiled rules.
+        metrics (set): The event names referenced by the rules, including '*'.
+        targets (set): The target identities referenced by the rules.
+    """
+    def __init__(self, rules):
+        """
+        Compiles the rules into the index.
+
+        Args:
+            rules (list): The anomaly detection rules, as stored in the rules table.
+        """
+        self.rules = list(rules)
+        self.metrics = set()
+        self.targets = set()
+        self._series = {}
+        for rule in self.rules:
+            metric = rule.get('metric')
+            target = rule_target(rule)
+            self.metrics.add(metric)
+            if target:
+                self.targets.add(target)
+            self._series.setdefault((metric, target), []).append(rule)
+
+    def __len__(self):
+        return len(self.rules)
+
+    def series(self, rule_type=None):
+        """
+        Returns the rules grouped by the (metric, target) series they evaluate.
+
+        Args:
+            rule_type (str, optional): Only include rules of this 'ruleType'.
+
+        Returns:
+            dict: A mapping of (metric, target) to the list of rules on that series.
+        """
+        if rule_type is None:
+            return dict(self._series)
+        series = {}
+        for key, rules in self._series.items():
+            typed_rules = [rule for rule in rules if rule.get('ruleType') == rule_type]
+            if typed_rules:
+                series[key] = typed_rules
+        return series
+
+    def match(self, event_name, identity=None, rule_type=None):
+        """
+        Returns the rules that can match an event.
+
+        Args:
+            event_name (str): The event's 'eventName'.
+            identity (str, optional): The event's 'userIdentity'.
+            rule_type (str, optional): Only include rules of this 'ruleType'.
+
+        Returns:
+            list: The matching rules, without duplicates.
+        """
+        keys = [(event_name, None), (WILDCARD_METRIC, None)]
+        if identity:
+            keys += [(event_name, identity), (WILDCARD_METRIC, identity)]
+        matches = []
+        for key in keys:
+            for rule in self._series.get(key, ()):
+                if rule_type is None or rule.get('ruleType') == rule_type:
+                    matches.append(rule)
+        return matches
+
+    def matches_any(self, event_name, identity=None):
+        """
+        Returns whether any rule can match an event.
+
+        Args:
+            event_name (str): The event's 'eventName'.
+            identity (str, optional): The event's 'userIdentity'.
+
+        Returns:
+            bool: True if at least one rule can match the event.
+        """
+        if (event_name, None) in self._series or (WILDCARD_METRIC, None) in self._series:
+            return True
+        return bool(identity) and (
+            (event_name, identity) in self._series or (WILDCARD_METRIC, identity) in self._series
+        )
+
+
+def rules_fingerprint(rules):
+    """
+    Returns a fingerprint of a rule set that changes whenever any rule changes.
+
+    Args:
+        rules (list): The anomaly detection rules.
+
+    Returns:
+        str: A hex digest of the rules, independent of their order.
+    """
+    digest = hashlib.sha1()
+    for encoded in sorted(json.dumps(rule, sort_keys=True, default=str) for rule in rules):
+        digest.update(encoded.encode('utf-8'))
+    return digest.hexdigest()
+
+
+def compile_rules(rules, version=None):
+    """
+    Returns the index of a rule set, compiling it only once per warm container.
+
+    The last compiled index is kept at module level and reused as long as the rule
+    set's version is unchanged. Without an explicit version marker, the fingerprint
+    of the rules is used as the version. An explicit version only identifies the
+    rules list it was loaded with: a list loaded again under the same version (e.g.
+    after the detector's rules cache expired) is compiled again, as it may hold
+    changes the version marker missed.
+
+    Args:
+        rules (list): The anomaly detection rules.
+        version (str, optional): A marker that changes whenever the rule set changes.
+
+    Returns:
+        RuleIndex: The compiled index.
+    """
+    global _cached_index
+    explicit_version = version is not None
+    if not explicit_version:
+        version = rules_fingerprint(rules)
+    cached_version, cached_rules, cached = _cached_index
+    if cached is not None and cached_version == version and (not explicit_version or cached_rules is rules):
+        return cached
+    index = RuleIndex(rules)
+    _cached_index = (version, rules, index)
+    return index
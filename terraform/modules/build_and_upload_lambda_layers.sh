@@ -49,8 +49,8 @@ PIP_PARAMS="--platform manylinux2014_x86_64 --implementation cp --only-binary=:a
 
 echo "[INFO] Building and uploading Lambda layers to S3 bucket: $CODE_STORE_BUCKET for environment: $ENV"
 
-# Only build the packages layer
-LAYERS=(packages)
+# packages: third-party requirements installed as wheels; common: shared Cirrus code copied as is
+LAYERS=(packages common)
 
 for LAYER in "${LAYERS[@]}"; do
   SRC_DIR="$REPO_ROOT_DIR/src/layers/$LAYER"
@@ -63,32 +63,36 @@ for LAYER in "${LAYERS[@]}"; do
   rm -rf "$LAYER_BUILD_DIR"
   mkdir -p "$LAYER_BUILD_DIR/python"
 
-  # Only build packages layer
-  # Build Python packages layer: Only core requirements.txt
-  python3 -m venv "$LAYER_BUILD_DIR/venv"
-  cp "$SRC_DIR/requirements.txt" "$LAYER_BUILD_DIR/venv/requirements.txt"
-  source "$LAYER_BUILD_DIR/venv/bin/activate"
-  echo "[DEBUG] Python version: $(python --version)"
-  echo "[DEBUG] Pip version: $(pip --version)"
-  pip install --upgrade pip
-
-  rm -rf "$LAYER_BUILD_DIR/python"/*
-  echo "[DEBUG] Installing requirement.txt to $LAYER_BUILD_DIR/python"
-  if ! pip install $PIP_PARAMS -r "$LAYER_BUILD_DIR/venv/requirements.txt" -t "$LAYER_BUILD_DIR/python"; then
-    echo "[ERROR] One or more dependencies failed to installed as wheels. Lambda layers only contains wheels. Aborting."
+  # Build code-only layers (no requirements.txt) by copying their python/ tree
+  if [ ! -f "$SRC_DIR/requirements.txt" ]; then
+    cp -r "$SRC_DIR/python/." "$LAYER_BUILD_DIR/python"
+  else
+    # Build Python packages layer: Only core requirements.txt
+    python3 -m venv "$LAYER_BUILD_DIR/venv"
+    cp "$SRC_DIR/requirements.txt" "$LAYER_BUILD_DIR/venv/requirements.txt"
+    source "$LAYER_BUILD_DIR/venv/bin/activate"
+    echo "[DEBUG] Python version: $(python --version)"
+    echo "[DEBUG] Pip version: $(pip --version)"
+    pip install --upgrade pip
+
+    rm -rf "$LAYER_BUILD_DIR/python"/*
+    echo "[DEBUG] Installing requirement.txt to $LAYER_BUILD_DIR/python"
+    if ! pip install $PIP_PARAMS -r "$LAYER_BUILD_DIR/venv/requirements.txt" -t "$LAYER_BUILD_DIR/python"; then
+      echo "[ERROR] One or more dependencies failed to installed as wheels. Lambda layers only contains wheels. Aborting."
+      deactivate
+      rm -rf "$LAYER_BUILD_DIR"
+      exit 1
+    fi
+    echo "[INFO] Installed files in python/:"
+    find "$LAYER_BUILD_DIR/python" | sort 
     deactivate
-    rm -rf "$LAYER_BUILD_DIR"
-    exit 1
-  fi
-  echo "[INFO] Installed files in python/:"
-  find "$LAYER_BUILD_DIR/python" | sort 
-  deactivate
-  rm -rf "$LAYER_BUILD_DIR/venv"
-  SRC_FILES=$(find "$LAYER_BUILD_DIR/python" -mindepth 3 -maxdepth 2 -name 'setup.py' -print0 | xargs -0r dirname)
-  if [ -n "$SRC_FILES" ]; then
-    echo "[ERROR] Source trees detected in layer:"
-    echo "$SRC_FILES"
-    exit 1
+    rm -rf "$LAYER_BUILD_DIR/venv"
+    SRC_FILES=$(find "$LAYER_BUILD_DIR/python" -mindepth 3 -maxdepth 2 -name 'setup.py' -print0 | xargs -0r dirname)
+    if [ -n "$SRC_FILES" ]; then
+      echo "[ERROR] Source trees detected in layer:"
+      echo "$SRC_FILES"
+      exit 1
+    fi
   fi
 
   find "$LAYER_BUILD_DIR/python" -type d -name '__pycache__' -exec rm -rf {} +
@@ -1,8 +1,10 @@
 resource "aws_dynamodb_table" "resource_events" {
-  name         = "cloud_resource_anomaly_detector_events"
-  billing_mode = "PAY_PER_REQUEST"
-  hash_key     = "userIdentity"
-  range_key    = "eventTime"
+  name             = "cloud_resource_anomaly_detector_events"
+  billing_mode     = "PAY_PER_REQUEST"
+  hash_key         = "userIdentity"
+  range_key        = "eventTime"
+  stream_enabled   = true
+  stream_view_type = "NEW_IMAGE"
 
   attribute {
     name = "userIdentity"
@@ -23,11 +25,19 @@ resource "aws_dynamodb_table" "resource_events" {
     Project = "CloudResourceAnomalyDetector"
   }
 
+  # Only the attributes the detector reads: compact names, plus the full names of items
+  # written before the compact schema.
   global_secondary_index {
-    name            = "EventNameIndex"
-    hash_key        = "eventName"
-    range_key       = "eventTime"
-    projection_type = "ALL"
+    name               = "EventNameIndex"
+    hash_key           = "eventName"
+    range_key          = "eventTime"
+    projection_type    = "INCLUDE"
+    non_key_attributes = ["rg", "rt", "region", "resourceType"]
+  }
+
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
   }
 }
 
@@ -41,6 +51,89 @@ resource "aws_dynamodb_table" "anomaly_rules" {
     type = "S"
   }
 
+  attribute {
+    name = "metric"
+    type = "S"
+  }
+
+  attribute {
+    name = "target"
+    type = "S"
+  }
+
+  attribute {
+    name = "ruleType"
+    type = "S"
+  }
+
+  tags = {
+    Project = "CloudResourceAnomalyDetector"
+  }
+
+  # Serve the filters of GET /rules without scanning the table.
+  global_secondary_index {
+    name            = "MetricIndex"
+    hash_key        = "metric"
+    range_key       = "ruleId"
+    projection_type = "ALL"
+  }
+
+  global_secondary_index {
+    name            = "TargetIndex"
+    hash_key        = "target"
+    range_key       = "ruleId"
+    projection_type = "ALL"
+  }
+
+  global_secondary_index {
+    name            = "RuleTypeIndex"
+    hash_key        = "ruleType"
+    range_key       = "ruleId"
+    projection_type = "ALL"
+  }
+}
+
+resource "aws_dynamodb_table" "event_counters" {
+  name         = "cloud_resource_anomaly_detector_counters"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "counterKey"
+  range_key    = "timeBucket"
+
+  attribute {
+    name = "counterKey"
+    type = "S"
+  }
+
+  attribute {
+    name = "timeBucket"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
+  tags = {
+    Project = "CloudResourceAnomalyDetector"
+  }
+}
+
+resource "aws_dynamodb_table" "detector_state" {
+  name         = "cloud_resource_anomaly_detector_state"
+  billing_mode = "PAY_PER_REQUEST"
+  hash_key     = "stateKey"
+
+  attribute {
+    name = "stateKey"
+    type = "S"
+  }
+
+  ttl {
+    attribute_name = "expiresAt"
+    enabled        = true
+  }
+
   tags = {
     Project = "CloudResourceAnomalyDetector"
   }
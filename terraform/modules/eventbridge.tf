@@ -12,7 +12,7 @@ resource "aws_cloudwatch_event_target" "detector_target" {
 resource "aws_cloudwatch_event_rule" "cloudtrail_rule" {
   name        = "cloud-anomaly-rule"
   description = "Trigger for critical AWS management events"
-  event_pattern = jsonencode({
+  event_pattern = var.ingestion_event_pattern != "" ? var.ingestion_event_pattern : jsonencode({
     source        = ["aws.iam", "aws.ec2", "aws.s3", "aws.dynamodb"],
     "detail-type" = ["AWS API Call via CloudTrail"],
     detail = {
@@ -43,5 +43,5 @@ resource "aws_cloudwatch_event_rule" "cloudtrail_rule" {
 
 resource "aws_cloudwatch_event_target" "data_ingestion_target" {
   rule = aws_cloudwatch_event_rule.cloudtrail_rule.name
-  arn  = aws_lambda_function.data_ingestion.arn
+  arn  = aws_sqs_queue.ingestion_queue.arn
 }
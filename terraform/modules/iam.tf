@@ -45,11 +45,25 @@ resource "aws_iam_role_policy" "lambda_dynamodb_write_policy" {
       {
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:UpdateItem"
         ]
+        Effect = "Allow"
+        Resource = [
+          aws_dynamodb_table.resource_events.arn,
+          aws_dynamodb_table.event_counters.arn
+        ]
+      },
+      {
+        Action   = ["dynamodb:Scan"]
         Effect   = "Allow"
-        Resource = aws_dynamodb_table.resource_events.arn
+        Resource = aws_dynamodb_table.anomaly_rules.arn
+      },
+      {
+        Action   = ["dynamodb:PutItem"]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.detector_state.arn
       },
     ]
   })
@@ -102,12 +116,22 @@ resource "aws_iam_role_policy" "rule_management_dynamodb_policy" {
       {
         Action = [
           "dynamodb:PutItem",
+          "dynamodb:BatchWriteItem",
           "dynamodb:GetItem",
           "dynamodb:Scan",
+          "dynamodb:Query",
           "dynamodb:DeleteItem"
         ]
+        Effect = "Allow"
+        Resource = [
+          aws_dynamodb_table.anomaly_rules.arn,
+          "${aws_dynamodb_table.anomaly_rules.arn}/index/*"
+        ]
+      },
+      {
+        Action   = ["dynamodb:GetItem", "dynamodb:UpdateItem"]
         Effect   = "Allow"
-        Resource = aws_dynamodb_table.anomaly_rules.arn
+        Resource = aws_dynamodb_table.detector_state.arn
       },
     ]
   })
@@ -155,13 +179,50 @@ resource "aws_iam_role_policy" "analysis_dynamodb_read_policy" {
         Effect = "Allow"
         Resource = [
           aws_dynamodb_table.resource_events.arn,
-          aws_dynamodb_table.anomaly_rules.arn
+          "${aws_dynamodb_table.resource_events.arn}/index/*",
+          aws_dynamodb_table.anomaly_rules.arn,
+          aws_dynamodb_table.event_counters.arn
         ]
       },
     ]
   })
 }
 
+resource "aws_iam_role_policy" "analysis_dynamodb_state_policy" {
+  name = "analysis-dynamodb-state-policy"
+  role = aws_iam_role.analysis_lambda_role.id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action   = ["dynamodb:GetItem", "dynamodb:PutItem", "dynamodb:UpdateItem", "dynamodb:DeleteItem"]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.detector_state.arn
+      },
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "analysis_dynamodb_stream_policy" {
+  name = "analysis-dynamodb-stream-policy"
+  role = aws_iam_role.analysis_lambda_role.id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "dynamodb:DescribeStream",
+          "dynamodb:GetRecords",
+          "dynamodb:GetShardIterator",
+          "dynamodb:ListStreams"
+        ]
+        Effect   = "Allow"
+        Resource = aws_dynamodb_table.resource_events.stream_arn
+      },
+    ]
+  })
+}
+
 resource "aws_iam_role_policy" "analysis_sns_publish_policy" {
   name = "analysis-sns-publish-policy"
   role = aws_iam_role.analysis_lambda_role.id
@@ -177,6 +238,22 @@ resource "aws_iam_role_policy" "analysis_sns_publish_policy" {
   })
 }
 
+# Lets the detector fan large rule sets out to shards and resume deferred work.
+resource "aws_iam_role_policy" "analysis_self_invoke_policy" {
+  name = "analysis-self-invoke-policy"
+  role = aws_iam_role.analysis_lambda_role.id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action   = "lambda:InvokeFunction"
+        Effect   = "Allow"
+        Resource = aws_lambda_function.anomaly_detector.arn
+      },
+    ]
+  })
+}
+
 resource "aws_iam_role" "github_actions_deploy_role" {
   name = "github_actions_deploy_role"
   assume_role_policy = jsonencode({
@@ -374,12 +451,45 @@ resource "aws_iam_role_policy_attachment" "github_actions_deploy_policy_attachme
   policy_arn = aws_iam_policy.github_actions_deploy_policy.arn
 }
 
-resource "aws_lambda_permission" "allow_cloudwatch_to_invoke_data_ingestion" {
-  statement_id  = "AllowExecutionFromCloudWatch"
-  action        = "lambda:InvokeFunction"
-  function_name = aws_lambda_function.data_ingestion.function_name
-  principal     = "events.amazonaws.com"
-  source_arn    = aws_cloudwatch_event_rule.cloudtrail_rule.arn
+resource "aws_iam_role_policy" "lambda_cloudtrail_logs_read_policy" {
+  name = "lambda-cloudtrail-logs-read-policy"
+  role = aws_iam_role.data_ingestion_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action   = "s3:ListBucket"
+        Effect   = "Allow"
+        Resource = aws_s3_bucket.cloudtrail_logs.arn
+      },
+      {
+        Action   = "s3:GetObject"
+        Effect   = "Allow"
+        Resource = "${aws_s3_bucket.cloudtrail_logs.arn}/*"
+      },
+    ]
+  })
+}
+
+resource "aws_iam_role_policy" "lambda_sqs_consume_policy" {
+  name = "lambda-sqs-consume-policy"
+  role = aws_iam_role.data_ingestion_lambda_role.id
+
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Action = [
+          "sqs:ReceiveMessage",
+          "sqs:DeleteMessage",
+          "sqs:GetQueueAttributes"
+        ]
+        Effect   = "Allow"
+        Resource = aws_sqs_queue.ingestion_queue.arn
+      },
+    ]
+  })
 }
 
 resource "aws_lambda_permission" "allow_cloudwatch_to_invoke_detector" {
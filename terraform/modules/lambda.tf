@@ -27,7 +27,35 @@ resource "aws_lambda_function" "data_ingestion" {
   }
 
   layers = [
-    aws_lambda_layer_version.packages_layer.arn
+    aws_lambda_layer_version.packages_layer.arn,
+    aws_lambda_layer_version.common_layer.arn
+  ]
+  environment {
+    variables = var.data_injestion_environment_variables
+  }
+}
+
+resource "aws_lambda_function" "data_backfill" {
+  function_name    = "data_backfill_function"
+  s3_bucket        = data.aws_s3_object.data_ingestion_package.bucket
+  s3_key           = data.aws_s3_object.data_ingestion_package.key
+  source_code_hash = chomp(data.aws_s3_object.data_ingestion_package_sha256.body)
+  description      = "Lambda function for backfilling the events table from CloudTrail log files in S3."
+
+  role        = aws_iam_role.data_ingestion_lambda_role.arn
+  handler     = "src.backfill.lambda_handler"
+  runtime     = var.lambda_runtime
+  memory_size = 1024
+  timeout     = 900
+
+  tags = {
+    Name        = "data-backfill-function"
+    Environment = var.env
+  }
+
+  layers = [
+    aws_lambda_layer_version.packages_layer.arn,
+    aws_lambda_layer_version.common_layer.arn
   ]
   environment {
     variables = var.data_injestion_environment_variables
@@ -63,7 +91,8 @@ resource "aws_lambda_function" "rule_management" {
   }
 
   layers = [
-    aws_lambda_layer_version.packages_layer.arn
+    aws_lambda_layer_version.packages_layer.arn,
+    aws_lambda_layer_version.common_layer.arn
   ]
 
   environment {
@@ -93,7 +122,7 @@ resource "aws_lambda_function" "anomaly_detector" {
   role        = aws_iam_role.analysis_lambda_role.arn
   handler     = "src.lambda_function.lambda_handler"
   runtime     = var.lambda_runtime
-  memory_size = 128
+  memory_size = 256
   timeout     = 300
 
   tags = {
@@ -102,10 +131,57 @@ resource "aws_lambda_function" "anomaly_detector" {
   }
 
   layers = [
-    aws_lambda_layer_version.packages_layer.arn
+    aws_lambda_layer_version.packages_layer.arn,
+    aws_lambda_layer_version.common_layer.arn
   ]
 
   environment {
-    variables = var.anomaly_detector_environment_variables
+    variables = merge(var.anomaly_detector_environment_variables, {
+      SNS_TOPIC_ARN = aws_sns_topic.anomaly_alerts_topic.arn
+    })
+  }
+}
+
+resource "aws_lambda_function" "anomaly_stream_detector" {
+  function_name    = "anomaly_stream_detector_function"
+  s3_bucket        = data.aws_s3_object.anomaly_detector_package.bucket
+  s3_key           = data.aws_s3_object.anomaly_detector_package.key
+  source_code_hash = chomp(data.aws_s3_object.anomaly_detector_package_sha256.body)
+  description      = "Lambda function for real-time anomaly detection on the events table stream."
+
+  role        = aws_iam_role.analysis_lambda_role.arn
+  handler     = "src.stream_handler.lambda_handler"
+  runtime     = var.lambda_runtime
+  memory_size = 128
+  timeout     = 60
+
+  tags = {
+    Name        = "anomaly-stream-detector-function"
+    Environment = var.env
+  }
+
+  layers = [
+    aws_lambda_layer_version.packages_layer.arn,
+    aws_lambda_layer_version.common_layer.arn
+  ]
+
+  environment {
+    variables = merge(var.anomaly_detector_environment_variables, {
+      SNS_TOPIC_ARN = aws_sns_topic.anomaly_alerts_topic.arn
+    })
+  }
+}
+
+resource "aws_lambda_event_source_mapping" "events_stream_detector" {
+  event_source_arn                   = aws_dynamodb_table.resource_events.stream_arn
+  function_name                      = aws_lambda_function.anomaly_stream_detector.arn
+  starting_position                  = "LATEST"
+  batch_size                         = var.stream_batch_size
+  maximum_batching_window_in_seconds = var.stream_batching_window_seconds
+
+  filter_criteria {
+    filter {
+      pattern = jsonencode({ eventName = ["INSERT"] })
+    }
   }
 }
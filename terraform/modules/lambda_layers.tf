@@ -19,3 +19,26 @@ resource "aws_lambda_layer_version" "packages_layer" {
   layer_name          = var.lambda_packages_layer_name
   compatible_runtimes = [var.lambda_runtime]
 }
+
+
+data "aws_s3_object" "common_package" {
+  bucket = aws_s3_bucket.code_store.id
+  key    = "lambda_layers/common.zip"
+
+  depends_on = [aws_s3_object.layers_folder]
+}
+
+data "aws_s3_object" "common_package_sha256" {
+  bucket = aws_s3_bucket.code_store.id
+  key    = "lambda_layers/common.zip.sha256"
+
+  depends_on = [aws_s3_object.layers_folder]
+}
+
+resource "aws_lambda_layer_version" "common_layer" {
+  s3_bucket           = data.aws_s3_object.common_package.bucket
+  s3_key              = data.aws_s3_object.common_package.key
+  source_code_hash    = chomp(data.aws_s3_object.common_package_sha256.body)
+  layer_name          = var.lambda_common_layer_name
+  compatible_runtimes = [var.lambda_runtime]
+}
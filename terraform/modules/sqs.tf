@@ -0,0 +1,43 @@
+# Buffers CloudTrail events between EventBridge and the data ingestion function,
+# so bursts are ingested in batches instead of one invocation per API call.
+resource "aws_sqs_queue" "ingestion_dead_letter_queue" {
+  name                      = "cloud-anomaly-ingestion-dlq"
+  message_retention_seconds = 1209600
+}
+
+resource "aws_sqs_queue" "ingestion_queue" {
+  name                       = "cloud-anomaly-ingestion"
+  visibility_timeout_seconds = 6 * aws_lambda_function.data_ingestion.timeout
+
+  redrive_policy = jsonencode({
+    deadLetterTargetArn = aws_sqs_queue.ingestion_dead_letter_queue.arn
+    maxReceiveCount     = 5
+  })
+}
+
+resource "aws_sqs_queue_policy" "ingestion_queue_policy" {
+  queue_url = aws_sqs_queue.ingestion_queue.id
+  policy = jsonencode({
+    Version = "2012-10-17"
+    Statement = [
+      {
+        Effect    = "Allow"
+        Principal = { Service = "events.amazonaws.com" }
+        Action    = "sqs:SendMessage"
+        Resource  = aws_sqs_queue.ingestion_queue.arn
+        Condition = {
+          ArnEquals = { "aws:SourceArn" = aws_cloudwatch_event_rule.cloudtrail_rule.arn }
+        }
+      },
+    ]
+  })
+}
+
+resource "aws_lambda_event_source_mapping" "ingestion_queue" {
+  event_source_arn                   = aws_sqs_queue.ingestion_queue.arn
+  function_name                      = aws_lambda_function.data_ingestion.arn
+  batch_size                         = var.ingestion_batch_size
+  maximum_batching_window_in_seconds = var.ingestion_batching_window_seconds
+  # Only the records returned in 'batchItemFailures' (malformed events) are retried.
+  function_response_types            = ["ReportBatchItemFailures"]
+}
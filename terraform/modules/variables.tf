@@ -37,6 +37,36 @@ variable "schedule_expression" {
   default     = "rate(15 minutes)"
 }
 
+variable "stream_batch_size" {
+  description = "The maximum number of events table stream records per streaming detector invocation."
+  type        = number
+  default     = 100
+}
+
+variable "stream_batching_window_seconds" {
+  description = "The maximum time in seconds to gather stream records before invoking the streaming detector."
+  type        = number
+  default     = 1
+}
+
+variable "ingestion_batch_size" {
+  description = "The maximum number of queued CloudTrail events per data ingestion invocation."
+  type        = number
+  default     = 100
+}
+
+variable "ingestion_batching_window_seconds" {
+  description = "The maximum time in seconds to gather queued events before invoking data ingestion."
+  type        = number
+  default     = 5
+}
+
+variable "ingestion_event_pattern" {
+  description = "An EventBridge pattern generated from the rules (python -m src.functions.data_injestion.event_pattern); empty for the default pattern."
+  type        = string
+  default     = ""
+}
+
 variable "lambda_runtime" {
   description = "The runtime environment for the Lambda functions."
   type        = string
@@ -49,6 +79,12 @@ variable "lambda_packages_layer_name" {
   default     = "packages"
 }
 
+variable "lambda_common_layer_name" {
+  description = "The name of the Lambda layer for code shared by the functions."
+  type        = string
+  default     = "common"
+}
+
 variable "data_injestion_environment_variables" {
   description = "Environment variables for the data ingestion Lambda function."
   type        = map(string)
@@ -1,4 +1,11 @@
 import os
+import sys
+
+# Shared code of the 'common' Lambda layer, importable as in the Lambda runtime (/opt/python).
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../src/layers/common/python')))
 
 os.environ.setdefault("AWS_REGION", "us-east-1")
-os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
\ No newline at end of file
+os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+# The functions import boto3 lazily (see cirrus_common.aws); load it before test modules
+# replace 'boto3' in sys.modules with a mock, as the Lambda runtime always provides it.
+import boto3.dynamodb.types  # noqa: E402,F401
@@ -0,0 +1,201 @@
+import sys
+import os
+import json
+import uuid
+import zlib
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+import numpy as np
+
+# Set dummy environment variables for the test environment
+os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
+os.environ.setdefault('DYNAMODB_RULES_TABLE', 'dummy')
+os.environ.setdefault('SNS_TOPIC_NAME', 'dummy')
+
+# Import the functions to be tested
+from src.functions.anomaly_detector.baseline import bucket_series, score_rules, ewma_baseline
+from src.functions.anomaly_detector.lambda_function import lambda_handler, load_baseline_series
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+
+def minute_bucket(current_time, minutes_ago):
+    """
+    Returns the minute bucket some minutes before the given time.
+    """
+    return (current_time - timedelta(minutes=minutes_ago)).strftime('%Y-%m-%dT%H:%M')
+
+
+def event_time(current_time, minutes_ago):
+    """
+    Returns the 'eventTime' string of an event some minutes before the given time.
+    """
+    return (current_time - timedelta(minutes=minutes_ago)).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+class TestAnomalyDetectorBaseline(unittest.TestCase):
+    """
+    Test suite for the baseline (EWMA / z-score) rule type.
+
+    This suite covers the vectorized series binning and scoring helpers and the
+    evaluation of baseline rules by the detector's `lambda_handler`, using a
+    mocked AWS environment.
+    """
+    def setUp(self):
+        """
+        Set up the test environment before each test.
+        """
+        self.current_time = datetime(2023, 1, 1, 12, 0, 0)
+        self.mock_context = MagicMock()
+        self.mock_context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:anomaly-detector"
+        self.mock_context.get_remaining_time_in_millis.return_value = 300000
+
+    def test_bucket_series(self):
+        """
+        Test that per-minute counts are binned per identity with the current bucket last.
+        """
+        minute_counts = {
+            minute_bucket(self.current_time, 1): {'alice': 1},
+            minute_bucket(self.current_time, 12): {'alice': 1},
+            minute_bucket(self.current_time, 7): {'bob': 2},
+            minute_bucket(self.current_time, 40): {'bob': 1}
+        }
+        series_ids, matrix = bucket_series(minute_counts, self.current_time, 5, 3)
+        self.assertEqual(series_ids, ['alice', 'bob'])
+        np.testing.assert_array_equal(matrix, [[0, 1, 0, 1], [0, 0, 2, 0]])
+
+    def test_bucket_series_max_series(self):
+        """
+        Test that only the busiest series are kept when the series count is capped.
+        """
+        minute_counts = {minute_bucket(self.current_time, 1): {'alice': 1, 'bob': 2, 'carol': 1}}
+        series_ids, matrix = bucket_series(minute_counts, self.current_time, 5, 3, max_series=1)
+        self.assertEqual(series_ids, ['bob'])
+        self.assertEqual(matrix.shape, (1, 4))
+
+    def test_score_rules(self):
+        """
+        Test that only series deviating from their own history are flagged.
+
+        Two rules with different history lengths are scored in one batch; the
+        spiking series is flagged while the steady and the busy-but-stable
+        series are not.
+        """
+        steady = np.array([[2, 2, 2, 2, 2]], dtype=np.float32)
+        spiking = np.array([[1, 2, 1, 2, 15]], dtype=np.float32)
+        busy = np.array([[40, 42, 41]], dtype=np.float32)
+        blocks = [
+            (['steady', 'spiking'], np.vstack([steady, spiking]), 3.0, False),
+            (['busy'], busy, 3.0, True)
+        ]
+        results = score_rules(blocks)
+        self.assertEqual([d[0] for d in results[0]], ['spiking'])
+        self.assertEqual(results[0][0][1], 15)
+        self.assertEqual(results[1], [])
+
+    def test_ewma_baseline_weights_recent_history(self):
+        """
+        Test that the EWMA baseline follows a level shift faster than the mean.
+        """
+        history = np.array([[0, 0, 0, 10, 10, 10]], dtype=np.float32)
+        mean, _ = ewma_baseline(history)
+        self.assertGreater(mean[0], np.mean(history))
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_baseline_rule(self, mock_rules_table, mock_events_table):
+        """
+        Test that a baseline rule alerts for the identity that deviates from its history.
+        """
+        now = datetime.utcnow().replace(microsecond=0)
+        items = [{'userIdentity': 'alice', 'eventTime': event_time(now, 5 * k + 2)} for k in range(1, 12)]
+        items += [{'userIdentity': 'alice', 'eventTime': event_time(now, 1)}]
+        items += [{'userIdentity': 'mallory', 'eventTime': event_time(now, 5 * k + 2)} for k in range(1, 12)]
+        items += [{'userIdentity': 'mallory', 'eventTime': event_time(now, 1)} for _ in range(20)]
+        mock_rules_table.scan.return_value = {'Items': [{
+            'ruleId': '1', 'ruleName': 'Baseline', 'ruleType': 'baseline', 'metric': 'RunInstances',
+            'threshold': 3, 'timeWindow': 5, 'historyWindows': 12, 'target': 'any'
+        }]}
+        mock_events_table.query.return_value = {'Items': items}
+        with patch('src.functions.anomaly_detector.lambda_function.send_alert') as mock_send_alert:
+            response = lambda_handler({}, self.mock_context)
+        self.assertEqual(response['statusCode'], 200)
+        mock_send_alert.assert_called_once()
+        message = mock_send_alert.call_args.args[0]
+        self.assertIn('mallory: count 20', message)
+        self.assertNotIn('alice', message)
+        query_kwargs = mock_events_table.query.call_args.kwargs
+        self.assertEqual(query_kwargs['IndexName'], 'EventNameIndex')
+        self.assertNotIn('Select', query_kwargs)
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_load_baseline_series_reuses_checkpoint(self, mock_state_table, mock_events_table):
+        """
+        Test that a baseline rule only reads the events since its checkpoint.
+
+        The checkpointed per-minute counts of each identity are reused from the chunk
+        items of past windows, the newer events are binned page by page, and only the
+        chunks of the newer events are written back.
+        """
+        rule = {'ruleId': '1', 'ruleType': 'baseline', 'metric': 'RunInstances', 'threshold': 3,
+                'timeWindow': 5, 'historyWindows': 3, 'target': 'any'}
+        chunks = {
+            f"baseline#5#RunInstances#{minute_bucket(self.current_time, 20)}": {
+                minute_bucket(self.current_time, 17): {'alice': 2}, minute_bucket(self.current_time, 16): {'bob': 1}
+            },
+            f"baseline#5#RunInstances#{minute_bucket(self.current_time, 15)}": {
+                minute_bucket(self.current_time, 12): {'alice': 1}
+            }
+        }
+        mock_state_table.get_item.side_effect = lambda Key: {'Item': {
+            'stateKey': Key['stateKey'],
+            'watermark': event_time(self.current_time, 5),
+            'buckets': zlib.compress(json.dumps(chunks[Key['stateKey']]).encode('utf-8'))
+        }} if Key['stateKey'] in chunks else {}
+        mock_events_table.query.side_effect = [
+            {'Items': [{'userIdentity': 'alice', 'eventTime': event_time(self.current_time, 8)}], 'LastEvaluatedKey': {'k': 1}},
+            {'Items': [{'userIdentity': 'alice', 'eventTime': event_time(self.current_time, 1)}]}
+        ]
+        series_ids, matrix = load_baseline_series(rule, self.current_time)
+
+        values = mock_events_table.query.call_args_list[0].kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':start_time'], event_time(self.current_time, 10))
+        self.assertEqual(series_ids, ['alice', 'bob'])
+        np.testing.assert_array_equal(matrix, [[2, 1, 1, 1], [1, 0, 0, 0]])
+        written = {call.kwargs['Item']['stateKey']: call.kwargs['Item'] for call in mock_state_table.put_item.call_args_list}
+        self.assertEqual(sorted(written), [
+            f"baseline#5#RunInstances#{minute_bucket(self.current_time, minutes_ago)}" for minutes_ago in (10, 5, 0)
+        ])
+        checkpoint = written[f"baseline#5#RunInstances#{minute_bucket(self.current_time, 5)}"]
+        self.assertEqual(json.loads(zlib.decompress(checkpoint['buckets'])), {minute_bucket(self.current_time, 1): {'alice': 1}})
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_load_baseline_series_checkpoint_item_size(self, mock_state_table, mock_events_table):
+        """
+        Test that no baseline checkpoint item exceeds the DynamoDB item size limit.
+
+        A window with far more identities than fit in 400 KB is not checkpointed
+        (its events are read again by the next run), while the other windows are.
+        """
+        rule = {'ruleId': '1', 'ruleType': 'baseline', 'metric': 'RunInstances', 'threshold': 3,
+                'timeWindow': 5, 'historyWindows': 3, 'target': 'any'}
+        mock_state_table.get_item.return_value = {}
+        mock_events_table.query.return_value = {'Items': [
+            {'userIdentity': uuid.uuid4().hex, 'eventTime': event_time(self.current_time, 12)} for _ in range(40000)
+        ] + [{'userIdentity': 'alice', 'eventTime': event_time(self.current_time, 1)}]}
+        series_ids, matrix = load_baseline_series(rule, self.current_time)
+
+        self.assertEqual(len(series_ids), 5000)
+        written = {call.kwargs['Item']['stateKey']: call.kwargs['Item'] for call in mock_state_table.put_item.call_args_list}
+        self.assertNotIn(f"baseline#5#RunInstances#{minute_bucket(self.current_time, 15)}", written)
+        self.assertIn(f"baseline#5#RunInstances#{minute_bucket(self.current_time, 5)}", written)
+        for item in written.values():
+            size = sum(len(name) + (len(value) if isinstance(value, (str, bytes)) else 21) for name, value in item.items())
+            self.assertLess(size, 400 * 1024)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,119 @@
+import sys
+import os
+import unittest
+from datetime import datetime, timedelta
+from unittest.mock import patch, MagicMock
+
+# Set dummy environment variables for the test environment
+os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
+os.environ.setdefault('DYNAMODB_RULES_TABLE', 'dummy')
+os.environ.setdefault('SNS_TOPIC_NAME', 'dummy')
+
+# Import the functions to be tested
+from src.functions.anomaly_detector import hyperloglog
+from src.functions.anomaly_detector.lambda_function import lambda_handler, evaluate_distinct_rules
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+
+class TestAnomalyDetectorDistinct(unittest.TestCase):
+    """
+    Test suite for the distinct-count rule type.
+
+    This suite covers the HyperLogLog sketch helpers and the evaluation of
+    distinct-count rules by the detector, using a mocked AWS environment.
+    """
+    def setUp(self):
+        """
+        Set up the test environment before each test.
+        """
+        self.mock_context = MagicMock()
+        self.mock_context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:anomaly-detector"
+        self.mock_context.get_remaining_time_in_millis.return_value = 300000
+        self.rule = {
+            'ruleId': 'r1',
+            'ruleName': 'Region sprawl',
+            'ruleType': 'distinct-count',
+            'metric': '*',
+            'target': 'alice',
+            'distinctField': 'region',
+            'threshold': 2,
+            'timeWindow': 60
+        }
+
+    def test_sketch_estimates(self):
+        """
+        Test that sketches estimate small and large cardinalities and merge as unions.
+        """
+        self.assertEqual(hyperloglog.estimate(hyperloglog.new_sketch()), 0)
+        self.assertEqual(hyperloglog.estimate(hyperloglog.sketch_values(['us-east-1', 'eu-west-1', 'us-east-1'])), 2)
+
+        left = hyperloglog.sketch_values(range(0, 6000))
+        right = hyperloglog.sketch_values(range(4000, 10000))
+        merged = hyperloglog.merge_sketches([left, right])
+        self.assertAlmostEqual(hyperloglog.estimate(merged), 10000, delta=10000 * 0.1)
+
+        restored = hyperloglog.from_bytes(hyperloglog.to_bytes(merged))
+        self.assertEqual(hyperloglog.estimate(restored), hyperloglog.estimate(merged))
+
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_distinct_rule(self, mock_rules_table, mock_events_table, mock_state_table):
+        """
+        Test that a distinct-count rule alerts when its target touches too many regions.
+
+        Verifies that the target's partition is read without an event name filter,
+        that only the distinct field is projected (from compact and legacy items) and
+        that the per-minute sketches are checkpointed in the state table.
+        """
+        now = datetime.utcnow()
+        event_time = (now - timedelta(minutes=5)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        mock_rules_table.scan.return_value = {'Items': [self.rule]}
+        mock_state_table.get_item.return_value = {}
+        mock_events_table.query.return_value = {'Items': [
+            {'eventTime': event_time, 'rg': region}
+            for region in ['us-east-1', 'eu-west-1', 'ap-south-1']
+        ] + [
+            {'eventTime': event_time, 'region': 'us-east-1'}
+        ]}
+
+        with patch('src.functions.anomaly_detector.lambda_function.send_alert') as mock_send_alert:
+            lambda_handler({}, self.mock_context)
+
+        query_kwargs = mock_events_table.query.call_args.kwargs
+        self.assertNotIn('FilterExpression', query_kwargs)
+        self.assertNotIn(':metric', query_kwargs['ExpressionAttributeValues'])
+        self.assertEqual(query_kwargs['ExpressionAttributeNames'], {'#field': 'rg', '#legacy_field': 'region'})
+        checkpoint = mock_state_table.put_item.call_args_list[0].kwargs['Item']
+        self.assertEqual(checkpoint['stateKey'], 'distinct#region#alice#*')
+        self.assertEqual(list(checkpoint['buckets']), [event_time[:16]])
+        mock_send_alert.assert_called_once()
+        self.assertIn('Distinct region values: ~3, Threshold: 2', mock_send_alert.call_args.args[0])
+
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    def test_distinct_rules_reuse_checkpointed_sketches(self, mock_events_table, mock_state_table):
+        """
+        Test that checkpointed sketches are merged with newly read events per window.
+        """
+        current_time = datetime(2023, 1, 1, 1, 0, 0)
+        mock_state_table.get_item.return_value = {'Item': {
+            'stateKey': 'distinct#region#alice#*',
+            'watermark': '2023-01-01T00:55:00Z',
+            'windowMinutes': 60,
+            'buckets': {'2023-01-01T00:10': hyperloglog.to_bytes(hyperloglog.sketch_values(['eu-west-1', 'ap-south-1']))}
+        }}
+        mock_events_table.query.return_value = {'Items': [{'eventTime': '2023-01-01T00:58:00Z', 'rg': 'us-east-1'}]}
+        rules = [self.rule, dict(self.rule, ruleId='r2', timeWindow=10, threshold=1)]
+        anomalies = []
+
+        evaluate_distinct_rules(rules, lambda rule, message: anomalies.append(rule['ruleId']), current_time)
+
+        values = mock_events_table.query.call_args.kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':start_time'], '2023-01-01T00:50:00Z')
+        self.assertEqual(anomalies, ['r1'])
+
+
+if __name__ == '__main__':
+    unittest.main()
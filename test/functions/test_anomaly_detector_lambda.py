@@ -1,7 +1,10 @@
 import sys
 import os
+import json
 import unittest
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
+from botocore.exceptions import ClientError
 
 # Set dummy environment variables for the test environment
 os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
@@ -9,7 +12,11 @@ os.environ.setdefault('DYNAMODB_RULES_TABLE', 'dummy')
 os.environ.setdefault('SNS_TOPIC_NAME', 'dummy')
 
 # Import the functions to be tested and mock AWS services
-from src.functions.anomaly_detector.lambda_function import lambda_handler, check_anomaly, send_alert
+from src.functions.anomaly_detector.lambda_function import (
+    lambda_handler, check_anomaly, send_alert, send_alert_digest, load_event_counts, claim_alert, load_rules,
+    publish_anomalies, build_work_units
+)
+from cirrus_common.rule_index import compile_rules
 
 # Mock boto3 and botocore to prevent actual AWS calls
 sys.modules['boto3'] = MagicMock()
@@ -32,10 +39,12 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
         """
         self.mock_context = MagicMock()
         self.mock_context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:anomaly-detector"
+        self.mock_context.get_remaining_time_in_millis.return_value = 300000
 
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
     @patch('src.functions.anomaly_detector.lambda_function.rules_table')
     @patch('src.functions.anomaly_detector.lambda_function.check_anomaly')
-    def test_lambda_handler_with_rules(self, mock_check, mock_rules_table):
+    def test_lambda_handler_with_rules(self, mock_check, mock_rules_table, mock_events_table):
         """
         Test the main handler when rules are present.
 
@@ -44,6 +53,7 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
         function returns a 200 status code and calls the helper function as expected.
         """
         mock_rules_table.scan.return_value = {'Items': [{'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 1, 'timeWindow': 5, 'target': 'user123'}]}
+        mock_events_table.query.return_value = {'Count': 0}
         mock_check.return_value = None
         event = {}
         response = lambda_handler(event, self.mock_context)
@@ -77,6 +87,60 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
         response = lambda_handler(event, self.mock_context)
         self.assertIsNone(response)
 
+    @patch('src.functions.anomaly_detector.lambda_function._cached_rules', (None, None, None))
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_load_rules_reloads_on_version_change(self, mock_rules_table, mock_state_table):
+        """
+        Test that the rules are scanned across pages only when their version changes.
+
+        Verifies that a warm container reuses its rules while the version marker
+        is unchanged and not older than the maximum cache age, and reads every
+        page of the rules table when it changes or the cache expires.
+        """
+        pages = [
+            {'Items': [{'ruleId': '1'}], 'LastEvaluatedKey': {'ruleId': '1'}},
+            {'Items': [{'ruleId': '2'}]}
+        ]
+        mock_rules_table.scan.side_effect = lambda **kwargs: pages[1] if 'ExclusiveStartKey' in kwargs else pages[0]
+        mock_state_table.get_item.return_value = {'Item': {'stateKey': 'rules#version', 'version': 'a'}}
+        self.assertEqual(load_rules(), ([{'ruleId': '1'}, {'ruleId': '2'}], 'a'))
+        self.assertEqual(load_rules(), ([{'ruleId': '1'}, {'ruleId': '2'}], 'a'))
+        self.assertEqual(mock_rules_table.scan.call_count, 2)
+
+        mock_state_table.get_item.return_value = {'Item': {'stateKey': 'rules#version', 'version': 'b'}}
+        self.assertEqual(load_rules()[1], 'b')
+        self.assertEqual(mock_rules_table.scan.call_count, 4)
+
+        with patch('src.functions.anomaly_detector.lambda_function.rules_cache_max_age_seconds', 0):
+            load_rules()
+        self.assertEqual(mock_rules_table.scan.call_count, 6)
+
+        mock_state_table.get_item.return_value = {}
+        load_rules()
+        load_rules()
+        self.assertEqual(mock_rules_table.scan.call_count, 10)
+
+    @patch('src.functions.anomaly_detector.lambda_function._cached_rules', (None, None, None))
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_work_units_change_after_rules_cache_expiry(self, mock_rules_table, mock_state_table):
+        """
+        Test that rules reloaded after the cache expired are evaluated, not the old index.
+
+        The version marker is unchanged (e.g. a rule was edited directly in DynamoDB),
+        so only the expiry of the rules cache picks up the new metric.
+        """
+        mock_state_table.get_item.return_value = {'Item': {'stateKey': 'rules#version', 'version': 'a'}}
+        rule = {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 1, 'timeWindow': 5}
+        mock_rules_table.scan.return_value = {'Items': [rule]}
+        self.assertEqual(list(build_work_units(compile_rules(*load_rules()))), ['count#RunInstances'])
+
+        mock_rules_table.scan.return_value = {'Items': [dict(rule, metric='CreateBucket')]}
+        self.assertEqual(list(build_work_units(compile_rules(*load_rules()))), ['count#RunInstances'])
+        with patch('src.functions.anomaly_detector.lambda_function.rules_cache_max_age_seconds', 0):
+            self.assertEqual(list(build_work_units(compile_rules(*load_rules()))), ['count#CreateBucket'])
+
     @patch('src.functions.anomaly_detector.lambda_function.events_table')
     @patch('src.functions.anomaly_detector.lambda_function.send_alert')
     def test_check_anomaly_count_based(self, mock_send_alert, mock_events_table):
@@ -96,12 +160,219 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
             'target': 'user123',
             'ruleName': 'Test Rule'
         }
-        mock_events_table.scan.return_value = {'Items': [{'eventName': 'RunInstances'}, {'eventName': 'RunInstances'}]}
+        mock_events_table.query.return_value = {'Count': 2}
         
         mock_send_alert_function = MagicMock()
         check_anomaly(rule, mock_send_alert_function)
         
         mock_send_alert_function.assert_called_once()
+        query_kwargs = mock_events_table.query.call_args.kwargs
+        self.assertNotIn('IndexName', query_kwargs)
+        self.assertTrue(query_kwargs['KeyConditionExpression'].startswith('userIdentity = :target'))
+        self.assertEqual(query_kwargs['ExpressionAttributeValues'][':target'], 'user123')
+        self.assertEqual(query_kwargs['Select'], 'COUNT')
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    def test_check_anomaly_wildcard_target(self, mock_events_table):
+        """
+        Test that a wildcard target counts the events of every identity.
+
+        Verifies that a rule with an 'any' target is answered from the
+        'EventNameIndex' instead of a single identity partition.
+        """
+        rule = {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 5, 'timeWindow': 5, 'target': 'any'}
+        mock_events_table.query.return_value = {'Count': 2}
+        mock_send_alert_function = MagicMock()
+        check_anomaly(rule, mock_send_alert_function)
+        mock_send_alert_function.assert_not_called()
+        query_kwargs = mock_events_table.query.call_args.kwargs
+        self.assertEqual(query_kwargs['IndexName'], 'EventNameIndex')
+        self.assertNotIn(':target', query_kwargs['ExpressionAttributeValues'])
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_queries_each_metric_once(self, mock_rules_table, mock_events_table):
+        """
+        Test that rules sharing a metric are evaluated against a single query.
+
+        Verifies that the handler reads the 'EventNameIndex' partition of a metric
+        once for its widest rule window, no matter how many rules use that metric,
+        and that each rule only counts the events inside its own window.
+        """
+        rules = [
+            {'ruleId': str(i), 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 1, 'timeWindow': window, 'target': 'user123'}
+            for i, window in enumerate([5, 60, 30])
+        ]
+        mock_rules_table.scan.return_value = {'Items': rules}
+        now = datetime.utcnow()
+        recent = now.strftime('%Y-%m-%dT%H:%M:%SZ')
+        older = (now - timedelta(minutes=20)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        mock_events_table.query.return_value = {'Items': [{'eventTime': older}, {'eventTime': recent}]}
+        with patch('src.functions.anomaly_detector.lambda_function.send_alert') as mock_send_alert:
+            response = lambda_handler({}, self.mock_context)
+        self.assertEqual(response['statusCode'], 200)
+        mock_events_table.query.assert_called_once()
+        mock_events_table.scan.assert_not_called()
+        mock_send_alert.assert_called_once()
+        self.assertEqual(mock_send_alert.call_args.args[0].count('ANOMALY DETECTED'), 2)
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_isolates_metric_errors(self, mock_rules_table, mock_events_table):
+        """
+        Test that concurrent rule evaluation keeps per-rule error isolation.
+
+        Verifies that when the query for one metric fails, the rules on the other
+        metrics are still evaluated and alerted by the worker pool.
+        """
+        mock_rules_table.scan.return_value = {'Items': [
+            {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 1, 'timeWindow': 5, 'target': 'user123'},
+            {'ruleId': '2', 'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 1, 'timeWindow': 5, 'target': 'user123'},
+            {'ruleId': '3', 'ruleType': 'count-based', 'threshold': 1, 'timeWindow': 5, 'target': 'user123'}
+        ]}
+
+        def query(**kwargs):
+            if kwargs['ExpressionAttributeValues'][':metric'] == 'RunInstances':
+                raise Exception('DB error')
+            return {'Count': 5}
+
+        mock_events_table.query.side_effect = query
+        with patch('src.functions.anomaly_detector.lambda_function.send_alert') as mock_send_alert:
+            response = lambda_handler({}, self.mock_context)
+        self.assertEqual(response['statusCode'], 200)
+        mock_send_alert.assert_called_once()
+        self.assertIn('CreateBucket', mock_send_alert.call_args.args[0])
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    def test_load_event_counts_paginates(self, mock_events_table):
+        """
+        Test that event counts follow query pagination.
+
+        Ensures `load_event_counts` keeps querying while DynamoDB returns a
+        `LastEvaluatedKey` and sums the counts of every page.
+        """
+        mock_events_table.query.side_effect = [
+            {'Count': 3, 'LastEvaluatedKey': {'eventName': 'RunInstances'}},
+            {'Count': 2}
+        ]
+        rules = [
+            {'ruleId': '1', 'metric': 'RunInstances', 'timeWindow': 5},
+            {'ruleId': '2', 'metric': 'RunInstances', 'timeWindow': 'bad'}
+        ]
+        event_counts = load_event_counts(rules, datetime(2023, 1, 1, 0, 2))
+        self.assertEqual(mock_events_table.query.call_count, 2)
+        second_call = mock_events_table.query.call_args_list[1].kwargs
+        self.assertEqual(second_call['ExclusiveStartKey'], {'eventName': 'RunInstances'})
+        self.assertEqual(second_call['ExpressionAttributeValues'][':start_time'], '2022-12-31T23:57:00Z')
+        self.assertEqual(second_call['ExpressionAttributeValues'][':end_time'], '2023-01-01T00:02:00Z~')
+        self.assertEqual(event_counts, {('RunInstances', None, 5): 5})
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.counters_table')
+    def test_load_event_counts_from_counters(self, mock_counters_table, mock_events_table):
+        """
+        Test that event counts are read from the per-minute counters when configured.
+
+        Ensures that the counters of a metric are queried once for the widest
+        window, that each window sums only its own minute buckets and that the
+        raw events table is not read at all.
+        """
+        mock_counters_table.query.return_value = {'Items': [
+            {'timeBucket': '2023-01-01T00:55', 'eventCount': 4},
+            {'timeBucket': '2023-01-01T00:59', 'eventCount': 1},
+            {'timeBucket': '2023-01-01T01:00', 'eventCount': 2}
+        ]}
+        rules = [
+            {'ruleId': '1', 'metric': 'RunInstances', 'timeWindow': 2},
+            {'ruleId': '2', 'metric': 'RunInstances', 'timeWindow': 10, 'target': '*'}
+        ]
+        event_counts = load_event_counts(rules, datetime(2023, 1, 1, 1, 0, 30))
+        mock_counters_table.query.assert_called_once()
+        mock_events_table.query.assert_not_called()
+        values = mock_counters_table.query.call_args.kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':key'], 'RunInstances')
+        self.assertEqual(values[':start_bucket'], '2023-01-01T00:51')
+        self.assertEqual(values[':end_bucket'], '2023-01-01T01:00')
+        self.assertEqual(event_counts, {('RunInstances', None, 2): 3, ('RunInstances', None, 10): 7})
+
+    @patch('src.functions.anomaly_detector.lambda_function.event_count_source', 'checkpoint')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_load_event_counts_from_checkpoint(self, mock_state_table, mock_events_table):
+        """
+        Test that checkpointed windows only read events newer than the watermark.
+
+        Verifies that the events are queried from the checkpoint's watermark minus
+        the lateness allowance, that older buckets are reused while buckets outside
+        the window are dropped, and that the slid window is written back.
+        """
+        mock_state_table.get_item.return_value = {'Item': {
+            'stateKey': 'window#RunInstances',
+            'watermark': '2023-01-01T00:55:00Z',
+            'windowMinutes': 60,
+            'buckets': {'2022-12-31T23:30': 9, '2023-01-01T00:10': 2, '2023-01-01T00:52': 7}
+        }}
+        mock_events_table.query.return_value = {'Items': [
+            {'eventTime': '2023-01-01T00:52:10Z'},
+            {'eventTime': '2023-01-01T00:59:30Z'}
+        ]}
+        rules = [
+            {'ruleId': '1', 'metric': 'RunInstances', 'timeWindow': 60},
+            {'ruleId': '2', 'metric': 'RunInstances', 'timeWindow': 5}
+        ]
+        event_counts = load_event_counts(rules, datetime(2023, 1, 1, 1, 0, 0))
+
+        values = mock_events_table.query.call_args.kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':start_time'], '2023-01-01T00:50:00Z')
+        self.assertEqual(event_counts, {('RunInstances', None, 60): 4, ('RunInstances', None, 5): 1})
+        checkpoint = mock_state_table.put_item.call_args.kwargs['Item']
+        self.assertEqual(checkpoint['watermark'], '2023-01-01T01:00:00Z')
+        self.assertEqual(checkpoint['buckets'], {'2023-01-01T00:10': 2, '2023-01-01T00:52': 1, '2023-01-01T00:59': 1})
+
+    @patch('src.functions.anomaly_detector.lambda_function.event_count_source', 'checkpoint')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_checkpoint_newer_than_current_time(self, mock_state_table, mock_events_table):
+        """
+        Test a run at an older time than the checkpoint's watermark, e.g. a continuation.
+
+        Verifies that buckets from the run's own minute on are not reused but read up
+        to the run's time, and that the older watermark is not written back.
+        """
+        mock_state_table.get_item.return_value = {'Item': {
+            'stateKey': 'window#RunInstances',
+            'watermark': '2023-01-01T01:10:00Z',
+            'windowMinutes': 60,
+            'buckets': {'2023-01-01T00:40': 2, '2023-01-01T01:00': 5, '2023-01-01T01:08': 4}
+        }}
+        mock_events_table.query.return_value = {'Items': [{'eventTime': '2023-01-01T01:00:10Z'}]}
+        rules = [{'ruleId': '1', 'metric': 'RunInstances', 'timeWindow': 60}]
+        event_counts = load_event_counts(rules, datetime(2023, 1, 1, 1, 0, 30))
+
+        values = mock_events_table.query.call_args.kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':start_time'], '2023-01-01T01:00:00Z')
+        self.assertEqual(event_counts, {('RunInstances', None, 60): 3})
+        mock_state_table.put_item.assert_not_called()
+
+    @patch('src.functions.anomaly_detector.lambda_function.event_count_source', 'checkpoint')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_checkpoint_full_read_when_window_grows(self, mock_state_table, mock_events_table):
+        """
+        Test that a checkpoint for a narrower window triggers a full window read.
+        """
+        mock_state_table.get_item.return_value = {'Item': {
+            'stateKey': 'window#RunInstances',
+            'watermark': '2023-01-01T00:55:00Z',
+            'windowMinutes': 5,
+            'buckets': {'2023-01-01T00:52': 7}
+        }}
+        mock_events_table.query.return_value = {'Items': []}
+        rules = [{'ruleId': '1', 'metric': 'RunInstances', 'timeWindow': 60}]
+        event_counts = load_event_counts(rules, datetime(2023, 1, 1, 1, 0, 0))
+        values = mock_events_table.query.call_args.kwargs['ExpressionAttributeValues']
+        self.assertEqual(values[':start_time'], '2023-01-01T00:01:00Z')
+        self.assertEqual(event_counts, {('RunInstances', None, 60): 0})
 
     @patch('src.functions.anomaly_detector.lambda_function.sns')
     def test_send_alert_success(self, mock_sns):
@@ -119,6 +390,112 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
             Subject='Cloud Resource Anomaly Detected!'
         )
 
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_claim_alert_suppressed(self, mock_state_table):
+        """
+        Test that an alert inside the rule's cool-down is suppressed.
+
+        Verifies that `claim_alert` writes the suppression state with a
+        conditional put and reports the alert as suppressed when the
+        condition fails.
+        """
+        rule = {'ruleId': '1', 'cooldownMinutes': 30}
+        mock_state_table.put_item.side_effect = ClientError(
+            {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'failed'}}, 'PutItem'
+        )
+        self.assertFalse(claim_alert(rule, datetime(2023, 1, 1, 1, 0)))
+        put_kwargs = mock_state_table.put_item.call_args.kwargs
+        self.assertEqual(put_kwargs['Item']['stateKey'], 'alert#1')
+        self.assertEqual(put_kwargs['ExpressionAttributeValues'][':cooldown_start'], '2023-01-01T00:30:00Z')
+
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    @patch('src.functions.anomaly_detector.lambda_function.claim_alert')
+    def test_lambda_handler_skips_suppressed_rules(self, mock_claim, mock_rules_table, mock_events_table):
+        """
+        Test that suppressed anomalies are left out of the digest.
+        """
+        mock_rules_table.scan.return_value = {'Items': [
+            {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 1, 'timeWindow': 5, 'target': 'any'},
+            {'ruleId': '2', 'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 1, 'timeWindow': 5, 'target': 'any'}
+        ]}
+        mock_events_table.query.return_value = {'Count': 5}
+        mock_claim.side_effect = lambda rule, current_time: rule['ruleId'] == '2'
+        with patch('src.functions.anomaly_detector.lambda_function.send_alert') as mock_send_alert:
+            lambda_handler({}, self.mock_context)
+        mock_send_alert.assert_called_once()
+        self.assertIn('Rule ID: 2', mock_send_alert.call_args.args[0])
+        self.assertNotIn('Rule ID: 1', mock_send_alert.call_args.args[0])
+
+    @patch('src.functions.anomaly_detector.lambda_function.detector_shards', 3)
+    @patch('src.functions.anomaly_detector.lambda_function.lambda_client')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_fans_out_shards(self, mock_rules_table, mock_events_table, mock_lambda_client):
+        """
+        Test that a sharded detector fans the rule set out and each shard evaluates its own units.
+
+        Verifies that the scheduled invocation starts one asynchronous invocation per
+        shard without evaluating any rule, and that together the shard invocations
+        query every metric exactly once.
+        """
+        metrics = ['RunInstances', 'CreateBucket', 'DeleteBucket', 'CreateUser', 'AttachUserPolicy']
+        mock_rules_table.scan.return_value = {'Items': [
+            {'ruleId': str(i), 'ruleType': 'count-based', 'metric': metric, 'threshold': 1, 'timeWindow': 5, 'target': 'any'}
+            for i, metric in enumerate(metrics)
+        ]}
+        mock_events_table.query.return_value = {'Count': 0}
+
+        response = lambda_handler({}, self.mock_context)
+        self.assertIn('3 shards', response['body'])
+        mock_events_table.query.assert_not_called()
+        payloads = [json.loads(call.kwargs['Payload']) for call in mock_lambda_client.invoke.call_args_list]
+        self.assertEqual([payload['shard'] for payload in payloads], [0, 1, 2])
+        self.assertEqual(mock_lambda_client.invoke.call_args.kwargs['InvocationType'], 'Event')
+
+        for payload in payloads:
+            lambda_handler(payload, self.mock_context)
+        queried = [call.kwargs['ExpressionAttributeValues'][':metric'] for call in mock_events_table.query.call_args_list]
+        self.assertEqual(sorted(queried), sorted(metrics))
+
+    @patch('src.functions.anomaly_detector.lambda_function.max_workers', 1)
+    @patch('src.functions.anomaly_detector.lambda_function.lambda_client')
+    @patch('src.functions.anomaly_detector.lambda_function.events_table')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_lambda_handler_continues_when_out_of_time(self, mock_rules_table, mock_events_table, mock_lambda_client):
+        """
+        Test that units not started within the time budget are handed to a continuation.
+
+        Verifies that the invocation still evaluates at least one unit and that the
+        remaining units are resumed by an asynchronous invocation for the same point
+        in time instead of being dropped.
+        """
+        mock_rules_table.scan.return_value = {'Items': [
+            {'ruleId': str(i), 'ruleType': 'count-based', 'metric': metric, 'threshold': 1, 'timeWindow': 5, 'target': 'any'}
+            for i, metric in enumerate(['RunInstances', 'CreateBucket', 'DeleteBucket'])
+        ]}
+        mock_events_table.query.return_value = {'Count': 0}
+        self.mock_context.get_remaining_time_in_millis.return_value = 1000
+
+        response = lambda_handler({'currentTime': '2023-01-01T01:00:00Z'}, self.mock_context)
+        self.assertIn('2 of 3 units', response['body'])
+        mock_events_table.query.assert_called_once()
+        payload = json.loads(mock_lambda_client.invoke.call_args.kwargs['Payload'])
+        self.assertEqual(payload, {
+            'currentTime': '2023-01-01T01:00:00Z',
+            'pendingUnits': ['count#DeleteBucket', 'count#RunInstances']
+        })
+
+    @patch('src.functions.anomaly_detector.lambda_function.send_alert')
+    def test_send_alert_digest_splits_large_digests(self, mock_send_alert):
+        """
+        Test that digests are split to stay below the SNS message size limit.
+        """
+        messages = ['x' * 100000 for _ in range(5)]
+        send_alert_digest(messages, 'us-east-1', '123456789012')
+        self.assertEqual(mock_send_alert.call_count, 3)
+        self.assertEqual(mock_send_alert.call_args_list[0].args[3], '2 Cloud Resource Anomalies Detected!')
+
     @patch('src.functions.anomaly_detector.lambda_function.sns')
     def test_send_alert_exception(self, mock_sns):
         """
@@ -128,8 +505,28 @@ class TestAnomalyDetectorLambda(unittest.TestCase):
         gracefully without raising an unhandled exception.
         """
         mock_sns.publish.side_effect = Exception('SNS error')
-        send_alert('Test message', 'us-east-1', '123456789012')
-        # The test passes if no exception is raised.
+        self.assertFalse(send_alert('Test message', 'us-east-1', '123456789012'))
+
+    @patch('src.functions.anomaly_detector.lambda_function.sns')
+    @patch('src.functions.anomaly_detector.lambda_function.state_table')
+    def test_publish_anomalies_releases_claims_of_failed_digests(self, mock_state_table, mock_sns):
+        """
+        Test that a failed publish releases the alert claims of its digest.
+
+        Otherwise the undelivered anomaly would stay suppressed for the rule's cool-down.
+        """
+        mock_sns.publish.side_effect = ClientError({'Error': {'Code': 'Throttling', 'Message': 'slow down'}}, 'Publish')
+        rules = [{'ruleId': '1'}, {'ruleId': '2'}]
+        publish_anomalies([(rule, f"anomaly {rule['ruleId']}") for rule in rules], datetime(2023, 1, 1, 1, 0), 'us-east-1', '123456789012')
+        self.assertEqual(mock_state_table.put_item.call_count, 2)
+        deletes = mock_state_table.delete_item.call_args_list
+        self.assertEqual([call.kwargs['Key']['stateKey'] for call in deletes], ['alert#1', 'alert#2'])
+        self.assertEqual(deletes[0].kwargs['ExpressionAttributeValues'][':claimed_at'], '2023-01-01T01:00:00Z')
+
+        mock_state_table.reset_mock()
+        mock_sns.publish.side_effect = None
+        publish_anomalies([(rules[0], 'anomaly 1')], datetime(2023, 1, 1, 1, 0), 'us-east-1', '123456789012')
+        mock_state_table.delete_item.assert_not_called()
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
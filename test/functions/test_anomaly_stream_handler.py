@@ -0,0 +1,173 @@
+import sys
+import os
+import unittest
+from datetime import datetime
+from unittest.mock import patch, MagicMock
+
+# Set dummy environment variables for the test environment
+os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
+os.environ.setdefault('DYNAMODB_RULES_TABLE', 'dummy')
+os.environ.setdefault('SNS_TOPIC_NAME', 'dummy')
+
+from boto3.dynamodb.types import TypeSerializer
+
+# Import the functions to be tested
+from src.functions.anomaly_detector import stream_handler
+from src.functions.anomaly_detector.stream_handler import lambda_handler, parse_stream_records
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+serializer = TypeSerializer()
+
+
+def stream_record(item, event_name='INSERT'):
+    """
+    Builds a local stand-in for a DynamoDB stream record carrying the given item.
+    """
+    return {
+        'eventName': event_name,
+        'dynamodb': {'NewImage': {k: serializer.serialize(v) for k, v in item.items()}}
+    }
+
+
+def counters_query(counts):
+    """
+    Returns a stand-in for the counters table query serving the current minute's
+    count of each counter key in `counts`.
+    """
+    def query(**kwargs):
+        key = kwargs['ExpressionAttributeValues'][':key']
+        bucket = kwargs['ExpressionAttributeValues'][':end_bucket']
+        if key not in counts:
+            return {'Items': []}
+        return {'Items': [{'counterKey': key, 'timeBucket': bucket, 'eventCount': counts[key]}]}
+    return query
+
+
+def event_item(event_name='RunInstances', user='user123'):
+    """
+    Builds an events table item stamped with the current time.
+    """
+    return {
+        'userIdentity': user,
+        'eventTime': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'eventName': event_name,
+        'resourceType': 'ec2',
+        'region': 'us-east-1'
+    }
+
+
+class TestAnomalyStreamHandler(unittest.TestCase):
+    """
+    Test suite for the streaming Anomaly Detector handler.
+
+    This suite feeds local stand-ins for DynamoDB stream records to the stream
+    handler and verifies that the touched rules are evaluated against the shared
+    per-minute counters and alert on the threshold crossing, using mocked AWS services.
+    """
+    def setUp(self):
+        """
+        Set up the test environment before each test.
+
+        Resets the warm-container breach state, points the detector at a mocked
+        counters table and initializes a mock context object that mimics the AWS
+        Lambda context.
+        """
+        stream_handler.breached_rules.clear()
+        self.counts = {}
+        self.counters_table = MagicMock()
+        self.counters_table.query.side_effect = counters_query(self.counts)
+        patchers = [
+            patch('src.functions.anomaly_detector.lambda_function.counters_table', self.counters_table),
+            patch('src.functions.anomaly_detector.lambda_function.event_count_source', 'counters')
+        ]
+        for patcher in patchers:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.mock_context = MagicMock()
+        self.mock_context.invoked_function_arn = "arn:aws:lambda:us-east-1:123456789012:function:anomaly-stream-detector"
+        self.rule = {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'threshold': 2, 'timeWindow': 5, 'target': 'user123'}
+
+    def test_parse_stream_records(self):
+        """
+        Test that only inserted items are extracted from the stream records.
+        """
+        records = [
+            stream_record(event_item()),
+            stream_record(event_item('CreateBucket'), event_name='REMOVE')
+        ]
+        items = parse_stream_records(records)
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['eventName'], 'RunInstances')
+
+    @patch('src.functions.anomaly_detector.lambda_function.send_alert')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_alert_on_threshold_crossing(self, mock_rules_table, mock_send_alert):
+        """
+        Test that a rule alerts once when the shared counters cross its threshold.
+
+        The counts are read from the counters table, which other containers and shards
+        also add to; the alert is sent on the batch that crosses the threshold and is
+        not repeated while the rule stays in breach.
+        """
+        mock_rules_table.scan.return_value = {'Items': [self.rule]}
+
+        self.counts['user123#RunInstances'] = 2
+        lambda_handler({'Records': [stream_record(event_item())]}, self.mock_context)
+        mock_send_alert.assert_not_called()
+
+        self.counts['user123#RunInstances'] = 3
+        lambda_handler({'Records': [stream_record(event_item())]}, self.mock_context)
+        mock_send_alert.assert_called_once()
+        self.assertIn('Count: 3, Threshold: 2', mock_send_alert.call_args.args[0])
+
+        self.counts['user123#RunInstances'] = 4
+        lambda_handler({'Records': [stream_record(event_item())]}, self.mock_context)
+        mock_send_alert.assert_called_once()
+
+    @patch('src.functions.anomaly_detector.lambda_function.send_alert')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_only_touched_metrics_are_evaluated(self, mock_rules_table, mock_send_alert):
+        """
+        Test that rules on metrics absent from the batch are not evaluated.
+        """
+        mock_rules_table.scan.return_value = {'Items': [self.rule]}
+        self.counts['user123#RunInstances'] = 5
+        records = [stream_record(event_item('CreateBucket')) for _ in range(5)]
+        response = lambda_handler({'Records': records}, self.mock_context)
+        self.assertEqual(response['statusCode'], 200)
+        mock_send_alert.assert_not_called()
+        self.counters_table.query.assert_not_called()
+
+    @patch('src.functions.anomaly_detector.lambda_function.send_alert')
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_target_scoped_rule(self, mock_rules_table, mock_send_alert):
+        """
+        Test that a target-scoped rule is only evaluated for events of its identity,
+        against the counter of that identity.
+        """
+        mock_rules_table.scan.return_value = {'Items': [self.rule]}
+        self.counts['RunInstances'] = 5
+        self.counts['user123#RunInstances'] = 3
+        records = [stream_record(event_item(user='someone-else')) for _ in range(5)]
+        lambda_handler({'Records': records}, self.mock_context)
+        mock_send_alert.assert_not_called()
+
+        records = [stream_record(event_item()) for _ in range(3)]
+        lambda_handler({'Records': records}, self.mock_context)
+        mock_send_alert.assert_called_once()
+        self.assertEqual(
+            self.counters_table.query.call_args.kwargs['ExpressionAttributeValues'][':key'], 'user123#RunInstances'
+        )
+
+    @patch('src.functions.anomaly_detector.lambda_function.rules_table')
+    def test_no_new_events(self, mock_rules_table):
+        """
+        Test that a batch without inserts does not read the rules table.
+        """
+        response = lambda_handler({'Records': []}, self.mock_context)
+        self.assertEqual(response['statusCode'], 200)
+        mock_rules_table.scan.assert_not_called()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,116 @@
+import io
+import os
+import sys
+import gzip
+import json
+import tempfile
+import unittest
+from datetime import datetime
+from unittest.mock import patch
+
+# Set a dummy environment variable for testing purposes
+os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
+
+# Import the functions to be tested
+from src.functions.data_injestion.backfill import iter_cloudtrail_records, iter_local_log_files, backfill
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+
+def cloudtrail_record(i, principal_id='user123'):
+    """
+    Returns a CloudTrail log file record.
+    """
+    record = {
+        'eventTime': datetime.utcnow().strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'eventName': 'RunInstances' if i % 2 else 'CreateBucket',
+        'eventSource': 'ec2.amazonaws.com',
+        'awsRegion': 'us-east-1',
+        'userIdentity': {'principalId': principal_id} if principal_id else {'type': 'AWSService'},
+        'requestParameters': {'note': 'x' * 50}
+    }
+    return record
+
+
+def gzipped_log_file(records):
+    """
+    Returns the bytes of a gzipped CloudTrail log file.
+    """
+    return gzip.compress(json.dumps({'Records': records}, indent=1).encode('utf-8'))
+
+
+class TestDataInjestionBackfill(unittest.TestCase):
+    """
+    Test suite for the CloudTrail log file backfill loader.
+    """
+    def test_iter_cloudtrail_records_incremental(self):
+        """
+        Test that records are parsed across read boundaries of the decompressed text.
+        """
+        records = [cloudtrail_record(i) for i in range(20)]
+        stream = io.BytesIO(gzipped_log_file(records))
+        self.assertEqual(list(iter_cloudtrail_records(stream, read_chunk_chars=7)), records)
+        self.assertEqual(list(iter_cloudtrail_records(io.BytesIO(gzipped_log_file([])))), [])
+
+    def test_iter_cloudtrail_records_truncated(self):
+        """
+        Test that a truncated log file raises instead of silently losing records.
+        """
+        data = gzip.compress(json.dumps({'Records': [cloudtrail_record(0)]}).encode('utf-8')[:-20])
+        with self.assertRaises(json.JSONDecodeError):
+            list(iter_cloudtrail_records(io.BytesIO(data)))
+
+    @patch('src.functions.data_injestion.backfill.counters_table')
+    @patch('src.functions.data_injestion.backfill.write_batch_to_dynamodb')
+    def test_backfill_local_directory(self, mock_write_batch, mock_counters_table):
+        """
+        Test backfilling a directory of log files with batched, parallel writes.
+
+        Verifies that every parseable record is written once through
+        `parse_cloudtrail_event`, in chunks, and that records without a
+        principal ID, with a malformed event time or with an unwanted event name
+        are skipped. The counters,
+        which live ingestion may already have incremented, are not touched.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            os.makedirs(os.path.join(directory, 'us-east-1'))
+            with open(os.path.join(directory, 'us-east-1', 'a.json.gz'), 'wb') as f:
+                f.write(gzipped_log_file([cloudtrail_record(i) for i in range(250)]))
+            with open(os.path.join(directory, 'b.json.gz'), 'wb') as f:
+                f.write(gzipped_log_file([
+                    cloudtrail_record(1, principal_id=None), dict(cloudtrail_record(1), eventTime='2023-01-01 12:00'), cloudtrail_record(1)
+                ]))
+            stats = backfill(iter_local_log_files(directory), event_names={'RunInstances'}, max_workers=2)
+
+        self.assertEqual(stats, {'files': 2, 'loaded': 126, 'skipped': 2})
+        written = [item for call in mock_write_batch.call_args_list for item in call.args[0]]
+        self.assertEqual(len(written), 126)
+        self.assertTrue(all(item['eventName'] == 'RunInstances' for item in written))
+        self.assertTrue(all(len(call.args[0]) <= 100 for call in mock_write_batch.call_args_list))
+        mock_counters_table.update_item.assert_not_called()
+
+    @patch('src.functions.data_injestion.backfill.counters_table')
+    @patch('src.functions.data_injestion.backfill.write_batch_to_dynamodb')
+    def test_backfill_rebuilds_counters(self, mock_write_batch, mock_counters_table):
+        """
+        Test that rebuilt counters are set to the loaded counts, so a rerun does not double them.
+        """
+        records = [cloudtrail_record(i) for i in range(4)]
+        for _ in range(2):
+            mock_counters_table.reset_mock()
+            with tempfile.TemporaryDirectory() as directory:
+                with open(os.path.join(directory, 'a.json.gz'), 'wb') as f:
+                    f.write(gzipped_log_file(records))
+                backfill(iter_local_log_files(directory), max_workers=1, rebuild=True)
+            updates = {
+                call.kwargs['Key']['counterKey']: call.kwargs for call in mock_counters_table.update_item.call_args_list
+            }
+            self.assertEqual(updates['RunInstances']['ExpressionAttributeValues'][':count'], 2)
+            self.assertEqual(updates['user123#CreateBucket']['ExpressionAttributeValues'][':count'], 2)
+            self.assertTrue(updates['RunInstances']['UpdateExpression'].startswith('SET eventCount = :count'))
+        with self.assertRaises(ValueError):
+            backfill([], event_names={'RunInstances'}, rebuild=True)
+
+
+if __name__ == '__main__':
+    unittest.main()
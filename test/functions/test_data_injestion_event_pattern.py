@@ -0,0 +1,49 @@
+import os
+import sys
+import unittest
+
+# Set a dummy environment variable for testing purposes
+os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
+
+# Import the functions to be tested
+from cirrus_common.rule_index import RuleIndex
+from src.functions.data_injestion.event_pattern import build_event_pattern
+
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
+
+
+class TestDataInjestionEventPattern(unittest.TestCase):
+    """
+    Test suite for the EventBridge pattern generated from the rules.
+    """
+    def test_pattern_lists_rule_metrics(self):
+        """
+        Test that the pattern only delivers the event names the rules reference.
+        """
+        index = RuleIndex([
+            {'ruleId': '1', 'metric': 'RunInstances'},
+            {'ruleId': '2', 'metric': 'CreateBucket', 'target': 'user123'}
+        ])
+        pattern = build_event_pattern(index)
+        self.assertEqual(pattern['detail-type'], ['AWS API Call via CloudTrail'])
+        self.assertEqual(pattern['detail']['eventName'], ['CreateBucket', 'RunInstances'])
+        self.assertNotIn('userIdentity', pattern['detail'])
+
+    def test_pattern_with_wildcard_metric(self):
+        """
+        Test that wildcard metrics narrow the pattern to targets, or not at all.
+        """
+        targeted = RuleIndex([
+            {'ruleId': '1', 'metric': '*', 'target': 'admin'},
+            {'ruleId': '2', 'metric': 'RunInstances', 'target': 'user123'}
+        ])
+        pattern = build_event_pattern(targeted)
+        self.assertNotIn('eventName', pattern['detail'])
+        self.assertEqual(pattern['detail']['userIdentity'], {'principalId': ['admin', 'user123']})
+
+        untargeted = RuleIndex([{'ruleId': '1', 'metric': '*', 'target': 'admin'}, {'ruleId': '2', 'metric': 'RunInstances'}])
+        self.assertEqual(build_event_pattern(untargeted)['detail'], {'eventCategory': ['Management']})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,14 +1,20 @@
 import sys
 import os
 import json
+import zlib
+import base64
 import unittest
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch
+from botocore.exceptions import ClientError
 
 # Set a dummy environment variable for testing purposes
 os.environ.setdefault('DYNAMODB_EVENTS_TABLE', 'dummy')
 
 # Import the functions to be tested and mock the boto3 library to prevent actual AWS calls
-from src.functions.data_injestion.lambda_function import parse_cloudtrail_event, write_to_dynamodb, lambda_handler
+from src.functions.data_injestion.lambda_function import (
+    parse_cloudtrail_event, write_to_dynamodb, write_batch_to_dynamodb, extract_cloudtrail_events, update_counters,
+    filter_events, recent_event_keys, lambda_handler
+)
 
 # Add the project root to the system path for correct imports
 sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '../../..')))
@@ -43,9 +49,35 @@ class TestDataInjestionLambda(unittest.TestCase):
         self.assertEqual(item['userIdentity'], 'user123')
         self.assertEqual(item['eventTime'], '2023-01-01T00:00:00Z')
         self.assertEqual(item['eventName'], 'RunInstances')
-        self.assertEqual(item['resourceType'], 'ec2')
-        self.assertEqual(item['region'], 'us-east-1')
-        self.assertIn('instanceType', json.loads(item['requestParameters']))
+        self.assertEqual(item['rt'], 'ec2')
+        self.assertEqual(item['rg'], 'us-east-1')
+        self.assertIn('instanceType', json.loads(item['rp']))
+        self.assertEqual(item['expiresAt'], 1672531200 + 30 * 86400)
+
+        event['detail']['eventID'] = 'abc-123'
+        self.assertEqual(parse_cloudtrail_event(event)['eventTime'], '2023-01-01T00:00:00Z#abc-123')
+
+    @patch('src.functions.data_injestion.lambda_function.request_parameters_max_bytes', 16)
+    def test_parse_cloudtrail_event_encodes_request_parameters(self):
+        """
+        Test that request parameters are truncated, compressed or dropped per mode.
+        """
+        event = {
+            'detail': {
+                'userIdentity': {'principalId': 'user123'},
+                'eventTime': '2023-01-01T00:00:00Z',
+                'eventName': 'RunInstances',
+                'eventSource': 'ec2.amazonaws.com',
+                'awsRegion': 'us-east-1',
+                'requestParameters': {'instanceType': 't2.micro', 'imageId': 'ami-12345678'}
+            }
+        }
+        self.assertEqual(parse_cloudtrail_event(event)['rp'], '{"instanceType":')
+        with patch('src.functions.data_injestion.lambda_function.request_parameters_mode', 'compressed'):
+            compressed = parse_cloudtrail_event(event)['rp']
+        self.assertEqual(json.loads(zlib.decompress(compressed)), event['detail']['requestParameters'])
+        with patch('src.functions.data_injestion.lambda_function.request_parameters_mode', 'none'):
+            self.assertNotIn('rp', parse_cloudtrail_event(event))
 
     @patch('src.functions.data_injestion.lambda_function.table')
     def test_write_to_dynamodb_success(self, mock_table):
@@ -76,6 +108,85 @@ class TestDataInjestionLambda(unittest.TestCase):
         with self.assertRaises(Exception):
             write_to_dynamodb(item)
 
+    @patch('src.functions.data_injestion.lambda_function.table')
+    def test_write_to_dynamodb_existing_item(self, mock_table):
+        """
+        Test that the write is conditioned on the item not existing yet.
+
+        A conditional check failure means the event was already written, which
+        is reported instead of raised.
+        """
+        item = {'userIdentity': 'user123', 'eventTime': '2023-01-01T00:00:00Z#abc-123'}
+        mock_table.put_item.side_effect = ClientError({'Error': {'Code': 'ConditionalCheckFailedException'}}, 'PutItem')
+        self.assertFalse(write_to_dynamodb(item))
+        self.assertEqual(mock_table.put_item.call_args.kwargs['ConditionExpression'], 'attribute_not_exists(eventTime)')
+
+    @patch('src.functions.data_injestion.lambda_function.counters_table')
+    def test_update_counters(self, mock_counters_table):
+        """
+        Test the per-minute counter updates for a batch of events.
+
+        This test verifies that `update_counters` atomically increments both the
+        event name counter and the identity and event name counter for the minute
+        bucket of the events, with one update per counter for the whole batch.
+        """
+        items = [
+            {'userIdentity': 'user123', 'eventTime': '2023-01-01T00:00:42Z', 'eventName': 'RunInstances'},
+            {'userIdentity': 'user123', 'eventTime': '2023-01-01T00:00:50Z', 'eventName': 'RunInstances'}
+        ]
+        update_counters(items)
+        self.assertEqual(mock_counters_table.update_item.call_count, 2)
+        keys = [call.kwargs['Key'] for call in mock_counters_table.update_item.call_args_list]
+        self.assertEqual(keys, [
+            {'counterKey': 'RunInstances', 'timeBucket': '2023-01-01T00:00'},
+            {'counterKey': 'user123#RunInstances', 'timeBucket': '2023-01-01T00:00'}
+        ])
+        self.assertIn('ADD eventCount :count', mock_counters_table.update_item.call_args.kwargs['UpdateExpression'])
+        self.assertEqual(mock_counters_table.update_item.call_args.kwargs['ExpressionAttributeValues'][':count'], 2)
+
+    def test_extract_cloudtrail_events(self):
+        """
+        Test that events are extracted from direct, SQS, Kinesis and list deliveries.
+        """
+        entry = {'detail': {'eventName': 'RunInstances'}}
+        kinesis_data = base64.b64encode(json.dumps(entry['detail']).encode('utf-8')).decode('ascii')
+        self.assertEqual(extract_cloudtrail_events(entry), [entry])
+        self.assertEqual(extract_cloudtrail_events([entry, entry]), [entry, entry])
+        self.assertEqual(extract_cloudtrail_events({'Records': [{'body': json.dumps(entry)}]}), [entry])
+        self.assertEqual(extract_cloudtrail_events({'Records': [{'kinesis': {'data': kinesis_data}}]}), [entry])
+
+    @patch('src.functions.data_injestion.lambda_function.time.sleep')
+    @patch('src.functions.data_injestion.lambda_function.dynamodb')
+    def test_write_batch_to_dynamodb(self, mock_dynamodb, mock_sleep):
+        """
+        Test batched writes in chunks of 25 with retries of unprocessed items.
+
+        This test verifies that 30 distinct items are written in two chunks, that
+        items returned as 'UnprocessedItems' are retried after a backoff and that
+        duplicate keys are only written once.
+        """
+        items = [{'userIdentity': 'user123', 'eventTime': f"2023-01-01T00:00:{i:02d}Z"} for i in range(30)]
+        unprocessed = {'dummy': [{'PutRequest': {'Item': items[0]}}]}
+        mock_dynamodb.batch_write_item.side_effect = [{'UnprocessedItems': unprocessed}, {}, {}]
+        write_batch_to_dynamodb(items + [items[1]])
+        calls = mock_dynamodb.batch_write_item.call_args_list
+        self.assertEqual(len(calls), 3)
+        self.assertEqual(len(calls[0].kwargs['RequestItems']['dummy']), 25)
+        self.assertEqual(calls[1].kwargs['RequestItems'], unprocessed)
+        self.assertEqual(len(calls[2].kwargs['RequestItems']['dummy']), 5)
+        mock_sleep.assert_called_once()
+
+    @patch('src.functions.data_injestion.lambda_function.time.sleep')
+    @patch('src.functions.data_injestion.lambda_function.dynamodb')
+    def test_write_batch_to_dynamodb_gives_up(self, mock_dynamodb, mock_sleep):
+        """
+        Test that items still unprocessed after every retry raise an exception.
+        """
+        item = {'userIdentity': 'user123', 'eventTime': '2023-01-01T00:00:00Z'}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {'dummy': [{'PutRequest': {'Item': item}}]}}
+        with self.assertRaises(Exception):
+            write_batch_to_dynamodb([item])
+
     @patch('src.functions.data_injestion.lambda_function.write_to_dynamodb')
     @patch('src.functions.data_injestion.lambda_function.parse_cloudtrail_event')
     def test_lambda_handler(self, mock_parse, mock_write):
@@ -102,5 +213,216 @@ class TestDataInjestionLambda(unittest.TestCase):
         self.assertEqual(response['statusCode'], 200)
         self.assertIn('Event processed successfully', response['body'])
 
+    @patch('src.functions.data_injestion.lambda_function.write_to_dynamodb', return_value=True)
+    def test_lambda_handler_sqs_batch(self, mock_write):
+        """
+        Test that every event of an SQS batch is written with a conditional put.
+        """
+        records = [
+            {'body': json.dumps({'detail': {
+                'userIdentity': {'principalId': f"user{i}"},
+                'eventTime': '2023-01-01T00:00:00Z',
+                'eventName': 'RunInstances',
+                'eventSource': 'ec2.amazonaws.com',
+                'awsRegion': 'us-east-1'
+            }})}
+            for i in range(3)
+        ]
+        response = lambda_handler({'Records': records}, None)
+        self.assertEqual(response['statusCode'], 200)
+        self.assertIn('3 events processed', response['body'])
+        items = [call.args[0] for call in mock_write.call_args_list]
+        self.assertEqual(sorted(item['userIdentity'] for item in items), ['user0', 'user1', 'user2'])
+        recent_event_keys.clear()
+
+    @patch('src.functions.data_injestion.lambda_function.write_to_dynamodb', return_value=True)
+    def test_lambda_handler_reports_malformed_records(self, mock_write):
+        """
+        Test that a malformed record only fails itself, not the whole SQS batch.
+        """
+        detail = {
+            'userIdentity': {'principalId': 'user123'},
+            'eventTime': '2023-01-01T00:00:00Z',
+            'eventName': 'RunInstances',
+            'eventSource': 'ec2.amazonaws.com',
+            'awsRegion': 'us-east-1'
+        }
+        records = [
+            {'messageId': 'm1', 'body': json.dumps({'detail': dict(detail, eventID='id-1')})},
+            {'messageId': 'm2', 'body': json.dumps({'detail': dict(detail, userIdentity={})})},
+            {'messageId': 'm3', 'body': 'not json'},
+            {'messageId': 'm4', 'body': json.dumps({'detail': dict(detail, eventID='id-4')})}
+        ]
+        response = lambda_handler({'Records': records}, None)
+        self.assertEqual(response['batchItemFailures'], [{'itemIdentifier': 'm2'}, {'itemIdentifier': 'm3'}])
+        items = [call.args[0] for call in mock_write.call_args_list]
+        self.assertEqual(sorted(item['eventTime'] for item in items), ['2023-01-01T00:00:00Z#id-1', '2023-01-01T00:00:00Z#id-4'])
+        recent_event_keys.clear()
+
+    @patch('src.functions.data_injestion.lambda_function.event_dedup_cache_size', 3)
+    @patch('src.functions.data_injestion.lambda_function.update_counters')
+    @patch('src.functions.data_injestion.lambda_function.write_to_dynamodb', return_value=True)
+    def test_lambda_handler_drops_redelivered_events(self, mock_write, mock_update_counters):
+        """
+        Test that redelivered events are dropped before any DynamoDB call.
+
+        Verifies that a batch redelivered to the same container is neither written
+        nor counted again, and that the cache of recent event keys stays bounded.
+        """
+        recent_event_keys.clear()
+        records = [
+            {'body': json.dumps({'detail': {
+                'eventID': f"id-{i}",
+                'userIdentity': {'principalId': 'user123'},
+                'eventTime': '2023-01-01T00:00:00Z',
+                'eventName': 'RunInstances',
+                'eventSource': 'ec2.amazonaws.com',
+                'awsRegion': 'us-east-1'
+            }})}
+            for i in range(3)
+        ]
+        lambda_handler({'Records': records}, None)
+        self.assertEqual(mock_write.call_count, 3)
+        self.assertEqual(len(mock_update_counters.call_args.args[0]), 3)
+
+        mock_write.reset_mock()
+        response = lambda_handler({'Records': records[1:] + records[1:]}, None)
+        self.assertEqual(response['statusCode'], 200)
+        mock_write.assert_not_called()
+        self.assertEqual(mock_update_counters.call_args.args[0], [])
+
+        new_records = [{'body': records[0]['body'].replace('id-0', f"id-{i}")} for i in (3, 4)]
+        lambda_handler({'Records': new_records}, None)
+        self.assertEqual(len(recent_event_keys), 3)
+        self.assertNotIn(('user123', '2023-01-01T00:00:00Z#id-0'), recent_event_keys)
+        recent_event_keys.clear()
+
+    @patch('src.functions.data_injestion.lambda_function.state_table')
+    @patch('src.functions.data_injestion.lambda_function.update_counters')
+    @patch('src.functions.data_injestion.lambda_function.filter_events')
+    @patch('src.functions.data_injestion.lambda_function.table')
+    def test_lambda_handler_counts_only_new_events(self, mock_table, mock_filter, mock_update_counters, mock_state_table):
+        """
+        Test that a batch redelivered to a fresh container is not counted again.
+
+        The conditional puts of the stored events and the 'seen' markers of the
+        events that are only counted fail for the redelivered batch, so the
+        counters are incremented only by the first delivery.
+        """
+        recent_event_keys.clear()
+        mock_filter.side_effect = lambda items: (items[:1], items[1:])
+        records = [
+            {'body': json.dumps({'detail': {
+                'eventID': f"id-{i}",
+                'userIdentity': {'principalId': 'user123'},
+                'eventTime': '2023-01-01T00:00:00Z',
+                'eventName': 'RunInstances',
+                'eventSource': 'ec2.amazonaws.com',
+                'awsRegion': 'us-east-1'
+            }})}
+            for i in range(2)
+        ]
+        lambda_handler({'Records': records}, None)
+        self.assertEqual(len(mock_update_counters.call_args.args[0]), 2)
+        marker = mock_state_table.put_item.call_args.kwargs
+        self.assertEqual(marker['Item']['stateKey'], 'seen#user123#2023-01-01T00:00:00Z#id-1')
+        self.assertEqual(marker['ConditionExpression'], 'attribute_not_exists(stateKey)')
+
+        recent_event_keys.clear()
+        condition_failed = ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'exists'}}, 'PutItem')
+        mock_table.put_item.side_effect = condition_failed
+        mock_state_table.put_item.side_effect = condition_failed
+        lambda_handler({'Records': records}, None)
+        self.assertEqual(mock_update_counters.call_args.args[0], [])
+        recent_event_keys.clear()
+
+    @patch('src.functions.data_injestion.lambda_function.update_counters')
+    @patch('src.functions.data_injestion.lambda_function.table')
+    def test_lambda_handler_put_fails_partway(self, mock_table, mock_update_counters):
+        """
+        Test that a put failing partway through a batch only fails its own record.
+
+        The events whose puts succeeded are counted, only the record of the
+        throttled event is returned in 'batchItemFailures', and its redelivery
+        counts that event while the others are not counted again.
+        """
+        recent_event_keys.clear()
+        records = [
+            {'messageId': f"m{i}", 'body': json.dumps({'detail': {
+                'eventID': f"id-{i}",
+                'userIdentity': {'principalId': 'user123'},
+                'eventTime': '2023-01-01T00:00:00Z',
+                'eventName': 'RunInstances',
+                'eventSource': 'ec2.amazonaws.com',
+                'awsRegion': 'us-east-1'
+            }})}
+            for i in range(3)
+        ]
+        stored = set()
+        throttled = {'2023-01-01T00:00:00Z#id-1'}
+
+        def put_item(Item, ConditionExpression):
+            if Item['eventTime'] in throttled:
+                throttled.discard(Item['eventTime'])
+                raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException', 'Message': 'slow down'}}, 'PutItem')
+            if Item['eventTime'] in stored:
+                raise ClientError({'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'exists'}}, 'PutItem')
+            stored.add(Item['eventTime'])
+
+        mock_table.put_item.side_effect = put_item
+        response = lambda_handler({'Records': records}, None)
+        self.assertEqual(response['batchItemFailures'], [{'itemIdentifier': 'm1'}])
+        counted = [item['eventTime'] for item in mock_update_counters.call_args.args[0]]
+        self.assertEqual(counted, ['2023-01-01T00:00:00Z#id-0', '2023-01-01T00:00:00Z#id-2'])
+
+        response = lambda_handler({'Records': records[1:2]}, None)
+        self.assertEqual(response['batchItemFailures'], [])
+        counted = [item['eventTime'] for item in mock_update_counters.call_args.args[0]]
+        self.assertEqual(counted, ['2023-01-01T00:00:00Z#id-1'])
+
+        recent_event_keys.clear()
+        lambda_handler({'Records': records}, None)
+        self.assertEqual(mock_update_counters.call_args.args[0], [])
+        recent_event_keys.clear()
+
+    @patch('src.functions.data_injestion.lambda_function._rule_index', (None, None))
+    @patch('src.functions.data_injestion.lambda_function.ingest_filter_mode', 'aggregate')
+    @patch('src.functions.data_injestion.lambda_function.rules_table')
+    def test_filter_events(self, mock_rules_table):
+        """
+        Test that events no rule can match are only counted, with the rules cached.
+
+        Verifies that the rules are scanned across pages once for several
+        invocations, that events on a rule's metric or target are stored and that
+        the others are returned for counting only ('aggregate') or dropped ('skip').
+        """
+        mock_rules_table.scan.side_effect = [
+            {'Items': [{'ruleId': '1', 'metric': 'RunInstances'}], 'LastEvaluatedKey': {'ruleId': '1'}},
+            {'Items': [{'ruleId': '2', 'metric': '*', 'target': 'admin'}]}
+        ]
+        items = [
+            {'userIdentity': 'user123', 'eventName': 'RunInstances'},
+            {'userIdentity': 'user123', 'eventName': 'CreateBucket'},
+            {'userIdentity': 'admin', 'eventName': 'CreateBucket'}
+        ]
+        stored, counted = filter_events(items)
+        self.assertEqual(stored, [items[0], items[2]])
+        self.assertEqual(counted, [items[1]])
+        with patch('src.functions.data_injestion.lambda_function.ingest_filter_mode', 'skip'):
+            self.assertEqual(filter_events(items), ([items[0], items[2]], []))
+        self.assertEqual(mock_rules_table.scan.call_count, 2)
+        self.assertEqual(mock_rules_table.scan.call_args.kwargs['ExclusiveStartKey'], {'ruleId': '1'})
+
+    @patch('src.functions.data_injestion.lambda_function._rule_index', (None, None))
+    @patch('src.functions.data_injestion.lambda_function.ingest_filter_mode', 'aggregate')
+    @patch('src.functions.data_injestion.lambda_function.rules_table')
+    def test_filter_events_keeps_everything_without_rules(self, mock_rules_table):
+        """
+        Test that every event is stored when the rules cannot be loaded.
+        """
+        mock_rules_table.scan.side_effect = Exception('DB error')
+        items = [{'userIdentity': 'user123', 'eventName': 'CreateBucket'}]
+        self.assertEqual(filter_events(items), (items, []))
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
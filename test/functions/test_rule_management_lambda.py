@@ -3,7 +3,10 @@ import os
 import unittest
 from unittest.mock import patch, MagicMock
 import json
-from src.functions.rule_management.lambda_function import create_rule, get_all_rules, get_rule_by_id, delete_rule
+from decimal import Decimal
+from src.functions.rule_management.lambda_function import (
+    create_rule, get_all_rules, get_rule_by_id, delete_rule, import_rules, export_rules
+)
 
 # Set a dummy environment variable for the test environment.
 os.environ.setdefault('DYNAMODB_RULES_TABLE', 'dummy')
@@ -24,8 +27,9 @@ class TestRuleManagementLambda(unittest.TestCase):
     to ensure tests are isolated and do not make real API calls.
     """
 
+    @patch('src.functions.rule_management.lambda_function.state_table')
     @patch('src.functions.rule_management.lambda_function.table')
-    def test_create_rule_success(self, mock_table):
+    def test_create_rule_success(self, mock_table, mock_state_table):
         """
         Test successful rule creation.
 
@@ -46,6 +50,30 @@ class TestRuleManagementLambda(unittest.TestCase):
         response = create_rule(event)
         self.assertEqual(response['statusCode'], 201)
         self.assertIn('Rule created successfully', response['body'])
+        self.assertEqual(mock_state_table.update_item.call_args.kwargs['Key'], {'stateKey': 'rules#version'})
+
+    @patch('src.functions.rule_management.lambda_function.time.sleep')
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_create_rule_version_bump_fails(self, mock_table, mock_state_table, mock_sleep):
+        """
+        Test rule creation when the rules version marker cannot be changed.
+
+        The marker update is retried; when it keeps failing, the successful
+        write is still reported as created instead of as a server error.
+        """
+        mock_state_table.update_item.side_effect = [Exception('Throttled'), None]
+        body = {'ruleType': 'count-based', 'metric': 'cpu', 'threshold': 80, 'timeWindow': 5, 'target': 'user-123'}
+        response = create_rule({'body': json.dumps(body)})
+        self.assertEqual(response['statusCode'], 201)
+        self.assertEqual(mock_state_table.update_item.call_count, 2)
+
+        mock_state_table.update_item.reset_mock()
+        mock_state_table.update_item.side_effect = Exception('Throttled')
+        response = create_rule({'body': json.dumps(body)})
+        self.assertEqual(response['statusCode'], 201)
+        self.assertEqual(mock_state_table.update_item.call_count, 3)
+        mock_table.put_item.assert_called()
 
     @patch('src.functions.rule_management.lambda_function.table')
     def test_create_rule_missing_fields(self, mock_table):
@@ -66,6 +94,97 @@ class TestRuleManagementLambda(unittest.TestCase):
         self.assertEqual(response['statusCode'], 400)
         self.assertIn('Missing required fields', response['body'])
 
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_create_rule_invalid_cooldown(self, mock_table):
+        """
+        Test rule creation with an invalid alert cool-down.
+
+        This test ensures that `create_rule` rejects a non-positive
+        'cooldownMinutes' with a 400 status code.
+        """
+        event = {
+            'body': json.dumps({
+                'ruleType': 'count-based',
+                'metric': 'cpu',
+                'threshold': 80,
+                'timeWindow': 5,
+                'target': 'user-123',
+                'cooldownMinutes': 0
+            })
+        }
+        response = create_rule(event)
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('cooldownMinutes', response['body'])
+        mock_table.put_item.assert_not_called()
+
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_create_rule_empty_metric_or_target(self, mock_table):
+        """
+        Test rule creation with an empty metric or target.
+
+        Both are secondary index keys, which cannot be empty strings, so the
+        rule is rejected with a 400 status code instead of failing the write.
+        """
+        body = {'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 5, 'timeWindow': 5, 'target': 'user-123'}
+        for field in ('metric', 'target'):
+            response = create_rule({'body': json.dumps(dict(body, **{field: ''}))})
+            self.assertEqual(response['statusCode'], 400)
+            self.assertIn('must not be empty', response['body'])
+        mock_table.put_item.assert_not_called()
+
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_create_baseline_rule(self, mock_table):
+        """
+        Test creation and validation of baseline rules.
+
+        This test verifies that a valid baseline rule is stored and that an
+        unsupported baseline method is rejected with a 400 status code.
+        """
+        body = {
+            'ruleType': 'baseline',
+            'metric': 'RunInstances',
+            'threshold': 3,
+            'timeWindow': 15,
+            'target': '*',
+            'historyWindows': 48,
+            'method': 'ewma'
+        }
+        response = create_rule({'body': json.dumps(body)})
+        self.assertEqual(response['statusCode'], 201)
+
+        body['method'] = 'median'
+        response = create_rule({'body': json.dumps(body)})
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('Unsupported method', response['body'])
+
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_create_distinct_count_rule(self, mock_table):
+        """
+        Test creation and validation of distinct-count rules.
+
+        This test verifies that a valid distinct-count rule is stored, and that an
+        unsupported distinct field or a wildcard metric without a concrete target
+        is rejected with a 400 status code.
+        """
+        body = {
+            'ruleType': 'distinct-count',
+            'metric': '*',
+            'threshold': 3,
+            'timeWindow': 60,
+            'target': 'user-123',
+            'distinctField': 'region'
+        }
+        response = create_rule({'body': json.dumps(body)})
+        self.assertEqual(response['statusCode'], 201)
+
+        response = create_rule({'body': json.dumps(dict(body, distinctField='eventSource'))})
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('distinctField', response['body'])
+
+        response = create_rule({'body': json.dumps(dict(body, target='*'))})
+        self.assertEqual(response['statusCode'], 400)
+        self.assertIn('wildcard metric', response['body'])
+
     @patch('src.functions.rule_management.lambda_function.table')
     def test_get_all_rules_success(self, mock_table):
         """
@@ -75,7 +194,7 @@ class TestRuleManagementLambda(unittest.TestCase):
         scan and returns a 200 status code with a list of items in the body.
         """
         mock_table.scan.return_value = {'Items': [{'ruleId': '1', 'ruleType': 'anomaly'}]}
-        response = get_all_rules()
+        response = get_all_rules({})
         self.assertEqual(response['statusCode'], 200)
         self.assertIn('ruleType', response['body'])
 
@@ -89,10 +208,56 @@ class TestRuleManagementLambda(unittest.TestCase):
         a 500 status code.
         """
         mock_table.scan.side_effect = Exception('DB error')
-        response = get_all_rules()
+        response = get_all_rules({})
         self.assertEqual(response['statusCode'], 500)
         self.assertIn('DB error', response['body'])
 
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_get_all_rules_filtered_pages(self, mock_table):
+        """
+        Test paginated, filtered listing of rules.
+
+        This test verifies that a metric filter queries the metric's secondary
+        index with the other filters as a filter expression, that the returned
+        'nextToken' resumes the listing after the last key and that integral
+        numbers are returned as integers.
+        """
+        last_key = {'ruleId': '1', 'metric': 'CreateBucket'}
+        mock_table.query.return_value = {
+            'Items': [{'ruleId': '1', 'metric': 'CreateBucket', 'threshold': Decimal('5')}],
+            'LastEvaluatedKey': last_key
+        }
+        params = {'metric': 'CreateBucket', 'ruleType': 'count-based', 'limit': '1'}
+        response = get_all_rules({'queryStringParameters': params})
+        self.assertEqual(response['statusCode'], 200)
+        page = json.loads(response['body'])
+        self.assertEqual(page['rules'], [{'ruleId': '1', 'metric': 'CreateBucket', 'threshold': 5}])
+        query_kwargs = mock_table.query.call_args.kwargs
+        self.assertEqual(query_kwargs['IndexName'], 'MetricIndex')
+        self.assertEqual(query_kwargs['Limit'], 1)
+        self.assertEqual(query_kwargs['FilterExpression'], '#f0 = :f0')
+        self.assertEqual(query_kwargs['ExpressionAttributeValues'], {':key': 'CreateBucket', ':f0': 'count-based'})
+        mock_table.scan.assert_not_called()
+
+        mock_table.query.return_value = {'Items': []}
+        response = get_all_rules({'queryStringParameters': dict(params, nextToken=page['nextToken'])})
+        self.assertEqual(mock_table.query.call_args.kwargs['ExclusiveStartKey'], last_key)
+        self.assertNotIn('nextToken', json.loads(response['body']))
+
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_get_all_rules_invalid_parameters(self, mock_table):
+        """
+        Test that an invalid limit or continuation token returns a 400 status code.
+
+        A token issued for one filter cannot be used with another.
+        """
+        mock_table.scan.return_value = {'Items': [], 'LastEvaluatedKey': {'ruleId': '1'}}
+        token = json.loads(get_all_rules({})['body'])['nextToken']
+        for params in ({'limit': '0'}, {'limit': 'ten'}, {'nextToken': 'not a token'}, {'metric': 'CreateBucket', 'nextToken': token}):
+            response = get_all_rules({'queryStringParameters': params})
+            self.assertEqual(response['statusCode'], 400)
+        mock_table.query.assert_not_called()
+
     @patch('src.functions.rule_management.lambda_function.table')
     def test_get_rule_by_id_found(self, mock_table):
         """
@@ -135,8 +300,9 @@ class TestRuleManagementLambda(unittest.TestCase):
         self.assertEqual(response['statusCode'], 500)
         self.assertIn('DB error', response['body'])
 
+    @patch('src.functions.rule_management.lambda_function.state_table')
     @patch('src.functions.rule_management.lambda_function.table')
-    def test_delete_rule_success(self, mock_table):
+    def test_delete_rule_success(self, mock_table, mock_state_table):
         """
         Test successful rule deletion.
 
@@ -148,6 +314,7 @@ class TestRuleManagementLambda(unittest.TestCase):
         response = delete_rule(event)
         self.assertEqual(response['statusCode'], 200)
         self.assertIn('Rule deleted successfully', response['body'])
+        mock_state_table.update_item.assert_called_once()
 
     @patch('src.functions.rule_management.lambda_function.table')
     def test_delete_rule_exception(self, mock_table):
@@ -163,5 +330,157 @@ class TestRuleManagementLambda(unittest.TestCase):
         self.assertEqual(response['statusCode'], 500)
         self.assertIn('Internal server error', response['body'])
 
+    @patch('src.functions.rule_management.lambda_function.time.sleep')
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.dynamodb')
+    def test_import_rules(self, mock_dynamodb, mock_state_table, mock_sleep):
+        """
+        Test bulk creation and replacement of rules with per-rule results.
+
+        This test verifies that valid rules are written with batched writes in
+        chunks of 25, that rules with a 'ruleId' replace the stored rule, that
+        invalid and duplicate rules are reported individually and that the rules
+        version marker is changed once.
+        """
+        rule = {'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 5, 'timeWindow': 10, 'target': '*'}
+        rules = [dict(rule) for _ in range(30)] + [
+            dict(rule, ruleId='existing'),
+            dict(rule, ruleId='existing'),
+            dict(rule, threshold=0)
+        ]
+        mock_dynamodb.batch_write_item.return_value = {}
+        response = import_rules({'body': json.dumps({'rules': rules})})
+        self.assertEqual(response['statusCode'], 207)
+        body = json.loads(response['body'])
+        self.assertEqual((body['written'], body['failed']), (31, 2))
+        statuses = [result['statusCode'] for result in body['results']]
+        self.assertEqual(statuses, [201] * 30 + [200, 400, 400])
+        self.assertEqual(body['results'][30]['ruleId'], 'existing')
+        calls = mock_dynamodb.batch_write_item.call_args_list
+        self.assertEqual([len(call.kwargs['RequestItems']['dummy']) for call in calls], [25, 6])
+        mock_state_table.update_item.assert_called_once()
+
+    @patch('src.functions.rule_management.lambda_function.time.sleep')
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.dynamodb')
+    def test_import_rules_unprocessed(self, mock_dynamodb, mock_state_table, mock_sleep):
+        """
+        Test that rules still unprocessed after every retry are reported as failed.
+        """
+        rule = {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 5, 'timeWindow': 10, 'target': '*'}
+        mock_dynamodb.batch_write_item.return_value = {'UnprocessedItems': {'dummy': [{'PutRequest': {'Item': rule}}]}}
+        response = import_rules({'body': json.dumps(rule)})
+        self.assertEqual(response['statusCode'], 207)
+        self.assertEqual(json.loads(response['body'])['results'][0]['statusCode'], 503)
+        mock_state_table.update_item.assert_not_called()
+
+    @patch('src.functions.rule_management.lambda_function.time.sleep')
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.dynamodb')
+    def test_import_rules_failed_chunk(self, mock_dynamodb, mock_state_table, mock_sleep):
+        """
+        Test that a failed chunk only fails its own rules.
+
+        The rules of earlier chunks are reported as written, the rules of the failed
+        chunk with 503, and the rules version is changed for the written rules.
+        """
+        rules = [
+            {'ruleId': str(i), 'ruleType': 'count-based', 'metric': 'CreateBucket', 'threshold': 5, 'timeWindow': 10, 'target': '*'}
+            for i in range(40)
+        ]
+        mock_dynamodb.batch_write_item.side_effect = [{}, Exception('Throttled')]
+        response = import_rules({'body': json.dumps({'rules': rules})})
+        self.assertEqual(response['statusCode'], 207)
+        body = json.loads(response['body'])
+        self.assertEqual((body['written'], body['failed']), (25, 15))
+        self.assertEqual({result['statusCode'] for result in body['results'][25:]}, {503})
+        mock_state_table.update_item.assert_called_once()
+
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_export_rules(self, mock_table):
+        """
+        Test that rules are exported as newline-delimited JSON, one page at a time.
+
+        The continuation token is returned in the 'X-Next-Token' header, a page is cut
+        short before it exceeds the response size cap, and the export is accepted
+        unchanged by the import endpoint.
+        """
+        mock_table.scan.return_value = {'Items': [{'ruleId': '1', 'threshold': Decimal('5')}], 'LastEvaluatedKey': {'ruleId': '1'}}
+        rule = {'ruleType': 'count-based', 'metric': 'CreateBucket', 'timeWindow': 10, 'target': '*'}
+        response = export_rules({'queryStringParameters': {'limit': '1'}})
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual(response['headers']['Content-Type'], 'application/x-ndjson')
+        self.assertEqual(response['body'], '{"ruleId":"1","threshold":5}\n')
+        self.assertEqual(mock_table.scan.call_args.kwargs['Limit'], 1)
+
+        mock_table.scan.return_value = {'Items': [{'ruleId': '2', 'threshold': Decimal('2.5')}, {'ruleId': '3', 'threshold': 1}]}
+        with patch('src.functions.rule_management.lambda_function.MAX_EXPORT_BYTES', 40):
+            response = export_rules({'queryStringParameters': {'nextToken': response['headers']['X-Next-Token']}})
+        self.assertEqual(mock_table.scan.call_args.kwargs['ExclusiveStartKey'], {'ruleId': '1'})
+        self.assertEqual(response['body'], '{"ruleId":"2","threshold":2.5}\n')
+
+        response = export_rules({'queryStringParameters': {'nextToken': response['headers']['X-Next-Token']}})
+        self.assertEqual(mock_table.scan.call_args.kwargs['ExclusiveStartKey'], {'ruleId': '2'})
+        self.assertNotIn('X-Next-Token', response['headers'])
+
+        mock_table.scan.return_value = {'Items': [dict(rule, ruleId='1', threshold=Decimal('5')), dict(rule, ruleId='2', threshold=Decimal('3'))]}
+        export = export_rules({})['body']
+        with patch('src.functions.rule_management.lambda_function.batch_put_rules') as mock_put:
+            mock_put.return_value = set()
+            response = import_rules({'body': export})
+        self.assertEqual(response['statusCode'], 200)
+        self.assertEqual([rule['ruleId'] for rule in mock_put.call_args.args[0]], ['1', '2'])
+
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_conditional_get(self, mock_table, mock_state_table):
+        """
+        Test ETag and Last-Modified headers and 304 responses for rule reads.
+
+        This test verifies that reads return caching headers derived from the
+        rules version marker, that a matching 'If-None-Match' is answered with
+        304 without reading the rules table and that a changed marker returns
+        the rules again.
+        """
+        mock_state_table.get_item.return_value = {'Item': {'version': 'a', 'updatedAt': '2025-09-16T15:30:00Z'}}
+        mock_table.scan.return_value = {'Items': [{'ruleId': '1'}]}
+        mock_table.get_item.return_value = {'Item': {'ruleId': '1'}}
+        response = get_all_rules({'queryStringParameters': {'limit': '10'}})
+        self.assertEqual(response['statusCode'], 200)
+        etag = response['headers']['ETag']
+        self.assertEqual(response['headers']['Last-Modified'], 'Tue, 16 Sep 2025 15:30:00 GMT')
+
+        event = {'queryStringParameters': {'limit': '10'}, 'headers': {'if-none-match': etag}}
+        response = get_all_rules(event)
+        self.assertEqual(response['statusCode'], 304)
+        self.assertEqual(response['body'], '')
+        self.assertEqual(mock_table.scan.call_count, 1)
+
+        rule_event = {'pathParameters': {'ruleId': '1'}, 'headers': {'If-None-Match': etag}}
+        self.assertEqual(get_rule_by_id(rule_event)['statusCode'], 200)
+        rule_event['headers']['If-None-Match'] = get_rule_by_id(rule_event)['headers']['ETag']
+        self.assertEqual(get_rule_by_id(rule_event)['statusCode'], 304)
+        self.assertEqual(mock_table.get_item.call_count, 2)
+
+        mock_state_table.get_item.return_value = {'Item': {'version': 'b', 'updatedAt': '2025-09-16T15:31:00Z'}}
+        self.assertEqual(get_all_rules(event)['statusCode'], 200)
+
+    @patch('src.functions.rule_management.lambda_function.state_table')
+    @patch('src.functions.rule_management.lambda_function.table')
+    def test_get_rule_if_none_match_any(self, mock_table, mock_state_table):
+        """
+        Test that 'If-None-Match: *' on a single rule is answered with 304 only if the rule exists.
+        """
+        mock_state_table.get_item.return_value = {'Item': {'version': 'a'}}
+        event = {'pathParameters': {'ruleId': 'missing'}, 'headers': {'If-None-Match': '*'}}
+        mock_table.get_item.return_value = {}
+        self.assertEqual(get_rule_by_id(event)['statusCode'], 404)
+
+        event['pathParameters']['ruleId'] = '1'
+        mock_table.get_item.return_value = {'Item': {'ruleId': '1'}}
+        response = get_rule_by_id(event)
+        self.assertEqual(response['statusCode'], 304)
+        self.assertIn('ETag', response['headers'])
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
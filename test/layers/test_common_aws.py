@@ -0,0 +1,128 @@
+import unittest
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from cirrus_common import aws
+
+
+class TestLazyAwsClients(unittest.TestCase):
+    """
+    Test suite for the lazily created, shared AWS clients of the common layer.
+    """
+    def setUp(self):
+        aws._clients.clear()
+        aws._consumed_capacity.clear()
+
+    def tearDown(self):
+        aws._clients.clear()
+        aws._consumed_capacity.clear()
+
+    @patch('boto3.client')
+    def test_clients_are_created_once_on_first_use(self, mock_boto3_client):
+        """
+        Test that clients are only created when first used and then shared.
+        """
+        sns = aws.LazyClient('sns', max_pool_connections=4)
+        table = aws.DynamoDB().Table('rules')
+        mock_boto3_client.assert_not_called()
+
+        sns.publish(TopicArn='arn', Message='m')
+        sns.publish(TopicArn='arn', Message='m')
+        self.assertIs(aws.client('sns', max_pool_connections=4), mock_boto3_client.return_value)
+        self.assertEqual(mock_boto3_client.call_count, 1)
+        self.assertEqual(mock_boto3_client.call_args.kwargs['config'].max_pool_connections, 4)
+        self.assertEqual(table.table_name, 'rules')
+
+    @patch('cirrus_common.aws.client')
+    def test_table_converts_attribute_values(self, mock_client):
+        """
+        Test that table requests and responses use plain Python values.
+        """
+        dynamodb_client = MagicMock()
+        mock_client.return_value = dynamodb_client
+        dynamodb_client.query.return_value = {
+            'Items': [{'ruleId': {'S': '1'}, 'threshold': {'N': '5'}}],
+            'LastEvaluatedKey': {'ruleId': {'S': '1'}},
+            'Count': 1
+        }
+        table = aws.DynamoDB().Table('rules')
+        response = table.query(
+            KeyConditionExpression='ruleId = :id',
+            ExpressionAttributeValues={':id': '1'},
+            ExclusiveStartKey={'ruleId': '0'}
+        )
+        self.assertEqual(response['Items'], [{'ruleId': '1', 'threshold': Decimal('5')}])
+        self.assertEqual(response['LastEvaluatedKey'], {'ruleId': '1'})
+        query_kwargs = dynamodb_client.query.call_args.kwargs
+        self.assertEqual(query_kwargs['TableName'], 'rules')
+        self.assertEqual(query_kwargs['ExpressionAttributeValues'], {':id': {'S': '1'}})
+        self.assertEqual(query_kwargs['ExclusiveStartKey'], {'ruleId': {'S': '0'}})
+
+    @patch('cirrus_common.aws.client')
+    def test_batch_write_item_converts_unprocessed_items(self, mock_client):
+        """
+        Test that batch writes serialize items and return unprocessed items as given.
+        """
+        dynamodb_client = MagicMock()
+        mock_client.return_value = dynamodb_client
+        dynamodb_client.batch_write_item.return_value = {
+            'UnprocessedItems': {'events': [{'PutRequest': {'Item': {'eventCount': {'N': '2'}}}}]}
+        }
+        response = aws.DynamoDB().batch_write_item(RequestItems={'events': [{'PutRequest': {'Item': {'eventCount': 2}}}]})
+        self.assertEqual(
+            dynamodb_client.batch_write_item.call_args.kwargs['RequestItems'],
+            {'events': [{'PutRequest': {'Item': {'eventCount': {'N': '2'}}}}]}
+        )
+        self.assertEqual(response['UnprocessedItems'], {'events': [{'PutRequest': {'Item': {'eventCount': Decimal('2')}}}]})
+
+    @patch('boto3.client')
+    def test_dynamodb_client_uses_adaptive_retries(self, mock_boto3_client):
+        """
+        Test that DynamoDB clients are configured with client-side rate limiting.
+        """
+        aws.DynamoDB(max_pool_connections=4).client
+        config = mock_boto3_client.call_args.kwargs['config']
+        self.assertEqual(config.retries, {'mode': 'adaptive', 'max_attempts': aws.dynamodb_max_attempts})
+        self.assertEqual(config.max_pool_connections, 4)
+
+    @patch('cirrus_common.aws.client')
+    def test_consumed_capacity_is_logged_per_caller(self, mock_client):
+        """
+        Test that the consumed capacity is accumulated per calling function, table and
+        operation and logged once per handler invocation.
+        """
+        dynamodb_client = MagicMock()
+        mock_client.return_value = dynamodb_client
+        dynamodb_client.query.return_value = {'Count': 3, 'ConsumedCapacity': {'TableName': 'events', 'CapacityUnits': 0.5}}
+        dynamodb_client.batch_write_item.return_value = {
+            'ConsumedCapacity': [{'TableName': 'events', 'CapacityUnits': 2.0}, {'TableName': 'rules', 'CapacityUnits': 1.0}]
+        }
+        logger = MagicMock()
+
+        @aws.logs_consumed_capacity(logger)
+        def handler(event, context):
+            table = aws.DynamoDB().Table('events')
+            table.query(KeyConditionExpression='eventName = :name', ExpressionAttributeValues={':name': 'RunInstances'})
+            table.query(KeyConditionExpression='eventName = :name', ExpressionAttributeValues={':name': 'RunInstances'})
+            aws.DynamoDB().batch_write_item(RequestItems={'events': []})
+            return 'done'
+
+        self.assertEqual(handler({}, None), 'done')
+        self.assertEqual(dynamodb_client.query.call_args.kwargs['ReturnConsumedCapacity'], 'TOTAL')
+        logger.info.assert_called_once()
+        fields = logger.info.call_args.kwargs
+        self.assertEqual(fields['capacityUnits'], 4.0)
+        caller = f'{__name__}.handler'
+        self.assertEqual(fields['consumedCapacity'], [
+            {'caller': caller, 'table': 'events', 'operation': 'BatchWriteItem', 'requests': 1, 'capacityUnits': 2.0},
+            {'caller': caller, 'table': 'events', 'operation': 'Query', 'requests': 2, 'capacityUnits': 1.0},
+            {'caller': caller, 'table': 'rules', 'operation': 'BatchWriteItem', 'requests': 1, 'capacityUnits': 1.0}
+        ])
+
+        handler({}, None)
+        self.assertEqual(logger.info.call_count, 2)
+        self.assertEqual(logger.info.call_args.kwargs['capacityUnits'], 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
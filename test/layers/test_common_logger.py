@@ -0,0 +1,57 @@
+import io
+import json
+import unittest
+from unittest.mock import patch
+
+from cirrus_common.logger import StructuredLogger
+
+
+class TestStructuredLogger(unittest.TestCase):
+    """
+    Test suite for the structured logger of the common layer.
+    """
+    def test_writes_single_line_json(self):
+        """
+        Test that records are compact single-line JSON with the extra fields.
+        """
+        logger = StructuredLogger('test', level='INFO')
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            logger.info("Anomaly detected", ruleId='1', count=3)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(len(lines), 1)
+        self.assertNotIn(' ', lines[0].split('"message"')[0])
+        record = json.loads(lines[0])
+        self.assertEqual(record['level'], 'INFO')
+        self.assertEqual(record['logger'], 'test')
+        self.assertEqual(record['message'], 'Anomaly detected')
+        self.assertEqual((record['ruleId'], record['count']), ('1', 3))
+
+    def test_level_filtering(self):
+        """
+        Test that records below the level are dropped.
+        """
+        logger = StructuredLogger('test', level='WARNING')
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            logger.info("dropped")
+            logger.debug("dropped")
+            logger.error("kept")
+        self.assertEqual([json.loads(line)['message'] for line in stdout.getvalue().splitlines()], ['kept'])
+
+    @patch('cirrus_common.logger.random.random')
+    def test_sampled_invocations_write_debug(self, mock_random):
+        """
+        Test that sampled invocations write their debug records and others do not.
+        """
+        logger = StructuredLogger('test', level='INFO', sample_rate=0.1)
+        with patch('sys.stdout', new_callable=io.StringIO) as stdout:
+            mock_random.return_value = 0.5
+            logger.start_invocation()
+            logger.debug("not sampled")
+            mock_random.return_value = 0.05
+            logger.start_invocation()
+            logger.debug("sampled", event={'detail': {}})
+        self.assertEqual([json.loads(line)['message'] for line in stdout.getvalue().splitlines()], ['sampled'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+
+from cirrus_common import rule_index
+from cirrus_common.rule_index import RuleIndex, compile_rules, rule_target
+
+
+class TestRuleIndex(unittest.TestCase):
+    """
+    Test suite for the compiled rule index of the common layer.
+    """
+    def setUp(self):
+        """
+        Set up a small rule set covering metric-wide, targeted and wildcard-metric rules.
+        """
+        self.rules = [
+            {'ruleId': '1', 'ruleType': 'count-based', 'metric': 'RunInstances', 'target': '*'},
+            {'ruleId': '2', 'ruleType': 'count-based', 'metric': 'RunInstances', 'target': 'alice'},
+            {'ruleId': '3', 'ruleType': 'baseline', 'metric': 'CreateBucket', 'target': 'any'},
+            {'ruleId': '4', 'ruleType': 'distinct-count', 'metric': '*', 'target': 'bob'}
+        ]
+
+    def test_rule_target(self):
+        """
+        Test that wildcard and missing targets are normalized to None.
+        """
+        self.assertIsNone(rule_target({'target': 'ALL'}))
+        self.assertIsNone(rule_target({}))
+        self.assertEqual(rule_target({'target': 'alice'}), 'alice')
+
+    def test_match(self):
+        """
+        Test that events are routed only to the rules on their metric and identity.
+        """
+        index = RuleIndex(self.rules)
+        self.assertEqual([r['ruleId'] for r in index.match('RunInstances', 'alice')], ['1', '2'])
+        self.assertEqual([r['ruleId'] for r in index.match('RunInstances', 'carol')], ['1'])
+        self.assertEqual([r['ruleId'] for r in index.match('DeleteBucket', 'bob')], ['4'])
+        self.assertEqual(index.match('RunInstances', 'alice', 'baseline'), [])
+        self.assertTrue(index.matches_any('CreateBucket', 'carol'))
+        self.assertFalse(index.matches_any('DeleteBucket', 'carol'))
+        self.assertEqual(index.metrics, {'RunInstances', 'CreateBucket', '*'})
+        self.assertEqual(index.targets, {'alice', 'bob'})
+
+    def test_series(self):
+        """
+        Test that rules are grouped by (metric, target), optionally per rule type.
+        """
+        series = RuleIndex(self.rules).series('count-based')
+        self.assertEqual(list(series), [('RunInstances', None), ('RunInstances', 'alice')])
+
+    def test_compile_rules_reuses_index(self):
+        """
+        Test that an unchanged rule set reuses the index compiled earlier in the container.
+
+        With an explicit version, the index is reused for the same rules list only,
+        so rules reloaded under an unchanged version are compiled again.
+        """
+        rule_index._cached_index = (None, None, None)
+        index = compile_rules(self.rules)
+        self.assertIs(compile_rules(list(reversed(self.rules))), index)
+        self.assertIsNot(compile_rules(self.rules[:2]), index)
+        index = compile_rules(self.rules, version='v1')
+        self.assertIs(compile_rules(self.rules, version='v1'), index)
+        self.assertIsNot(compile_rules(list(self.rules), version='v1'), index)
+
+
+if __name__ == '__main__':
+    unittest.main()